@@ -26,7 +26,14 @@ def test(s: Session) -> None:
 
     # Skip tests in directories specified by the SKIP_TESTS_NAII environment variable.
     skip_tests = os.getenv("SKIP_TESTS_NAAI", "")
-    skip_tests += " tests/llm/chat_completion/ tests/llm/embedding/ tests/llm/image_gen/"
+    # Skip the tests that call live provider APIs. The other LLM tests use fake clients and run offline.
+    skip_tests += (
+        " tests/llm/chat_completion/test_chat_completion.py"
+        " tests/llm/chat_completion/test_achat_completion.py"
+        " tests/llm/chat_completion/test_chat_completion_stream.py"
+        " tests/llm/embedding/test_embedding.py"
+        " tests/llm/image_gen/"
+    )
     skip_args = [f"--ignore={dir}" for dir in skip_tests.split()] if skip_tests else []
 
     s.run(
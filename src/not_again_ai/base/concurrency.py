@@ -0,0 +1,297 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+import threading
+import time
+from typing import Any, Generic, TypeVar
+
+from pydantic import BaseModel
+
+# HTTP status codes with which providers signal that they are overloaded
+OVERLOAD_STATUS_CODES = {429, 503, 529}
+
+T = TypeVar("T")
+Token = TypeVar("Token")
+
+
+class AdaptiveConcurrencyStats(BaseModel):
+    requests: int = 0
+    overloads: int = 0
+    latency_spikes: int = 0
+    increases: int = 0
+    decreases: int = 0
+    baseline_latency: float | None = None
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits the number of calls running at once to a limit that adapts to how the provider responds,
+    using additive increase, multiplicative decrease (AIMD) as in TCP congestion control.
+
+    While calls succeed with a steady latency and the limit is in use, it grows by about one every `limit`
+    completed calls. When a call is rejected because the provider is overloaded (a 429, 503 or 529 status,
+    or a timeout) or takes more than `latency_tolerance` times the usual latency, the limit is multiplied by
+    `decrease_factor`. Calls that started before a decrease do not decrease it again, so a burst of rejections
+    only backs off once.
+    Waiting threads are woken through a condition variable and waiting asyncio tasks through their own event loop,
+    so threads and tasks on different loops can take slots from the same limiter.
+
+    Args:
+        initial_limit (int, optional): The limit to start from. Defaults to 4.
+        min_limit (int, optional): The lowest the limit can go. Defaults to 1.
+        max_limit (int, optional): The highest the limit can go. Defaults to 64.
+        decrease_factor (float, optional): What the limit is multiplied by when backing off. Defaults to 0.5.
+        latency_tolerance (float, optional): How many times the usual latency a successful call may take before it counts as
+            a latency spike. Since the latency of LLM calls also depends on the number of tokens generated,
+            set it to None when response lengths vary a lot. Defaults to 3.
+        latency_smoothing (float, optional): The weight of each new latency in the exponential moving average of the usual
+            latency. Defaults to 0.1.
+        is_overload (Callable[[BaseException], bool], optional): Decides whether an exception means the provider is overloaded.
+            Defaults to `is_overload_error`.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float | None = 3.0,
+        latency_smoothing: float = 0.1,
+        is_overload: Callable[[BaseException], bool] | None = None,
+    ):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_smoothing = latency_smoothing
+        self.is_overload = is_overload or is_overload_error
+        self.stats = AdaptiveConcurrencyStats()
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future[None]]] = []
+
+    @property
+    def limit(self) -> int:
+        """The current number of calls allowed to run at once."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """The number of calls currently running."""
+        return self._in_flight
+
+    def _try_acquire(self) -> bool:
+        if self._in_flight < int(self._limit):
+            self._in_flight += 1
+            self.stats.requests += 1
+            return True
+        return False
+
+    def acquire(self) -> float:
+        """Block the calling thread until a call may start.
+
+        Returns:
+            float: The start time of the call, to pass to `release` once it ends.
+        """
+        with self._condition:
+            while not self._try_acquire():
+                self._condition.wait()
+        return time.monotonic()
+
+    async def aacquire(self) -> float:
+        """Async version of `acquire` that waits without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._try_acquire():
+                    return time.monotonic()
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def release(self, start_time: float, exception: BaseException | None = None) -> None:
+        """Release the slot of a call that started at `start_time`, adapting the limit to its outcome.
+
+        Args:
+            start_time (float): What `acquire` or `aacquire` returned.
+            exception (BaseException, optional): The exception the call raised, if any. Exceptions that are not overload errors
+                do not change the limit.
+        """
+        latency = time.monotonic() - start_time
+        with self._condition:
+            self._in_flight -= 1
+            if exception is not None:
+                if self.is_overload(exception):
+                    self.stats.overloads += 1
+                    self._decrease(start_time)
+            elif self._is_latency_spike(latency):
+                self.stats.latency_spikes += 1
+                self._decrease(start_time)
+            else:
+                self._update_baseline(latency)
+                # Only grow while the limit is in use, otherwise it would grow without bound when demand is low
+                if self._in_flight + 1 >= int(self._limit) and self._limit < self.max_limit:
+                    self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                    self.stats.increases += 1
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def _is_latency_spike(self, latency: float) -> bool:
+        baseline = self.stats.baseline_latency
+        return (
+            self.latency_tolerance is not None and baseline is not None and latency > self.latency_tolerance * baseline
+        )
+
+    def _update_baseline(self, latency: float) -> None:
+        baseline = self.stats.baseline_latency
+        self.stats.baseline_latency = (
+            latency if baseline is None else (1 - self.latency_smoothing) * baseline + self.latency_smoothing * latency
+        )
+
+    def _decrease(self, start_time: float) -> None:
+        if start_time < self._last_decrease:
+            return
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        self._last_decrease = time.monotonic()
+        self.stats.decreases += 1
+
+
+def is_overload_error(exception: BaseException) -> bool:
+    """Whether an exception raised by a provider client means the provider is overloaded: a timeout,
+    or an error with a 429, 503 or 529 status code (OpenAI, Anthropic and Ollama errors have a `status_code`
+    and Gemini errors a `code`)."""
+    if isinstance(exception, TimeoutError) or "Timeout" in type(exception).__name__:
+        return True
+    status_code = getattr(exception, "status_code", None) or getattr(exception, "code", None)
+    return status_code in OVERLOAD_STATUS_CODES
+
+
+def adaptive_client(
+    client: Callable[..., Any], limiter: AdaptiveConcurrencyLimiter, async_client: bool = False
+) -> Callable[..., Any]:
+    """Wraps a client callable (such as from `openai_client` or `ollama_client`), or any other function,
+    so that calls wait for a slot from `limiter` and adapt its limit to how they end.
+
+    To use it with `embarrassingly_parallel`, set `num_processes` to the limiter's `max_limit`, so that the
+    limiter rather than the number of workers decides how many calls run at once.
+
+    Args:
+        client (Callable[..., Any]): The client callable to wrap.
+        limiter (AdaptiveConcurrencyLimiter): The limiter to take slots from. Clients that call the same
+            provider should share a limiter, since the limit it learns reflects the load of all of them.
+        async_client (bool, optional): Must be True if `client` is an async client callable. Defaults to False.
+
+    Returns:
+        Callable[..., Any]: A client callable with the same arguments and return value as `client`, whose calls
+            run at most `limiter.limit` at a time.
+
+    Examples:
+        >>> limiter = AdaptiveConcurrencyLimiter(max_limit=32)
+        >>> client = adaptive_client(openai_client(), limiter)
+        >>> embarrassingly_parallel(chat_completion, args, num_processes=limiter.max_limit)
+    """
+
+    async def aacquire(kwargs: dict[str, Any]) -> float:
+        return await limiter.aacquire()
+
+    return wrap_client(
+        client,
+        acquire=lambda kwargs: limiter.acquire(),
+        aacquire=aacquire,
+        on_success=lambda start_time, response: limiter.release(start_time),
+        on_error=limiter.release,
+        async_client=async_client,
+    )
+
+
+def wrap_client(
+    client: Callable[..., Any],
+    acquire: Callable[[dict[str, Any]], Token],
+    aacquire: Callable[[dict[str, Any]], Awaitable[Token]],
+    on_success: Callable[[Token, Any], None],
+    on_error: Callable[[Token, BaseException], None],
+    async_client: bool = False,
+) -> Callable[..., Any]:
+    """Wraps a client callable so that every call is bracketed by a limiter's hooks: `acquire` (or `aacquire` for
+    async clients) is called with the call's kwargs before it starts, and whatever it returns is passed to
+    `on_success` with the response, or to `on_error` with the exception the call raised, which is then re-raised.
+
+    Args:
+        client (Callable[..., Any]): The client callable to wrap.
+        acquire (Callable[[dict[str, Any]], Token]): Blocks until the call may start.
+        aacquire (Callable[[dict[str, Any]], Awaitable[Token]]): Async version of `acquire`.
+        on_success (Callable[[Token, Any], None]): Called with the token from `acquire` and the response.
+        on_error (Callable[[Token, BaseException], None]): Called with the token from `acquire` and the exception.
+        async_client (bool, optional): Must be True if `client` is an async client callable. Defaults to False.
+
+    Returns:
+        Callable[..., Any]: The wrapped client callable.
+    """
+    if async_client:
+
+        async def async_client_callable(*args: Any, **kwargs: Any) -> Any:
+            token = await aacquire(kwargs)
+            try:
+                response = await client(*args, **kwargs)
+            except BaseException as e:
+                on_error(token, e)
+                raise
+            on_success(token, response)
+            return response
+
+        return async_client_callable
+
+    def client_callable(*args: Any, **kwargs: Any) -> Any:
+        token = acquire(kwargs)
+        try:
+            response = client(*args, **kwargs)
+        except BaseException as e:
+            on_error(token, e)
+            raise
+        on_success(token, response)
+        return response
+
+    return client_callable
+
+
+class LoopLocal(Generic[T]):
+    """Holds one value per asyncio event loop, created by `factory` the first time it is needed on each loop.
+
+    Async clients bind their connection pool to the event loop they are first used on, so a client shared
+    across loops, such as by separate `asyncio.run` calls, fails once its first loop is closed.
+    Keeping one client per loop lets an async client callable outlive the loop it was created on.
+    The values of loops that have been closed are dropped when a value is created for a new loop.
+
+    Args:
+        factory (Callable[[], T]): Creates the value for a loop.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self.factory = factory
+        self._values: dict[asyncio.AbstractEventLoop, T] = {}
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """The value of the running loop, created if it does not exist yet. Must be called from a running loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._values:
+                self._values = {other: value for other, value in self._values.items() if not other.is_closed()}
+                self._values[loop] = self.factory()
+            return self._values[loop]
+
+    def pop(self) -> T | None:
+        """Remove and return the value of the running loop, or None if it has none."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            return self._values.pop(loop, None)
+
+
+def _wake(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
@@ -1,6 +1,318 @@
-from collections.abc import Callable
-from multiprocessing.pool import ThreadPool
-from typing import Any
+import asyncio
+import atexit
+from collections import deque
+from collections.abc import Callable, Coroutine, Iterable, Iterator
+import heapq
+import itertools
+import multiprocessing
+from multiprocessing.pool import Pool, ThreadPool
+import pickle
+import queue
+import random
+import threading
+import time
+from typing import Any, Literal
+
+from loguru import logger
+from pydantic import BaseModel, ConfigDict
+
+# "thread" runs functions in a thread pool, which suits I/O-bound functions.
+# "process" runs functions in a pool of spawned processes, which suits CPU-bound functions that hold the GIL.
+# "async" runs coroutine functions concurrently on an event loop.
+Backend = Literal["thread", "process", "async"]
+
+Task = tuple[tuple[Any, ...], dict[str, Any]]
+
+
+class ParallelExecutor:
+    """A reusable pool of warm workers for `embarrassingly_parallel` and its variants.
+
+    Creating workers for every call is noticeable overhead when running many small batches. An executor creates
+    them once and is passed to each call with `executor=`. It is safe to share between threads, and
+    `shared_executor` returns one that is shared process-wide.
+    With the "async" backend, the executor runs a single event loop in a background thread, so async clients
+    created by the initializer stay bound to the loop their coroutines run on.
+
+    Args:
+        num_processes (int, optional): Number of workers. For the "async" backend, this is the maximum number of
+            coroutines running at once. Defaults to 1.
+        backend (Backend, optional): "thread", "process" or "async". See `embarrassingly_parallel`. Defaults to "thread".
+        initializer (Callable[..., Any], optional): Called once in each worker (in the event loop's thread for
+            "async") before it runs any function. Its return can be retrieved in the worker with `worker_state`,
+            for example to create one LLM client per worker. Must be picklable for the "process" backend.
+        initargs (tuple[Any, ...], optional): Positional arguments for `initializer`.
+
+    Examples:
+        >>> with ParallelExecutor(num_processes=8, initializer=openai_client) as executor:
+        ...     for batch in batches:
+        ...         embarrassingly_parallel(complete, batch, executor=executor)
+    """
+
+    def __init__(
+        self,
+        num_processes: int = 1,
+        backend: Backend = "thread",
+        initializer: Callable[..., Any] | None = None,
+        initargs: tuple[Any, ...] = (),
+    ):
+        self.num_processes = num_processes
+        self.backend = backend
+        self._pool: Pool | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: threading.Thread | None = None
+
+        if backend == "thread":
+            self._pool = ThreadPool(num_processes, _init_worker, (initializer, initargs))
+        elif backend == "process":
+            if initializer is not None:
+                _check_picklable(initializer, [(initargs, {})])
+            # Spawned processes behave the same on every platform and do not inherit locks held by other threads
+            self._pool = multiprocessing.get_context("spawn").Pool(num_processes, _init_worker, (initializer, initargs))
+        elif backend == "async":
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, name="ParallelExecutor", daemon=True)
+            self._loop_thread.start()
+            self._semaphore = asyncio.Semaphore(num_processes)
+            self._loop.call_soon_threadsafe(_init_worker, initializer, initargs)
+        else:
+            raise ValueError(f"Backend {backend} not supported")
+
+    def __enter__(self) -> "ParallelExecutor":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop the workers. Calls that have not completed are cancelled."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.terminate()
+        if self._loop is not None and self._loop_thread is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(_cancel_tasks(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+
+    def map(self, func: Callable[..., Any], tasks: list[Task], chunksize: int | None = None) -> list[Any]:
+        """Call `func` with each task's arguments and return the returns in order of the tasks."""
+        if self._pool is not None and self.backend == "process":
+            _check_picklable(func, tasks)
+            if chunksize is None:
+                chunksize = _default_chunksize(len(tasks), self.num_processes)
+            return self._pool.starmap(_call, [(func, args, kwargs) for args, kwargs in tasks], chunksize=chunksize)
+        elif self._pool is not None:
+            results = [self._pool.apply_async(func, args, kwargs) for args, kwargs in tasks]
+            return [result.get() for result in results]
+        else:
+            assert self._loop is not None
+            futures = [asyncio.run_coroutine_threadsafe(self._acall_chunk(func, [task]), self._loop) for task in tasks]
+            return [future.result()[0] for future in futures]
+
+    def submit(
+        self,
+        func: Callable[..., Any],
+        chunk: list[Task],
+        callback: Callable[[list[Any]], None],
+        error_callback: Callable[[BaseException], None],
+    ) -> None:
+        """Call `func` with the arguments of each task in `chunk` in a single worker without waiting.
+        `callback` is called with the list of returns, or `error_callback` with the first exception raised."""
+        if self._pool is not None:
+            self._pool.apply_async(_call_chunk, (func, chunk), callback=callback, error_callback=error_callback)
+            return
+
+        assert self._loop is not None
+        future = asyncio.run_coroutine_threadsafe(self._acall_chunk(func, chunk), self._loop)
+
+        def done(future: Any) -> None:
+            if future.cancelled():
+                error_callback(asyncio.CancelledError())
+            elif future.exception() is not None:
+                error_callback(future.exception())
+            else:
+                callback(future.result())
+
+        future.add_done_callback(done)
+
+    async def _acall_chunk(self, func: Callable[..., Coroutine[Any, Any, Any]], chunk: list[Task]) -> list[Any]:
+        async with self._semaphore:
+            return [await func(*args, **kwargs) for args, kwargs in chunk]
+
+
+_shared_executors: dict[tuple[Backend, int], ParallelExecutor] = {}
+_shared_executors_lock = threading.Lock()
+
+
+def shared_executor(num_processes: int = 1, backend: Backend = "thread") -> ParallelExecutor:
+    """Returns the process-wide `ParallelExecutor` for `backend` with `num_processes` workers.
+    It is created on first use and closed when the interpreter exits."""
+    with _shared_executors_lock:
+        key = (backend, num_processes)
+        if key not in _shared_executors:
+            if not _shared_executors:
+                atexit.register(_close_shared_executors)
+            _shared_executors[key] = ParallelExecutor(num_processes, backend)
+        return _shared_executors[key]
+
+
+def _close_shared_executors() -> None:
+    with _shared_executors_lock:
+        for executor in _shared_executors.values():
+            executor.close()
+        _shared_executors.clear()
+
+
+_worker = threading.local()
+
+
+def worker_state() -> Any:
+    """Returns what the `ParallelExecutor` initializer returned in the current worker, or None."""
+    return getattr(_worker, "state", None)
+
+
+def _init_worker(initializer: Callable[..., Any] | None, initargs: tuple[Any, ...]) -> None:
+    _worker.state = initializer(*initargs) if initializer is not None else None
+
+
+async def _cancel_tasks() -> None:
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ProgressSnapshot(BaseModel):
+    """The progress of a parallel job, as reported by `ProgressTracker`.
+
+    Task durations are in seconds and are None until a task has completed.
+    """
+
+    completed: int
+    failed: int
+    total: int | None
+    in_flight: int
+    elapsed: float
+    throughput: float
+    p50: float | None
+    p95: float | None
+    p99: float | None
+
+
+class ProgressTracker:
+    """Reports the progress of `embarrassingly_parallel` and its variants while they run.
+
+    Every `interval` seconds, and once more when the job ends, a `ProgressSnapshot` with the number of
+    completed and failed tasks, the throughput in tasks per second, the tail of the task durations and the
+    number of tasks in flight (submitted to the workers but not completed) is passed to `callback`,
+    or logged with loguru if there is no callback.
+    Task durations are measured in the workers. Percentiles are only computed when reporting, over the
+    durations of the last `window` tasks, so the overhead per task is two clock reads.
+    The same tracker can be passed to several calls to report on them as one job.
+
+    Args:
+        total (int, optional): The total number of tasks, if known. Set from the arguments by
+            `embarrassingly_parallel` and `embarrassingly_parallel_outcomes`.
+        callback (Callable[[ProgressSnapshot], None], optional): Called with each report, in the thread
+            that called the parallel function. Defaults to logging each report.
+        interval (float, optional): Seconds between reports. Defaults to 10.
+        window (int, optional): Number of most recent task durations used for percentiles. Defaults to 10,000.
+        clock (Callable[[], float], optional): Returns the current time in seconds, used for the elapsed time and
+            the report interval. Defaults to `time.monotonic`.
+
+    Examples:
+        >>> embarrassingly_parallel(complete, args, num_processes=16, progress=ProgressTracker(interval=60))
+    """
+
+    def __init__(
+        self,
+        total: int | None = None,
+        callback: Callable[[ProgressSnapshot], None] | None = None,
+        interval: float = 10.0,
+        window: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.total = total
+        self.callback = callback
+        self.interval = interval
+        self.clock = clock
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._durations: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._start_time: float | None = None
+        self._last_report = 0.0
+
+    def start(self, total: int | None = None) -> None:
+        """Start the clock, if it was not started by an earlier call."""
+        with self._lock:
+            if self._start_time is None:
+                self._start_time = self._last_report = self.clock()
+            if self.total is None:
+                self.total = total
+
+    def submit(self, count: int = 1) -> None:
+        with self._lock:
+            self.submitted += count
+
+    def complete(self, durations: list[float]) -> None:
+        """Record tasks that completed successfully, taking `durations` seconds each."""
+        with self._lock:
+            self.completed += len(durations)
+            self._durations.extend(durations)
+
+    def fail(self, count: int = 1) -> None:
+        """Record tasks that failed. They also count as completed."""
+        with self._lock:
+            self.completed += count
+            self.failed += count
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self._lock:
+            durations = sorted(self._durations)
+            completed, failed, in_flight = self.completed, self.failed, self.submitted - self.completed
+            elapsed = self.clock() - self._start_time if self._start_time is not None else 0.0
+
+        def percentile(q: float) -> float | None:
+            return round(durations[min(len(durations) - 1, int(q * len(durations)))], 4) if durations else None
+
+        return ProgressSnapshot(
+            completed=completed,
+            failed=failed,
+            total=self.total,
+            in_flight=in_flight,
+            elapsed=round(elapsed, 4),
+            throughput=round(completed / elapsed, 4) if elapsed > 0 else 0.0,
+            p50=percentile(0.5),
+            p95=percentile(0.95),
+            p99=percentile(0.99),
+        )
+
+    def seconds_to_report(self) -> float:
+        return max(0.0, self._last_report + self.interval - self.clock())
+
+    def maybe_report(self) -> None:
+        """Report if at least `interval` seconds have passed since the last report."""
+        if self.seconds_to_report() == 0:
+            self.report()
+
+    def report(self) -> None:
+        self._last_report = self.clock()
+        snapshot = self.snapshot()
+        if self.callback is not None:
+            self.callback(snapshot)
+            return
+        total = f"/{snapshot.total}" if snapshot.total is not None else ""
+        durations = (
+            f", task duration p50 {snapshot.p50:.3f}s p95 {snapshot.p95:.3f}s p99 {snapshot.p99:.3f}s"
+            if snapshot.p50 is not None and snapshot.p95 is not None and snapshot.p99 is not None
+            else ""
+        )
+        logger.info(
+            f"Completed {snapshot.completed}{total} tasks ({snapshot.failed} failed) in {snapshot.elapsed:.1f}s, "
+            f"{snapshot.throughput:.2f} tasks/s, {snapshot.in_flight} in flight{durations}"
+        )
 
 
 def embarrassingly_parallel(
@@ -8,6 +320,10 @@ def embarrassingly_parallel(
     args_list: tuple[tuple[Any, ...], ...] | None,
     kwargs_list: list[dict[str, Any]] | None = None,
     num_processes: int = 1,
+    backend: Backend = "thread",
+    chunksize: int | None = None,
+    executor: ParallelExecutor | None = None,
+    progress: ProgressTracker | None = None,
 ) -> list[Any]:
     """Call multiple functions in parallel providing either positional arguments, keyword arguments,
         or both. Return the function returns in a list ordered by order of the input arguments.
@@ -16,71 +332,582 @@ def embarrassingly_parallel(
     and each list must be the same length.
 
     Args:
-        func (Callable[..., Any]): Any function
+        func (Callable[..., Any]): Any function. With the "process" backend it must be picklable, meaning defined at
+            the top level of an importable module, and with the "async" backend it must be a coroutine function.
         args_list (Optional[tuple[tuple[Any, ...], ...]]): A tuple of tuples each of positional arguments.
         kwargs_list (Optional[list[dict[str, Any]]], optional): A list of dictionaries containing keyword arguments. Defaults to None.
         num_processes (int, optional): Number of parallel processors to use. Defaults to 1.
+            For the "async" backend, this is the maximum number of coroutines running at once.
+        backend (Backend, optional): "thread", "process" or "async". Defaults to "thread".
+        chunksize (int, optional): Only for the "process" backend. The number of calls sent to a worker process
+            at a time. Larger chunks reduce inter-process overhead for many short calls.
+            Defaults to splitting the calls into about four chunks per process.
+        executor (ParallelExecutor, optional): Run the calls on the workers of this executor instead of creating
+            new ones. `num_processes` and `backend` are then taken from the executor.
+        progress (ProgressTracker, optional): Report the progress of the calls while they run.
 
     Raises:
         ValueError: If positional and keyword arguments are not aligned in the
             same order or if the lists are not the same length.
         ValueError: If neither positional nor keyword arguments are provided.
+        TypeError: If the "process" backend is used and the function or its arguments cannot be pickled.
 
     Returns:
         list[Any]: list of the returns of each function call in order of the args_list or kwargs_list.
     """
+    tasks = list(_make_tasks(args_list, kwargs_list))
 
-    pool = ThreadPool(processes=num_processes)
-    results = {}
-    if (args_list is not None) and (kwargs_list is None):
-        for idx, args in enumerate(args_list):
-            results[idx] = pool.apply_async(func, args)
-    elif (args_list is None) and (kwargs_list is not None):
-        for idx, kwargs in enumerate(kwargs_list):
-            results[idx] = pool.apply_async(func, kwds=kwargs)
-    elif (args_list is not None) and (kwargs_list is not None):
-        # in this case args_list and kwargs_list must be of the same length
-        if len(args_list) == len(kwargs_list):
-            for idx, (args, kwargs) in enumerate(zip(args_list, kwargs_list, strict=True)):
-                results[idx] = pool.apply_async(func, args, kwargs)
-        else:
-            pool.close()
-            pool.terminate()
-            raise ValueError("args_list and kwargs_list must be of the same length")
-    else:
-        pool.close()
-        pool.terminate()
-        raise ValueError("either args_list or kwargs_list must be provided")
-
-    return_results = []
-    for _, res in results.items():
-        return_results.append(res.get())
-
-    pool.close()
-    pool.terminate()
-    return return_results
+    if progress is not None:
+        # Results are collected as they complete instead of all at once, so that progress can be reported
+        progress.start(len(tasks))
+        if executor is not None:
+            num_processes = executor.num_processes
+        return list(
+            _iter_tasks(
+                func,
+                iter(tasks),
+                num_processes,
+                backend,
+                max(1, len(tasks)),
+                True,
+                chunksize or _default_chunksize(len(tasks), num_processes),
+                executor,
+                progress,
+            )
+        )
+    if executor is not None:
+        return executor.map(func, tasks, chunksize)
+    with ParallelExecutor(num_processes, backend) as new_executor:
+        return new_executor.map(func, tasks, chunksize)
 
 
-def embarrassingly_parallel_simple(funcs: list[Callable[..., Any]], num_processes: int = 1) -> list[Any]:
+def embarrassingly_parallel_simple(
+    funcs: list[Callable[..., Any]],
+    num_processes: int = 1,
+    backend: Backend = "thread",
+    executor: ParallelExecutor | None = None,
+    progress: ProgressTracker | None = None,
+) -> list[Any]:
     """Executes the given functions in parallel and returns the results in the same order as the funcs were provided.
 
     Args:
         funcs (list[Callable[..., Any]]): A list of any functions that take no arguments.
         num_processes (int, optional): Number of parallel processors to use. Defaults to 1.
+        backend (Backend, optional): "thread", "process" or "async". See `embarrassingly_parallel`. Defaults to "thread".
+        executor (ParallelExecutor, optional): Run the functions on the workers of this executor instead of
+            creating new ones.
+        progress (ProgressTracker, optional): Report the progress of the calls while they run.
 
     Returns:
         list[Any]: list of the returns of each function call in order of the provided funcs.
     """
+    return embarrassingly_parallel(
+        _call,
+        tuple((func, (), {}) for func in funcs),
+        None,
+        num_processes,
+        backend,
+        executor=executor,
+        progress=progress,
+    )
+
+
+def embarrassingly_parallel_iter(
+    func: Callable[..., Any],
+    args_iter: Iterable[tuple[Any, ...]] | None,
+    kwargs_iter: Iterable[dict[str, Any]] | None = None,
+    num_processes: int = 1,
+    backend: Backend = "thread",
+    max_in_flight: int | None = None,
+    ordered: bool = True,
+    chunksize: int = 1,
+    executor: ParallelExecutor | None = None,
+    progress: ProgressTracker | None = None,
+) -> Iterator[Any]:
+    """Like `embarrassingly_parallel`, but lazily consumes the arguments and yields each return as soon as it is
+        available, so memory use does not grow with the number of calls.
+
+    At most `max_in_flight` calls are submitted but not yet yielded at any time. The next arguments are only
+    taken from the iterables when a slot frees up, so they can be generated on the fly.
+    If a call raises an exception, it is raised when its result would have been yielded and the remaining calls
+    are cancelled. Closing the generator early also cancels the remaining calls, unless they run on a
+    provided `executor`, in which case they complete and their returns are discarded.
+
+    Args:
+        func (Callable[..., Any]): Any function, see `embarrassingly_parallel` for the requirements of each backend.
+        args_iter (Optional[Iterable[tuple[Any, ...]]]): An iterable of tuples each of positional arguments.
+        kwargs_iter (Optional[Iterable[dict[str, Any]]], optional): An iterable of dictionaries containing
+            keyword arguments. Defaults to None.
+        num_processes (int, optional): Number of parallel processors to use. Defaults to 1.
+        backend (Backend, optional): "thread", "process" or "async". Defaults to "thread".
+        max_in_flight (int, optional): Maximum number of calls submitted but not yet yielded.
+            Defaults to twice `num_processes`.
+        ordered (bool, optional): Yield returns in the order of the arguments. If False, yield them as they
+            complete, which avoids waiting on slow calls but loses the correspondence with the arguments.
+            Defaults to True.
+        chunksize (int, optional): Only for the "process" backend. The number of calls sent to a worker process
+            at a time. Defaults to 1.
+        executor (ParallelExecutor, optional): Run the calls on the workers of this executor instead of creating
+            new ones. `num_processes` and `backend` are then taken from the executor.
+        progress (ProgressTracker, optional): Report the progress of the calls while they run.
+            Reports are made while the returns are being consumed.
+
+    Raises:
+        ValueError: If neither positional nor keyword arguments are provided.
+        ValueError: If both are provided and they are not the same length (raised once the shorter one runs out).
+
+    Returns:
+        Iterator[Any]: The returns of each function call.
+
+    Examples:
+        >>> for tokens in embarrassingly_parallel_iter(tokenize, ((line,) for line in open("corpus.txt")), num_processes=8):
+        ...     write(tokens)
+    """
+    tasks = _make_tasks(args_iter, kwargs_iter, "args_iter", "kwargs_iter")
+    if backend not in ("thread", "process", "async"):
+        raise ValueError(f"Backend {backend} not supported")
+
+    if executor is not None:
+        num_processes = executor.num_processes
+    return _iter_tasks(
+        func, tasks, num_processes, backend, max_in_flight or 2 * num_processes, ordered, chunksize, executor, progress
+    )
+
+
+def embarrassingly_parallel_simple_iter(
+    funcs: Iterable[Callable[..., Any]],
+    num_processes: int = 1,
+    backend: Backend = "thread",
+    max_in_flight: int | None = None,
+    ordered: bool = True,
+    executor: ParallelExecutor | None = None,
+    progress: ProgressTracker | None = None,
+) -> Iterator[Any]:
+    """Like `embarrassingly_parallel_simple`, but lazily consumes the functions and yields each return as soon
+    as it is available. See `embarrassingly_parallel_iter` for details.
+
+    Args:
+        funcs (Iterable[Callable[..., Any]]): An iterable of any functions that take no arguments.
+        num_processes (int, optional): Number of parallel processors to use. Defaults to 1.
+        backend (Backend, optional): "thread", "process" or "async". Defaults to "thread".
+        max_in_flight (int, optional): Maximum number of calls submitted but not yet yielded.
+            Defaults to twice `num_processes`.
+        ordered (bool, optional): Yield returns in the order of the functions, or as they complete if False.
+            Defaults to True.
+        executor (ParallelExecutor, optional): Run the functions on the workers of this executor instead of
+            creating new ones.
+        progress (ProgressTracker, optional): Report the progress of the calls while they run.
+
+    Returns:
+        Iterator[Any]: The returns of each function call.
+    """
+    return embarrassingly_parallel_iter(
+        _call,
+        ((func, (), {}) for func in funcs),
+        None,
+        num_processes,
+        backend,
+        max_in_flight,
+        ordered,
+        executor=executor,
+        progress=progress,
+    )
+
+
+class RetryPolicy(BaseModel):
+    """How failed calls are retried, with exponential backoff and full jitter.
+
+    Attempt n (starting at 1) that fails with one of `retry_on` is retried after a random delay between 0 and
+    min(max_delay, initial_delay * multiplier ** (n - 1)) seconds, until `max_attempts` attempts have been made.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    max_attempts: int = 3
+    initial_delay: float = 0.5
+    max_delay: float = 30.0
+    multiplier: float = 2.0
+    jitter: bool = True
+    retry_on: tuple[type[BaseException], ...] = (Exception,)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retrying after attempt number `attempt` failed."""
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** (attempt - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def should_retry(self, attempt: int, exception: BaseException) -> bool:
+        return attempt < self.max_attempts and isinstance(exception, self.retry_on)
+
+
+class TaskOutcome(BaseModel):
+    """The outcome of one call made by `embarrassingly_parallel_outcomes`."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    value: Any = None
+    exception: BaseException | None = None
+    attempts: int = 0
+    duration: float = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        return self.attempts > 0 and self.exception is None
+
+
+def embarrassingly_parallel_outcomes(
+    func: Callable[..., Any],
+    args_list: tuple[tuple[Any, ...], ...] | None,
+    kwargs_list: list[dict[str, Any]] | None = None,
+    num_processes: int = 1,
+    backend: Backend = "thread",
+    retry: RetryPolicy | None = None,
+    task_timeout: float | None = None,
+    timeout: float | None = None,
+    executor: ParallelExecutor | None = None,
+    progress: ProgressTracker | None = None,
+) -> list[TaskOutcome]:
+    """Like `embarrassingly_parallel`, but a failing call does not abort the others. Returns a `TaskOutcome`
+        for every call, in order of the input arguments, with its value or exception, number of attempts and duration.
+
+    Failed calls can be retried with exponential backoff and jitter, each attempt can be limited to `task_timeout`
+    seconds, and the whole call to `timeout` seconds, after which unfinished calls are cancelled and their outcome
+    is a `TimeoutError`.
+    With the "async" backend, timed out attempts are cancelled. Threads and processes cannot be interrupted,
+    so a timed out attempt is abandoned but keeps its worker busy until it returns. Its worker is not given another
+    attempt until then, so a retry waits for a free worker and its timeout only starts once it runs.
+    Workers created by this call are stopped when it returns, along with any attempts still running.
+
+    Args:
+        func (Callable[..., Any]): Any function, see `embarrassingly_parallel` for the requirements of each backend.
+        args_list (Optional[tuple[tuple[Any, ...], ...]]): A tuple of tuples each of positional arguments.
+        kwargs_list (Optional[list[dict[str, Any]]], optional): A list of dictionaries containing keyword arguments. Defaults to None.
+        num_processes (int, optional): Number of parallel processors to use. Defaults to 1.
+        backend (Backend, optional): "thread", "process" or "async". Defaults to "thread".
+        retry (RetryPolicy, optional): How to retry failed attempts. Defaults to a single attempt.
+        task_timeout (float, optional): Seconds each attempt may take before it fails with a `TimeoutError`.
+        timeout (float, optional): Seconds after which all unfinished calls fail with a `TimeoutError`.
+        executor (ParallelExecutor, optional): Run the calls on the workers of this executor instead of creating
+            new ones. `num_processes` and `backend` are then taken from the executor.
+        progress (ProgressTracker, optional): Report the progress of the calls while they run. The duration of a
+            call includes its retries.
+
+    Raises:
+        ValueError: If positional and keyword arguments are not aligned in the
+            same order or if the lists are not the same length.
+        ValueError: If neither positional nor keyword arguments are provided.
+
+    Returns:
+        list[TaskOutcome]: The outcome of each function call in order of the args_list or kwargs_list.
+    """
+    tasks = list(_make_tasks(args_list, kwargs_list))
+
+    retry = retry or RetryPolicy(max_attempts=1)
+    if executor is not None:
+        return _run_outcomes(func, tasks, executor, retry, task_timeout, timeout, progress)
+    with ParallelExecutor(num_processes, backend) as new_executor:
+        return _run_outcomes(func, tasks, new_executor, retry, task_timeout, timeout, progress)
+
 
-    pool = ThreadPool(processes=num_processes)
-    results = {}
-    for idx, func in enumerate(funcs):
-        results[idx] = pool.apply_async(func)
+def _run_outcomes(
+    func: Callable[..., Any],
+    tasks: list[Task],
+    executor: ParallelExecutor,
+    retry: RetryPolicy,
+    task_timeout: float | None,
+    timeout: float | None,
+    progress: ProgressTracker | None,
+) -> list[TaskOutcome]:
+    if executor.backend == "process":
+        _check_picklable(func, tasks)
+    elif executor.backend == "async" and task_timeout is not None:
+        func = _with_timeout(func, task_timeout)
+
+    start_time = time.monotonic()
+    deadline = start_time + timeout if timeout is not None else None
+    outcomes = [TaskOutcome() for _ in tasks]
+    first_started: dict[int, float] = {}
+    # Calls ready to start, calls waiting to be retried as (ready time, index), and running calls with the
+    # attempt number and deadline of their current attempt
+    ready = deque(range(len(tasks)))
+    retrying: list[tuple[float, int]] = []
+    running: dict[int, tuple[int, float | None]] = {}
+    # Timed out attempts as (index, attempt) that are still occupying a worker
+    abandoned: set[tuple[int, int]] = set()
+    completions: queue.Queue[tuple[int, int, bool, Any]] = queue.Queue()
+    finished: set[int] = set()
+    if progress is not None:
+        progress.start(len(tasks))
+
+    def finish(index: int, value: Any = None, exception: BaseException | None = None) -> None:
+        outcome = outcomes[index]
+        outcome.value, outcome.exception = value, exception
+        if index in first_started:
+            outcome.duration = round(time.monotonic() - first_started[index], 4)
+        finished.add(index)
+        if progress is not None and exception is None:
+            progress.complete([outcome.duration])
+        elif progress is not None:
+            progress.fail()
+
+    def fail(index: int, attempt: int, exception: BaseException) -> None:
+        if retry.should_retry(attempt, exception):
+            heapq.heappush(retrying, (time.monotonic() + retry.delay(attempt), index))
+        else:
+            finish(index, exception=exception)
 
-    return_results = []
-    for _, res in results.items():
-        return_results.append(res.get())
+    while len(finished) < len(tasks):
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            break
+        while retrying and retrying[0][0] <= now:
+            ready.append(heapq.heappop(retrying)[1])
+        # Only as many attempts as there are free workers are submitted, counting those still busy with abandoned
+        # attempts, so attempts never queue and their timeouts start when they do
+        while ready and len(running) + len(abandoned) < executor.num_processes:
+            index = ready.popleft()
+            attempt = outcomes[index].attempts = outcomes[index].attempts + 1
+            if index not in first_started:
+                first_started[index] = now
+                if progress is not None:
+                    progress.submit()
+            running[index] = (attempt, now + task_timeout if task_timeout is not None else None)
 
-    pool.close()
-    pool.terminate()
-    return return_results
+            def on_success(values: list[Any], index: int = index, attempt: int = attempt) -> None:
+                completions.put((index, attempt, True, values[0]))
+
+            def on_error(e: BaseException, index: int = index, attempt: int = attempt) -> None:
+                completions.put((index, attempt, False, e))
+
+            executor.submit(func, [tasks[index]], on_success, on_error)
+
+        wake_times = [attempt_deadline for _, attempt_deadline in running.values() if attempt_deadline is not None]
+        wake_times += [retrying[0][0]] if retrying else []
+        wake_times += [deadline] if deadline is not None else []
+        wake_times += [time.monotonic() + progress.seconds_to_report()] if progress is not None else []
+        try:
+            wait = max(0.0, min(wake_times) - time.monotonic()) if wake_times else None
+            index, attempt, succeeded, value = completions.get(timeout=wait)
+        except queue.Empty:
+            if progress is not None:
+                progress.maybe_report()
+            now = time.monotonic()
+            for index, (attempt, attempt_deadline) in list(running.items()):
+                if attempt_deadline is not None and now >= attempt_deadline:
+                    del running[index]
+                    abandoned.add((index, attempt))
+                    fail(index, attempt, TimeoutError(f"Attempt {attempt} timed out after {task_timeout} seconds"))
+            continue
+
+        # A late completion of an attempt that already timed out only frees its worker
+        if (index, attempt) in abandoned:
+            abandoned.remove((index, attempt))
+            continue
+        del running[index]
+        if succeeded:
+            finish(index, value=value)
+        else:
+            fail(index, attempt, value)
+        if progress is not None:
+            progress.maybe_report()
+
+    for index in range(len(tasks)):
+        if index not in finished:
+            finish(index, exception=TimeoutError(f"Did not complete within the timeout of {timeout} seconds"))
+    if progress is not None:
+        progress.report()
+    return outcomes
+
+
+def _with_timeout(func: Callable[..., Coroutine[Any, Any, Any]], timeout: float) -> Callable[..., Any]:
+    async def call_with_timeout(*args: Any, **kwargs: Any) -> Any:
+        return await asyncio.wait_for(func(*args, **kwargs), timeout)
+
+    return call_with_timeout
+
+
+def _call(func: Callable[..., Any], args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+    """Call `func`. Defined at the top level so that worker processes can unpickle it."""
+    return func(*args, **kwargs)
+
+
+def _call_chunk(func: Callable[..., Any], chunk: list[Task]) -> list[Any]:
+    return [func(*args, **kwargs) for args, kwargs in chunk]
+
+
+def _default_chunksize(num_tasks: int, num_processes: int) -> int:
+    """About four chunks per process."""
+    return max(1, -(-num_tasks // (num_processes * 4)))
+
+
+class _Timed:
+    """Wraps a function to also return how long each call took. A class so that it can be pickled."""
+
+    def __init__(self, func: Callable[..., Any]):
+        self.func = func
+
+    def __call__(self, *args: Any, **kwargs: Any) -> tuple[float, Any]:
+        start_time = time.perf_counter()
+        value = self.func(*args, **kwargs)
+        return time.perf_counter() - start_time, value
+
+
+class _AsyncTimed(_Timed):
+    async def __call__(self, *args: Any, **kwargs: Any) -> tuple[float, Any]:  # type: ignore[override]
+        start_time = time.perf_counter()
+        value = await self.func(*args, **kwargs)
+        return time.perf_counter() - start_time, value
+
+
+def _make_tasks(
+    args_iter: Iterable[tuple[Any, ...]] | None,
+    kwargs_iter: Iterable[dict[str, Any]] | None,
+    args_name: str = "args_list",
+    kwargs_name: str = "kwargs_list",
+) -> Iterator[Task]:
+    """Pair positional and keyword arguments into tasks, lazily so that `args_iter` and `kwargs_iter` can be
+    unbounded. Raises right away if neither is provided, and once exhausted if they differ in length."""
+    if (args_iter is not None) and (kwargs_iter is None):
+        return ((args, {}) for args in args_iter)
+    elif (args_iter is None) and (kwargs_iter is not None):
+        return (((), kwargs) for kwargs in kwargs_iter)
+    elif (args_iter is not None) and (kwargs_iter is not None):
+        return _zip_tasks(args_iter, kwargs_iter, f"{args_name} and {kwargs_name} must be of the same length")
+    raise ValueError(f"either {args_name} or {kwargs_name} must be provided")
+
+
+def _zip_tasks(
+    args_iter: Iterable[tuple[Any, ...]], kwargs_iter: Iterable[dict[str, Any]], message: str
+) -> Iterator[Task]:
+    try:
+        yield from zip(args_iter, kwargs_iter, strict=True)
+    except ValueError as e:
+        raise ValueError(message) from e
+
+
+class _Window:
+    """Tracks which calls have completed so their returns can be yielded in order or as they complete."""
+
+    def __init__(self, ordered: bool):
+        self.ordered = ordered
+        self.completed: dict[int, tuple[bool, Any]] = {}
+        self.next_index = 0
+        self.submitted = 0
+        self.yielded = 0
+
+    def complete(self, index: int, succeeded: bool, value: Any) -> None:
+        self.completed[index] = (succeeded, value)
+
+    def ready(self) -> Iterator[Any]:
+        """Yield the returns that can be yielded now, raising the exception of a failed call."""
+        while self.completed:
+            if self.ordered:
+                if self.next_index not in self.completed:
+                    return
+                succeeded, value = self.completed.pop(self.next_index)
+                self.next_index += 1
+            else:
+                succeeded, value = self.completed.pop(next(iter(self.completed)))
+            self.yielded += 1
+            if not succeeded:
+                raise value
+            yield value
+
+
+def _iter_tasks(
+    func: Callable[..., Any],
+    tasks: Iterator[Task],
+    num_processes: int,
+    backend: Backend,
+    max_in_flight: int,
+    ordered: bool,
+    chunksize: int,
+    executor: ParallelExecutor | None,
+    progress: ProgressTracker | None = None,
+) -> Iterator[Any]:
+    owns_executor = executor is None
+    if executor is None:
+        executor = ParallelExecutor(num_processes, backend)
+    is_process = executor.backend == "process"
+    chunksize = chunksize if is_process else 1
+    chunks = iter(lambda: list(itertools.islice(tasks, chunksize)), [])
+    completions: queue.Queue[tuple[int, bool, Any]] = queue.Queue()
+    window = _Window(ordered)
+    # Each chunk is tracked by the index of its first call, and its returns are split into individual calls
+    chunk_sizes: dict[int, int] = {}
+    if progress is not None:
+        progress.start()
+        # Durations are measured in the workers, so the function is wrapped to return them with its returns
+        submitted_func: Callable[..., Any] = _AsyncTimed(func) if executor.backend == "async" else _Timed(func)
+    else:
+        submitted_func = func
+
+    try:
+        exhausted = False
+        while True:
+            while not exhausted and window.submitted - window.yielded + chunksize <= max(max_in_flight, chunksize):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                if is_process and window.submitted == 0:
+                    _check_picklable(func, chunk)
+                start = window.submitted
+                chunk_sizes[start] = len(chunk)
+
+                def on_success(values: list[Any], start: int = start) -> None:
+                    if progress is not None:
+                        progress.complete([duration for duration, _ in values])
+                        values = [value for _, value in values]
+                    completions.put((start, True, values))
+
+                def on_error(e: BaseException, start: int = start, size: int = len(chunk)) -> None:
+                    if progress is not None:
+                        progress.fail(size)
+                    completions.put((start, False, e))
+
+                if progress is not None:
+                    progress.submit(len(chunk))
+                executor.submit(submitted_func, chunk, on_success, on_error)
+                window.submitted += len(chunk)
+            if window.yielded == window.submitted:
+                return
+
+            try:
+                start, succeeded, value = completions.get(
+                    timeout=progress.seconds_to_report() if progress is not None else None
+                )
+            except queue.Empty:
+                assert progress is not None
+                progress.report()
+                continue
+            for offset in range(chunk_sizes.pop(start)):
+                window.complete(start + offset, succeeded, value[offset] if succeeded else value)
+            yield from window.ready()
+            if progress is not None:
+                progress.maybe_report()
+    finally:
+        if owns_executor:
+            executor.close()
+        if progress is not None:
+            progress.report()
+
+
+def _check_picklable(func: Callable[..., Any], tasks: list[Task]) -> None:
+    """Fail fast with a clear error instead of an opaque one from inside the process pool.
+
+    Only the function and the first task are checked, since the arguments of each call usually share their types.
+    """
+    try:
+        pickle.dumps(func)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise TypeError(
+            f"{func!r} cannot be pickled, so it cannot be sent to worker processes. "
+            "Define it at the top level of a module instead of as a lambda, closure or nested function."
+        ) from e
+    if tasks:
+        try:
+            pickle.dumps(tasks[0])
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            raise TypeError(
+                f"The arguments of {func!r} cannot be pickled, so they cannot be sent to worker processes."
+            ) from e
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class CacheStats(BaseModel):
+    """Hit and miss counts shared by the chat completion, semantic and embedding caches."""
+
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -1,4 +1,30 @@
-from not_again_ai.llm.chat_completion.interface import chat_completion, chat_completion_stream
+from not_again_ai.llm.chat_completion.batch import (
+    achat_completion_batch,
+    achat_completion_batch_as_completed,
+    chat_completion_batch,
+)
+from not_again_ai.llm.chat_completion.interface import achat_completion, chat_completion, chat_completion_stream
+from not_again_ai.llm.chat_completion.json_stream import JSONStreamParser, stream_json_values
+from not_again_ai.llm.chat_completion.stream import StreamAccumulator
+from not_again_ai.llm.chat_completion.stream_metrics import (
+    StreamMetrics,
+    StreamMetricsRecorder,
+    summarize_stream_metrics,
+)
 from not_again_ai.llm.chat_completion.types import ChatCompletionRequest
 
-__all__ = ["ChatCompletionRequest", "chat_completion", "chat_completion_stream"]
+__all__ = [
+    "ChatCompletionRequest",
+    "JSONStreamParser",
+    "StreamAccumulator",
+    "StreamMetrics",
+    "StreamMetricsRecorder",
+    "achat_completion",
+    "achat_completion_batch",
+    "achat_completion_batch_as_completed",
+    "chat_completion",
+    "chat_completion_batch",
+    "chat_completion_stream",
+    "stream_json_values",
+    "summarize_stream_metrics",
+]
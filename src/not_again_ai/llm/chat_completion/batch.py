@@ -0,0 +1,128 @@
+import asyncio
+from collections.abc import AsyncGenerator, Callable, Sequence
+from typing import Any
+
+from not_again_ai.base.parallel import embarrassingly_parallel
+from not_again_ai.llm.chat_completion.interface import achat_completion, chat_completion
+from not_again_ai.llm.chat_completion.types import ChatCompletionBatchResult, ChatCompletionRequest
+
+
+def chat_completion_batch(
+    requests: Sequence[ChatCompletionRequest],
+    provider: str,
+    client: Callable[..., Any],
+    max_concurrency: int = 8,
+) -> list[ChatCompletionBatchResult]:
+    """Run many chat completions using a pool of at most `max_concurrency` threads.
+
+    A request that raises does not fail the whole batch, its error is returned in the result for that request instead.
+
+    Args:
+        requests: The chat completion requests to run.
+        provider: The supported provider name, see `chat_completion`.
+        client: A sync client callable for the provider.
+        max_concurrency: The maximum number of requests in flight at once. Defaults to 8.
+
+    Returns:
+        list[ChatCompletionBatchResult]: One result per request, in the same order as `requests`.
+
+    Raises:
+        ValueError: If `max_concurrency` is less than 1.
+    """
+    _check_max_concurrency(max_concurrency)
+    if not requests:
+        return []
+
+    def run(index: int, request: ChatCompletionRequest) -> ChatCompletionBatchResult:
+        try:
+            return ChatCompletionBatchResult(index=index, response=chat_completion(request, provider, client))
+        except Exception as e:
+            return ChatCompletionBatchResult(index=index, errors=f"{type(e).__name__}: {e}")
+
+    return embarrassingly_parallel(run, tuple(enumerate(requests)), num_processes=min(max_concurrency, len(requests)))
+
+
+def _check_max_concurrency(max_concurrency: int) -> None:
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+
+
+async def _arun(
+    index: int,
+    request: ChatCompletionRequest,
+    provider: str,
+    client: Callable[..., Any],
+    semaphore: asyncio.Semaphore,
+) -> ChatCompletionBatchResult:
+    async with semaphore:
+        try:
+            response = await achat_completion(request, provider, client)
+            return ChatCompletionBatchResult(index=index, response=response)
+        except Exception as e:
+            return ChatCompletionBatchResult(index=index, errors=f"{type(e).__name__}: {e}")
+
+
+async def achat_completion_batch(
+    requests: Sequence[ChatCompletionRequest],
+    provider: str,
+    client: Callable[..., Any],
+    max_concurrency: int = 8,
+) -> list[ChatCompletionBatchResult]:
+    """Asynchronously run many chat completions with at most `max_concurrency` requests in flight at once.
+
+    A request that raises does not fail the whole batch, its error is returned in the result for that request instead.
+
+    Args:
+        requests: The chat completion requests to run.
+        provider: The supported provider name, see `achat_completion`.
+        client: An async client callable for the provider (created with `async_client=True`).
+        max_concurrency: The maximum number of requests in flight at once. Defaults to 8.
+
+    Returns:
+        list[ChatCompletionBatchResult]: One result per request, in the same order as `requests`.
+
+    Raises:
+        ValueError: If `max_concurrency` is less than 1.
+    """
+    _check_max_concurrency(max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return await asyncio.gather(
+        *[_arun(index, request, provider, client, semaphore) for index, request in enumerate(requests)]
+    )
+
+
+async def achat_completion_batch_as_completed(
+    requests: Sequence[ChatCompletionRequest],
+    provider: str,
+    client: Callable[..., Any],
+    max_concurrency: int = 8,
+) -> AsyncGenerator[ChatCompletionBatchResult, None]:
+    """Like `achat_completion_batch`, but yields each result as soon as it completes.
+
+    Results are yielded in completion order; use `ChatCompletionBatchResult.index` to map them back to `requests`.
+    Requests still pending when the generator is closed early are cancelled.
+
+    Args:
+        requests: The chat completion requests to run.
+        provider: The supported provider name, see `achat_completion`.
+        client: An async client callable for the provider (created with `async_client=True`).
+        max_concurrency: The maximum number of requests in flight at once. Defaults to 8.
+
+    Returns:
+        AsyncGenerator[ChatCompletionBatchResult, None]
+
+    Raises:
+        ValueError: If `max_concurrency` is less than 1.
+    """
+    _check_max_concurrency(max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = [
+        asyncio.create_task(_arun(index, request, provider, client, semaphore))
+        for index, request in enumerate(requests)
+    ]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,219 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Literal
+
+from not_again_ai.base.file_system import create_file_dir
+from not_again_ai.llm.cache_stats import CacheStats
+from not_again_ai.llm.chat_completion.interface import achat_completion, chat_completion
+from not_again_ai.llm.chat_completion.types import ChatCompletionRequest, ChatCompletionResponse
+
+# "use" reads from and writes to the cache, "refresh" skips reading but writes the new response,
+# and "bypass" neither reads nor writes.
+CacheMode = Literal["use", "refresh", "bypass"]
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key: str) -> ChatCompletionResponse | None:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, response: ChatCompletionResponse) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """A thread-safe in-memory LRU cache whose entries optionally expire after `ttl` seconds.
+
+    Args:
+        max_size: The maximum number of responses to keep. The least recently used response is evicted first.
+        ttl: Seconds after which an entry expires. If None, entries never expire.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, ChatCompletionResponse]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> ChatCompletionResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, response = entry
+            if self.ttl is not None and time.monotonic() - created_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key: str, response: ChatCompletionResponse) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """An on-disk cache stored in a SQLite database so responses survive restarts and can be shared between processes.
+
+    Args:
+        path: The path of the SQLite database file. Parent directories are created if needed.
+        ttl: Seconds after which an entry expires. If None, entries never expire.
+    """
+
+    def __init__(self, path: str | Path, ttl: float | None = None):
+        self.path = Path(path)
+        self.ttl = ttl
+        create_file_dir(self.path)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL)"
+            )
+
+    def get(self, key: str) -> ChatCompletionResponse | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        if self.ttl is not None and time.time() - row[1] > self.ttl:
+            with self._lock, self._connection:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        return ChatCompletionResponse.model_validate_json(row[0])
+
+    def set(self, key: str, response: ChatCompletionResponse) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, response.model_dump_json(), time.time()),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class ChatCompletionCache:
+    """A cache in front of `chat_completion` and `achat_completion` for requests that are expected to return the
+    same response every time, such as evaluation or pipeline reruns.
+
+    Requests are keyed by a hash of the provider and the canonicalized request. Responses served from the cache have
+    `extras["cache_hit"]` set to True.
+
+    Args:
+        backend: Where responses are stored. Defaults to an `InMemoryCacheBackend`.
+        deterministic_only: Only cache requests with `temperature=0` or a `seed`. Other requests are always sent
+            to the provider. Defaults to True.
+    """
+
+    def __init__(self, backend: CacheBackend | None = None, deterministic_only: bool = True):
+        self.backend = backend if backend is not None else InMemoryCacheBackend()
+        self.deterministic_only = deterministic_only
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(request: ChatCompletionRequest, provider: str) -> str:
+        """A stable hash of the provider and request. `stream` does not affect the key."""
+        canonical = request.model_dump(mode="json", exclude_none=True, exclude={"stream"})
+        canonical["provider"] = provider
+        serialized = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, request: ChatCompletionRequest) -> bool:
+        if not self.deterministic_only:
+            return True
+        return request.temperature == 0 or request.seed is not None
+
+    def lookup(self, request: ChatCompletionRequest, provider: str, mode: CacheMode = "use") -> str | None:
+        """Returns the cache key to store the response under, or None if the response should not be stored."""
+        if mode == "bypass" or not self.is_cacheable(request):
+            return None
+        return self.key(request, provider)
+
+    def get(self, key: str, mode: CacheMode = "use") -> ChatCompletionResponse | None:
+        cached = self.backend.get(key) if mode == "use" else None
+        with self._lock:
+            if cached is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        if cached is None:
+            return None
+        extras = cached.extras if isinstance(cached.extras, dict) else {}
+        return cached.model_copy(update={"extras": {**extras, "cache_hit": True}})
+
+    def chat_completion(
+        self,
+        request: ChatCompletionRequest,
+        provider: str,
+        client: Callable[..., Any],
+        mode: CacheMode = "use",
+    ) -> ChatCompletionResponse:
+        """`chat_completion` that returns a cached response when one is available.
+
+        Args:
+            request: Request parameter object
+            provider: The supported provider name
+            client: Client information, see the provider's implementation for what can be provided
+            mode: "use" (default) reads and writes the cache, "refresh" always calls the provider and overwrites
+                the cached response, and "bypass" calls the provider without touching the cache.
+                Responses with errors are never cached.
+
+        Returns:
+            ChatCompletionResponse: The chat completion response.
+        """
+        key = self.lookup(request, provider, mode)
+        if key is None:
+            return chat_completion(request, provider, client)
+        cached = self.get(key, mode)
+        if cached is not None:
+            return cached
+        response = chat_completion(request, provider, client)
+        if not response.errors:
+            self.backend.set(key, response)
+        return response
+
+    async def achat_completion(
+        self,
+        request: ChatCompletionRequest,
+        provider: str,
+        client: Callable[..., Any],
+        mode: CacheMode = "use",
+    ) -> ChatCompletionResponse:
+        """Async version of `ChatCompletionCache.chat_completion`."""
+        key = self.lookup(request, provider, mode)
+        if key is None:
+            return await achat_completion(request, provider, client)
+        cached = self.get(key, mode)
+        if cached is not None:
+            return cached
+        response = await achat_completion(request, provider, client)
+        if not response.errors:
+            self.backend.set(key, response)
+        return response
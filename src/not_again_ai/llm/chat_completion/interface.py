@@ -1,10 +1,26 @@
 from collections.abc import AsyncGenerator, Callable
 from typing import Any
 
-from not_again_ai.llm.chat_completion.providers.anthropic_api import anthropic_chat_completion
-from not_again_ai.llm.chat_completion.providers.gemini_api import gemini_chat_completion
-from not_again_ai.llm.chat_completion.providers.ollama_api import ollama_chat_completion, ollama_chat_completion_stream
-from not_again_ai.llm.chat_completion.providers.openai_api import openai_chat_completion, openai_chat_completion_stream
+from not_again_ai.llm.chat_completion.providers.anthropic_api import (
+    anthropic_achat_completion,
+    anthropic_chat_completion,
+    anthropic_chat_completion_stream,
+)
+from not_again_ai.llm.chat_completion.providers.gemini_api import (
+    gemini_achat_completion,
+    gemini_chat_completion,
+    gemini_chat_completion_stream,
+)
+from not_again_ai.llm.chat_completion.providers.ollama_api import (
+    ollama_achat_completion,
+    ollama_chat_completion,
+    ollama_chat_completion_stream,
+)
+from not_again_ai.llm.chat_completion.providers.openai_api import (
+    openai_achat_completion,
+    openai_chat_completion,
+    openai_chat_completion_stream,
+)
 from not_again_ai.llm.chat_completion.types import ChatCompletionChunk, ChatCompletionRequest, ChatCompletionResponse
 
 
@@ -40,19 +56,57 @@ def chat_completion(
         raise ValueError(f"Provider {provider} not supported")
 
 
+async def achat_completion(
+    request: ChatCompletionRequest,
+    provider: str,
+    client: Callable[..., Any],
+) -> ChatCompletionResponse:
+    """Asynchronously get a chat completion response from the given provider.
+    The client must be created with `async_client=True` so that a single event loop can hold many in-flight requests.
+    Currently supported providers:
+    - `openai` - OpenAI
+    - `azure_openai` - Azure OpenAI
+    - `ollama` - Ollama
+    - `anthropic` - Anthropic
+    - `gemini` - Gemini
+
+    Args:
+        request: Request parameter object
+        provider: The supported provider name
+        client: Async client information, see the provider's implementation for what can be provided
+
+    Returns:
+        ChatCompletionResponse: The chat completion response.
+    """
+    if provider == "openai" or provider == "azure_openai":
+        return await openai_achat_completion(request, client)
+    elif provider == "ollama":
+        return await ollama_achat_completion(request, client)
+    elif provider == "anthropic":
+        return await anthropic_achat_completion(request, client)
+    elif provider == "gemini":
+        return await gemini_achat_completion(request, client)
+    else:
+        raise ValueError(f"Provider {provider} not supported")
+
+
 async def chat_completion_stream(
     request: ChatCompletionRequest,
     provider: str,
     client: Callable[..., Any],
 ) -> AsyncGenerator[ChatCompletionChunk, None]:
-    """Stream a chat completion response from the given provider. Currently supported providers:
+    """Stream a chat completion response from the given provider.
+    The client must be created with `async_client=True`. Currently supported providers:
     - `openai` - OpenAI
     - `azure_openai` - Azure OpenAI
+    - `ollama` - Ollama
+    - `anthropic` - Anthropic
+    - `gemini` - Gemini
 
     Args:
         request: Request parameter object
         provider: The supported provider name
-        client: Client information, see the provider's implementation for what can be provided
+        client: Async client information, see the provider's implementation for what can be provided
 
     Returns:
         AsyncGenerator[ChatCompletionChunk, None]
@@ -64,5 +118,11 @@ async def chat_completion_stream(
     elif provider == "ollama":
         async for chunk in ollama_chat_completion_stream(request, client):
             yield chunk
+    elif provider == "anthropic":
+        async for chunk in anthropic_chat_completion_stream(request, client):
+            yield chunk
+    elif provider == "gemini":
+        async for chunk in gemini_chat_completion_stream(request, client):
+            yield chunk
     else:
         raise ValueError(f"Provider {provider} not supported")
@@ -0,0 +1,265 @@
+from collections.abc import AsyncGenerator, AsyncIterable
+import json
+import re
+from typing import Any, NoReturn
+
+from not_again_ai.llm.chat_completion.types import ChatCompletionChunk
+
+# The keys and indices leading from the top-level JSON value to a value within it
+JSONPath = tuple[str | int, ...]
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SCALAR = re.compile(r"[^\s,:\[\]{}\"]*")
+
+# What the parser expects next
+_VALUE = 0
+_KEY_OR_END = 1
+_KEY = 2
+_COLON = 3
+_COMMA_OR_END = 4
+_VALUE_OR_END = 5
+_DONE = 6
+
+
+class JSONStreamParser:
+    """Parses JSON incrementally as it is streamed, emitting each value as soon as it is complete.
+
+    Feed it the content deltas of a `json_mode` or `structured_outputs` stream. Each call to `feed` returns the
+    values that were completed by that delta, innermost first, as `(path, value)` pairs, where the path is the
+    keys and indices leading to the value. For example, the elements of a top-level "items" array are emitted
+    with the paths ("items", 0), ("items", 1), ... as soon as each one closes, while the rest of the response
+    is still being generated. `value` is the top-level value with all completed values filled in so far.
+
+    Every character is looked at once, with strings scanned by regular expressions, so parsing is linear in
+    the length of the stream, unlike re-parsing the whole buffer on every delta.
+
+    Examples:
+        >>> parser = JSONStreamParser()
+        >>> async for chunk in chat_completion_stream(request, "openai", client):
+        ...     for path, value in parser.feed(chunk.choices[0].delta.content):
+        ...         if len(path) == 2 and path[0] == "items":
+        ...             process(value)
+    """
+
+    def __init__(self) -> None:
+        self._state = _VALUE
+        # Open containers, each with the key or index of the value being parsed in it
+        self._containers: list[dict[str, Any] | list[Any]] = []
+        self._path: list[str | int] = []
+        self._root: Any = None
+        # A string or scalar split across deltas
+        self._token: list[str] = []
+        self._in_string = False
+        self._string_is_key = False
+        self._escaped = False
+        self._in_scalar = False
+        self._position = 0
+
+    @property
+    def value(self) -> Any:
+        """The top-level value parsed so far, holding only the completed values within it."""
+        return self._root
+
+    @property
+    def done(self) -> bool:
+        """Whether the top-level value is complete."""
+        return self._state == _DONE
+
+    def feed(self, text: str) -> list[tuple[JSONPath, Any]]:
+        """Parse the next piece of the JSON text.
+
+        Returns:
+            list[tuple[JSONPath, Any]]: The values completed by `text` with their paths, innermost first.
+
+        Raises:
+            ValueError: If the text is not valid JSON.
+        """
+        completed: list[tuple[JSONPath, Any]] = []
+        i = 0
+        n = len(text)
+        while i < n:
+            if self._in_string:
+                i = self._scan_string(text, i, completed)
+                continue
+            if self._in_scalar:
+                i = self._scan_scalar(text, i, completed)
+                continue
+
+            i = _WHITESPACE.match(text, i).end()  # type: ignore[union-attr]
+            if i >= n:
+                break
+            char = text[i]
+            state = self._state
+            if state == _DONE:
+                self._error(f"Unexpected {char!r} after the end of the JSON value", i)
+            elif state in (_VALUE, _VALUE_OR_END):
+                if state == _VALUE_OR_END and char != "]":
+                    self._path.append(0)
+                if char == "]" and state == _VALUE_OR_END:
+                    self._close(completed)
+                elif char == "{":
+                    self._open({}, _KEY_OR_END)
+                elif char == "[":
+                    self._open([], _VALUE_OR_END)
+                elif char == '"':
+                    self._in_string, self._string_is_key = True, False
+                elif char in "-0123456789tfn":
+                    self._in_scalar = True
+                    self._state = _VALUE
+                    continue
+                else:
+                    self._error(f"Expected a value, got {char!r}", i)
+            elif state in (_KEY_OR_END, _KEY):
+                if char == '"':
+                    self._in_string, self._string_is_key = True, True
+                elif char == "}" and state == _KEY_OR_END:
+                    self._close(completed)
+                else:
+                    self._error(f"Expected a key, got {char!r}", i)
+            elif state == _COLON:
+                if char != ":":
+                    self._error(f"Expected ':', got {char!r}", i)
+                self._state = _VALUE
+            elif state == _COMMA_OR_END:
+                container = self._containers[-1]
+                if char == ",":
+                    if isinstance(container, dict):
+                        self._state = _KEY
+                    else:
+                        self._state = _VALUE
+                        self._path.append(len(container))
+                elif (char == "}" and isinstance(container, dict)) or (char == "]" and isinstance(container, list)):
+                    self._close(completed)
+                else:
+                    self._error(f"Expected ',' or the end of the container, got {char!r}", i)
+            i += 1
+        self._position += n
+        return completed
+
+    def close(self) -> Any:
+        """Finish parsing and return the top-level value.
+
+        Raises:
+            ValueError: If the JSON text is incomplete.
+        """
+        if self._in_scalar and not self._containers:
+            # A top-level number has no delimiter after it
+            completed: list[tuple[JSONPath, Any]] = []
+            self._complete_scalar(completed, 0)
+        if self._state != _DONE:
+            raise ValueError("The JSON text ended before the value was complete")
+        return self._root
+
+    def _scan_string(self, text: str, i: int, completed: list[tuple[JSONPath, Any]]) -> int:
+        if self._escaped:
+            # The character after a backslash that ended the previous delta
+            self._token.append(text[i])
+            self._escaped = False
+            return i + 1
+        match = _STRING_SPECIAL.search(text, i)
+        if match is None:
+            self._token.append(text[i:])
+            return len(text)
+        end = match.start()
+        if text[end] == "\\":
+            self._token.append(text[i : end + 2])
+            if end + 1 >= len(text):
+                self._escaped = True
+            return end + 2
+        self._token.append(text[i:end])
+        raw = "".join(self._token)
+        self._token.clear()
+        self._in_string = False
+        try:
+            string = json.loads(f'"{raw}"') if "\\" in raw else raw
+        except json.JSONDecodeError as e:
+            self._error(f"Invalid string {raw!r}: {e.msg}", end)
+        if self._string_is_key:
+            self._path.append(string)
+            self._state = _COLON
+        else:
+            self._complete(string, completed)
+        return end + 1
+
+    def _scan_scalar(self, text: str, i: int, completed: list[tuple[JSONPath, Any]]) -> int:
+        end = _SCALAR.match(text, i).end()  # type: ignore[union-attr]
+        self._token.append(text[i:end])
+        if end < len(text):
+            self._complete_scalar(completed, end)
+        return end
+
+    def _complete_scalar(self, completed: list[tuple[JSONPath, Any]], i: int) -> None:
+        raw = "".join(self._token)
+        self._token.clear()
+        self._in_scalar = False
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            self._error(f"Invalid value {raw!r}", i)
+        self._complete(value, completed)
+
+    def _open(self, container: dict[str, Any] | list[Any], state: int) -> None:
+        if not self._containers:
+            self._root = container
+        else:
+            self._insert(container)
+        self._containers.append(container)
+        self._state = state
+
+    def _insert(self, value: Any) -> None:
+        parent = self._containers[-1]
+        if isinstance(parent, dict):
+            parent[self._path[-1]] = value  # type: ignore[index]
+        else:
+            parent.append(value)
+
+    def _close(self, completed: list[tuple[JSONPath, Any]]) -> None:
+        container = self._containers.pop()
+        if self._containers:
+            completed.append((tuple(self._path), container))
+            self._path.pop()
+            self._state = _COMMA_OR_END
+        else:
+            completed.append(((), container))
+            self._state = _DONE
+
+    def _complete(self, value: Any, completed: list[tuple[JSONPath, Any]]) -> None:
+        if not self._containers:
+            self._root = value
+            completed.append(((), value))
+            self._state = _DONE
+            return
+        self._insert(value)
+        completed.append((tuple(self._path), value))
+        self._path.pop()
+        self._state = _COMMA_OR_END
+
+    def _error(self, message: str, i: int) -> NoReturn:
+        raise ValueError(f"{message} at position {self._position + i}")
+
+
+async def stream_json_values(
+    stream: AsyncIterable[ChatCompletionChunk], choice_index: int = 0
+) -> AsyncGenerator[tuple[JSONPath, Any], None]:
+    """Yield each value of the JSON content of a `chat_completion_stream` as soon as it is complete,
+    as `(path, value)` pairs. See `JSONStreamParser`.
+
+    Args:
+        stream: The chunks of a `json_mode` or `structured_outputs` stream.
+        choice_index: Which choice's content to parse. Defaults to 0.
+
+    Raises:
+        ValueError: If the content is not valid JSON or the stream ends before it is complete.
+    """
+    parser = JSONStreamParser()
+    async for chunk in stream:
+        for choice in chunk.choices:
+            if choice.index == choice_index and choice.delta.content:
+                for completed in parser.feed(choice.delta.content):
+                    yield completed
+    # A top-level number is only complete once the stream ends
+    was_done = parser.done
+    value = parser.close()
+    if not was_done:
+        yield (), value
@@ -1,17 +1,24 @@
-from collections.abc import Callable
+from collections.abc import AsyncGenerator, Callable
 import os
 import time
 from typing import Any
 
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 from anthropic.types import Message
 
+from not_again_ai.base.concurrency import LoopLocal
 from not_again_ai.llm.chat_completion.types import (
     AssistantMessage,
     ChatCompletionChoice,
+    ChatCompletionChoiceStream,
+    ChatCompletionChunk,
+    ChatCompletionDelta,
     ChatCompletionRequest,
     ChatCompletionResponse,
     Function,
+    PartialFunction,
+    PartialToolCall,
+    StreamFinishReason,
     ToolCall,
 )
 
@@ -19,6 +26,17 @@ ANTHROPIC_PARAMETER_MAP = {
     "max_completion_tokens": "max_tokens",
 }
 
+# Maps Anthropic stop reasons onto the finish reasons of ChatCompletionChoiceStream
+ANTHROPIC_STREAM_FINISH_REASON_MAP: dict[str, StreamFinishReason] = {
+    "end_turn": "stop",
+    "stop_sequence": "stop",
+    "pause_turn": "stop",
+    "max_tokens": "length",
+    "model_context_window_exceeded": "length",
+    "tool_use": "tool_calls",
+    "refusal": "content_filter",
+}
+
 
 def anthropic_chat_completion(request: ChatCompletionRequest, client: Callable[..., Any]) -> ChatCompletionResponse:
     """Anthropic chat completion function.
@@ -30,6 +48,99 @@ def anthropic_chat_completion(request: ChatCompletionRequest, client: Callable[.
     - Stop sequences
     - Documents
     """
+    kwargs = format_kwargs(request)
+
+    start_time = time.time()
+    response: Message = client(**kwargs)
+    end_time = time.time()
+    response_duration = round(end_time - start_time, 4)
+
+    return parse_response(response, response_duration)
+
+
+async def anthropic_achat_completion(
+    request: ChatCompletionRequest, client: Callable[..., Any]
+) -> ChatCompletionResponse:
+    """Async version of `anthropic_chat_completion`. Requires a client created with `anthropic_client(async_client=True)`."""
+    kwargs = format_kwargs(request)
+
+    start_time = time.time()
+    response: Message = await client(**kwargs)
+    end_time = time.time()
+    response_duration = round(end_time - start_time, 4)
+
+    return parse_response(response, response_duration)
+
+
+async def anthropic_chat_completion_stream(
+    request: ChatCompletionRequest, client: Callable[..., Any]
+) -> AsyncGenerator[ChatCompletionChunk, None]:
+    """Stream an Anthropic chat completion. Requires a client created with `anthropic_client(async_client=True)`.
+
+    Text deltas are yielded as content. The first chunk of a tool call has its id and name, and the following
+    chunks have the next pieces of its JSON arguments, all with the same `index`, as in OpenAI streams.
+    The last chunk has the finish reason and token usage.
+    """
+    kwargs = format_kwargs(request)
+
+    start_time = time.perf_counter()
+    stream = await client(**kwargs)
+
+    prompt_tokens: int | None = None
+    # Anthropic indexes all content blocks, while tool calls are indexed among themselves
+    tool_call_indices: dict[int, int] = {}
+    async for event in stream:
+        if not isinstance(event, dict):
+            event = event.to_dict()
+
+        delta: ChatCompletionDelta | None = None
+        finish_reason: StreamFinishReason | None = None
+        completion_tokens = None
+        errors = ""
+        if event["type"] == "message_start":
+            usage = event["message"].get("usage") or {}
+            prompt_tokens = usage.get("input_tokens")
+        elif event["type"] == "content_block_start" and event["content_block"]["type"] == "tool_use":
+            tool_call_indices[event["index"]] = len(tool_call_indices)
+            tool_call = PartialToolCall(
+                id=event["content_block"]["id"],
+                index=tool_call_indices[event["index"]],
+                function=PartialFunction(name=event["content_block"]["name"], arguments=""),
+            )
+            delta = ChatCompletionDelta(content="", tool_calls=[tool_call])
+        elif event["type"] == "content_block_delta" and event["delta"]["type"] == "text_delta":
+            delta = ChatCompletionDelta(content=event["delta"]["text"])
+        elif event["type"] == "content_block_delta" and event["delta"]["type"] == "input_json_delta":
+            tool_call = PartialToolCall(
+                id=None,
+                index=tool_call_indices.get(event["index"]),
+                function=PartialFunction(name="", arguments=event["delta"]["partial_json"]),
+            )
+            delta = ChatCompletionDelta(content="", tool_calls=[tool_call])
+        elif event["type"] == "message_delta":
+            stop_reason = event["delta"].get("stop_reason")
+            finish_reason = ANTHROPIC_STREAM_FINISH_REASON_MAP.get(stop_reason, "stop") if stop_reason else None
+            usage = event.get("usage") or {}
+            completion_tokens = usage.get("output_tokens")
+            prompt_tokens = usage.get("input_tokens") or prompt_tokens
+            delta = ChatCompletionDelta(content="")
+        elif event["type"] == "error":
+            errors = str(event.get("error", {}).get("message", event.get("error", "")))
+            delta = ChatCompletionDelta(content="")
+        # Pings, thinking deltas and the end of content blocks and the message carry nothing to yield
+
+        if delta is None:
+            continue
+        yield ChatCompletionChunk(
+            choices=[ChatCompletionChoiceStream(delta=delta, finish_reason=finish_reason, index=0)],
+            errors=errors,
+            completion_tokens=completion_tokens,
+            prompt_tokens=prompt_tokens if finish_reason is not None else None,
+            response_duration=round(time.perf_counter() - start_time, 4),
+        )
+
+
+def format_kwargs(request: ChatCompletionRequest) -> dict[str, Any]:
     kwargs = request.model_dump(mode="json", exclude_none=True)
 
     # For each key in ANTHROPIC_PARAMETER_MAP
@@ -111,12 +222,11 @@ def anthropic_chat_completion(request: ChatCompletionRequest, client: Callable[.
                 tool_choice["disable_parallel_tool_use"] = not kwargs["parallel_tool_calls"]  # type: ignore
         kwargs["tool_choice"] = tool_choice
     kwargs.pop("parallel_tool_calls", None)
+    return kwargs
 
-    start_time = time.time()
-    response: Message = client(**kwargs)
-    end_time = time.time()
-    response_duration = round(end_time - start_time, 4)
 
+def parse_response(response: Message, response_duration: float) -> ChatCompletionResponse:
+    """Converts an Anthropic Message into a ChatCompletionResponse."""
     tool_calls: list[ToolCall] = []
     assistant_message = ""
     for block in response.content:
@@ -153,28 +263,38 @@ def anthropic_chat_completion(request: ChatCompletionRequest, client: Callable[.
     return chat_completion_response
 
 
-def create_client_callable(client_class: type[Anthropic], **client_args: Any) -> Callable[..., Any]:
-    """Creates a callable that instantiates and uses an Anthropic client.
+def create_client_callable(client_class: type[Anthropic | AsyncAnthropic], **client_args: Any) -> Callable[..., Any]:
+    """Creates a callable that uses a single Anthropic client instance shared across calls.
+    AsyncAnthropic clients are kept per event loop with `LoopLocal`.
 
     Args:
-        client_class: The Anthropic client class to instantiate
+        client_class: The Anthropic client class to instantiate (Anthropic or AsyncAnthropic)
         **client_args: Arguments to pass to the client constructor
 
     Returns:
-        A callable that creates a client and returns completion results
+        A callable that returns completion results using the shared client
     """
     filtered_args = {k: v for k, v in client_args.items() if v is not None}
+    if issubclass(client_class, AsyncAnthropic):
+        async_clients = LoopLocal(lambda: client_class(**filtered_args))
+
+        def async_client_callable(**kwargs: Any) -> Any:
+            return async_clients.get().beta.messages.create(**kwargs)
+
+        return async_client_callable
+
+    client = client_class(**filtered_args)
 
     def client_callable(**kwargs: Any) -> Any:
-        client = client_class(**filtered_args)
         completion = client.beta.messages.create(**kwargs)
         return completion
 
     return client_callable
 
 
-def anthropic_client(api_key: str | None = None) -> Callable[..., Any]:
+def anthropic_client(api_key: str | None = None, async_client: bool = False) -> Callable[..., Any]:
     if not api_key:
         api_key = os.environ.get("ANTHROPIC_API_KEY")
-    client_callable = create_client_callable(Anthropic, api_key=api_key)
+    client_class = AsyncAnthropic if async_client else Anthropic
+    client_callable = create_client_callable(client_class, api_key=api_key)
     return client_callable
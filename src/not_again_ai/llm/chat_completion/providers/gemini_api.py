@@ -1,5 +1,5 @@
 import base64
-from collections.abc import Callable
+from collections.abc import AsyncGenerator, Callable
 import os
 import time
 from typing import Any
@@ -8,14 +8,21 @@ from google import genai
 from google.genai import types
 from google.genai.types import FunctionCall, FunctionCallingConfigMode, GenerateContentResponse
 
+from not_again_ai.base.concurrency import LoopLocal
 from not_again_ai.llm.chat_completion.types import (
     AssistantMessage,
     ChatCompletionChoice,
+    ChatCompletionChoiceStream,
+    ChatCompletionChunk,
+    ChatCompletionDelta,
     ChatCompletionRequest,
     ChatCompletionResponse,
     Function,
     ImageContent,
+    PartialFunction,
+    PartialToolCall,
     Role,
+    StreamFinishReason,
     TextContent,
     ToolCall,
 )
@@ -42,9 +49,115 @@ GEMINI_FINISH_REASON_MAP = {
     "IMAGE_SAFETY": "image_safety",
 }
 
+# Maps Gemini finish reasons onto the finish reasons of ChatCompletionChoiceStream
+GEMINI_STREAM_FINISH_REASON_MAP: dict[str, StreamFinishReason] = {
+    "STOP": "stop",
+    "MAX_TOKENS": "length",
+    "SAFETY": "content_filter",
+    "RECITATION": "content_filter",
+    "BLOCKLIST": "content_filter",
+    "PROHIBITED_CONTENT": "content_filter",
+    "SPII": "content_filter",
+    "IMAGE_SAFETY": "content_filter",
+}
+
 
 def gemini_chat_completion(request: ChatCompletionRequest, client: Callable[..., Any]) -> ChatCompletionResponse:
     """Experimental Gemini chat completion function."""
+    kwargs = format_kwargs(request)
+
+    start_time = time.time()
+    response: GenerateContentResponse = client(**kwargs)
+    end_time = time.time()
+    response_duration = round(end_time - start_time, 4)
+
+    return parse_response(response, response_duration)
+
+
+async def gemini_achat_completion(request: ChatCompletionRequest, client: Callable[..., Any]) -> ChatCompletionResponse:
+    """Async version of `gemini_chat_completion`. Requires a client created with `gemini_client(async_client=True)`."""
+    kwargs = format_kwargs(request)
+
+    start_time = time.time()
+    response: GenerateContentResponse = await client(**kwargs)
+    end_time = time.time()
+    response_duration = round(end_time - start_time, 4)
+
+    return parse_response(response, response_duration)
+
+
+async def gemini_chat_completion_stream(
+    request: ChatCompletionRequest, client: Callable[..., Any]
+) -> AsyncGenerator[ChatCompletionChunk, None]:
+    """Stream a Gemini chat completion. Requires a client created with `gemini_client(async_client=True)`.
+
+    Gemini streams text in pieces but each function call whole, so a tool call is yielded in a single chunk
+    with its arguments as a dict. The chunk with the finish reason also has the token usage.
+    """
+    kwargs = format_kwargs(request)
+    kwargs["stream"] = True
+
+    start_time = time.perf_counter()
+    stream = await client(**kwargs)
+
+    num_tool_calls = 0
+    async for chunk in stream:
+        if not isinstance(chunk, dict):
+            chunk = chunk.model_dump(mode="json", exclude_none=True)
+
+        candidate = (chunk.get("candidates") or [{}])[0]
+        content = ""
+        tool_calls: list[PartialToolCall] = []
+        for part in (candidate.get("content") or {}).get("parts") or []:
+            # Thought summaries are not part of the response
+            if part.get("text") and not part.get("thought"):
+                content += part["text"]
+            elif part.get("function_call"):
+                tool_calls.append(
+                    PartialToolCall(
+                        id=part["function_call"].get("id") or "",
+                        index=num_tool_calls,
+                        function=PartialFunction(
+                            name=part["function_call"].get("name") or "",
+                            arguments=part["function_call"].get("args") or {},
+                        ),
+                    )
+                )
+                num_tool_calls += 1
+
+        finish_reason: StreamFinishReason | None = None
+        if candidate.get("finish_reason"):
+            finish_reason = GEMINI_STREAM_FINISH_REASON_MAP.get(candidate["finish_reason"], "stop")
+            if finish_reason == "stop" and num_tool_calls:
+                finish_reason = "tool_calls"
+
+        # Usage is repeated in every chunk as a running total, so it is only reported with the finish reason
+        completion_tokens = None
+        prompt_tokens = None
+        usage_metadata = chunk.get("usage_metadata")
+        if finish_reason is not None and usage_metadata:
+            completion_tokens = (usage_metadata.get("candidates_token_count") or 0) + (
+                usage_metadata.get("thoughts_token_count") or 0
+            )
+            prompt_tokens = usage_metadata.get("prompt_token_count") or 0
+
+        if not content and not tool_calls and finish_reason is None:
+            continue
+        yield ChatCompletionChunk(
+            choices=[
+                ChatCompletionChoiceStream(
+                    delta=ChatCompletionDelta(content=content, tool_calls=tool_calls or None),
+                    finish_reason=finish_reason,
+                    index=0,
+                )
+            ],
+            completion_tokens=completion_tokens,
+            prompt_tokens=prompt_tokens,
+            response_duration=round(time.perf_counter() - start_time, 4),
+        )
+
+
+def format_kwargs(request: ChatCompletionRequest) -> dict[str, Any]:
     # Handle messages
     # Any system messages need to be removed from messages and concatenated into a single string (in order)
     system = ""
@@ -144,12 +257,11 @@ def gemini_chat_completion(request: ChatCompletionRequest, client: Callable[...,
             config[value] = request_kwargs.pop(key)
 
     kwargs["config"] = types.GenerateContentConfig(**config)
+    return kwargs
 
-    start_time = time.time()
-    response: GenerateContentResponse = client(**kwargs)
-    end_time = time.time()
-    response_duration = round(end_time - start_time, 4)
 
+def parse_response(response: GenerateContentResponse, response_duration: float) -> ChatCompletionResponse:
+    """Converts a Gemini GenerateContentResponse into a ChatCompletionResponse."""
     finish_reason = "other"
     if response.candidates and response.candidates[0].finish_reason:
         finish_reason_str = str(response.candidates[0].finish_reason)
@@ -210,28 +322,45 @@ def gemini_chat_completion(request: ChatCompletionRequest, client: Callable[...,
     return chat_completion_response
 
 
-def create_client_callable(client_class: type[genai.Client], **client_args: Any) -> Callable[..., Any]:
-    """Creates a callable that instantiates and uses a Google genai client.
+def create_client_callable(
+    client_class: type[genai.Client], async_client: bool = False, **client_args: Any
+) -> Callable[..., Any]:
+    """Creates a callable that uses a single Google genai client instance shared across calls.
+    With `async_client`, clients are kept per event loop with `LoopLocal`.
 
     Args:
         client_class: The Google genai client class to instantiate
+        async_client: Whether the callable should use the client's async (`aio`) interface
         **client_args: Arguments to pass to the client constructor
 
     Returns:
-        A callable that creates a client and returns completion results
+        A callable that returns completion results using the shared client
     """
     filtered_args = {k: v for k, v in client_args.items() if v is not None}
+    if async_client:
+        async_clients = LoopLocal(lambda: client_class(**filtered_args))
+
+        def async_client_callable(**kwargs: Any) -> Any:
+            client = async_clients.get()
+            if kwargs.pop("stream", False):
+                return client.aio.models.generate_content_stream(**kwargs)
+            return client.aio.models.generate_content(**kwargs)
+
+        return async_client_callable
+
+    client = client_class(**filtered_args)
 
     def client_callable(**kwargs: Any) -> Any:
-        client = client_class(**filtered_args)
+        if kwargs.pop("stream", False):
+            return client.models.generate_content_stream(**kwargs)
         completion = client.models.generate_content(**kwargs)
         return completion
 
     return client_callable
 
 
-def gemini_client(api_key: str | None = None) -> Callable[..., Any]:
+def gemini_client(api_key: str | None = None, async_client: bool = False) -> Callable[..., Any]:
     if not api_key:
         api_key = os.environ.get("GEMINI_API_KEY")
-    client_callable = create_client_callable(genai.Client, api_key=api_key)
+    client_callable = create_client_callable(genai.Client, async_client=async_client, api_key=api_key)
     return client_callable
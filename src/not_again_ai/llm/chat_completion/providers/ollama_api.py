@@ -3,11 +3,12 @@ import json
 import os
 import re
 import time
-from typing import Any, Literal, cast
+from typing import Any, Literal, NoReturn, cast
 
 from loguru import logger
 from ollama import AsyncClient, ChatResponse, Client, ResponseError
 
+from not_again_ai.base.concurrency import LoopLocal
 from not_again_ai.llm.chat_completion.types import (
     AssistantMessage,
     ChatCompletionChoice,
@@ -157,13 +158,43 @@ def ollama_chat_completion(
         end_time = time.time()
         response_duration = round(end_time - start_time, 4)
     except ResponseError as e:
-        # If the error says "model 'model' not found" use regex then raise a more specific error
-        expected_pattern = f"model '{request.model}' not found"
-        if re.search(expected_pattern, e.error):
-            raise ResponseError(f"Model '{request.model}' not found.") from e
-        else:
-            raise ResponseError(e.error) from e
+        raise_response_error(request, e)
+
+    return parse_response(request, response, response_duration)
 
+
+async def ollama_achat_completion(
+    request: ChatCompletionRequest,
+    client: Callable[..., Any],
+) -> ChatCompletionResponse:
+    """Async version of `ollama_chat_completion`. Requires a client created with `ollama_client(async_client=True)`."""
+    validate(request)
+    kwargs = format_kwargs(request)
+
+    try:
+        start_time = time.time()
+        response: ChatResponse = await client(**kwargs)
+        end_time = time.time()
+        response_duration = round(end_time - start_time, 4)
+    except ResponseError as e:
+        raise_response_error(request, e)
+
+    return parse_response(request, response, response_duration)
+
+
+def raise_response_error(request: ChatCompletionRequest, e: ResponseError) -> NoReturn:
+    # If the error says "model 'model' not found" use regex then raise a more specific error
+    expected_pattern = f"model '{request.model}' not found"
+    if re.search(expected_pattern, e.error):
+        raise ResponseError(f"Model '{request.model}' not found.") from e
+    else:
+        raise ResponseError(e.error) from e
+
+
+def parse_response(
+    request: ChatCompletionRequest, response: ChatResponse, response_duration: float
+) -> ChatCompletionResponse:
+    """Converts an Ollama ChatResponse into a ChatCompletionResponse."""
     errors = ""
 
     # Handle tool calls
@@ -223,7 +254,7 @@ async def ollama_chat_completion_stream(
     validate(request)
     kwargs = format_kwargs(request)
 
-    start_time = time.time()
+    start_time = time.perf_counter()
     stream = await client(**kwargs)
 
     async for chunk in stream:
@@ -249,7 +280,7 @@ async def ollama_chat_completion_stream(
                 )
             tool_calls = parsed_tool_calls
 
-        current_time = time.time()
+        current_time = time.perf_counter()
         response_duration = round(current_time - start_time, 4)
 
         delta = ChatCompletionDelta(
@@ -277,9 +308,14 @@ def ollama_client(
 ) -> Callable[..., Any]:
     """Create an Ollama client instance based on the specified host or will read from the OLLAMA_HOST environment variable.
 
+    The underlying client is created once and shared across calls so its connection pool is reused.
+    Async clients are kept per event loop with `LoopLocal`.
+
     Args:
         host (str, optional): The host URL of the Ollama server.
         timeout (float, optional): The timeout for requests
+        async_client (bool, optional): Whether to return an async client, used by `achat_completion` and
+            `chat_completion_stream`. Defaults to False.
 
     Returns:
         Client: An instance of the Ollama client.
@@ -293,8 +329,17 @@ def ollama_client(
             logger.warning("OLLAMA_HOST environment variable not set, using default host: http://localhost:11434")
             host = "http://localhost:11434"
 
+    if async_client:
+        async_clients = LoopLocal(lambda: AsyncClient(host=host, timeout=timeout))
+
+        def async_client_callable(**kwargs: Any) -> Any:
+            return async_clients.get().chat(**kwargs)
+
+        return async_client_callable
+
+    client = Client(host=host, timeout=timeout)
+
     def client_callable(**kwargs: Any) -> Any:
-        client = AsyncClient(host=host, timeout=timeout) if async_client else Client(host=host, timeout=timeout)
         return client.chat(**kwargs)
 
     return client_callable
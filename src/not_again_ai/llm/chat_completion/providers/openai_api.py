@@ -1,11 +1,13 @@
-from collections.abc import AsyncGenerator, Callable, Coroutine
+from collections.abc import AsyncGenerator, Callable
 import json
 import time
 from typing import Any, Literal
 
 from azure.identity import DefaultAzureCredential, get_bearer_token_provider
-from openai import AsyncAzureOpenAI, AsyncOpenAI, AzureOpenAI, OpenAI
+import httpx
+from openai import AsyncAzureOpenAI, AsyncOpenAI, AzureOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
 
+from not_again_ai.base.concurrency import LoopLocal
 from not_again_ai.llm.chat_completion.types import (
     AssistantMessage,
     ChatCompletionChoice,
@@ -132,6 +134,29 @@ def openai_chat_completion(
     end_time = time.time()
     response_duration = round(end_time - start_time, 4)
 
+    return parse_response(request, response, response_duration)
+
+
+async def openai_achat_completion(
+    request: ChatCompletionRequest,
+    client: Callable[..., Any],
+) -> ChatCompletionResponse:
+    """Async version of `openai_chat_completion`. Requires a client created with `openai_client(async_client=True)`."""
+    validate(request)
+    kwargs = format_kwargs(request)
+
+    start_time = time.time()
+    response = await client(**kwargs)
+    end_time = time.time()
+    response_duration = round(end_time - start_time, 4)
+
+    return parse_response(request, response, response_duration)
+
+
+def parse_response(
+    request: ChatCompletionRequest, response: dict[str, Any], response_duration: float
+) -> ChatCompletionResponse:
+    """Converts an OpenAI chat completion response dict into a ChatCompletionResponse."""
     errors = ""
     extras: dict[str, Any] = {}
     choices: list[ChatCompletionChoice] = []
@@ -200,9 +225,9 @@ def openai_chat_completion(
     prompt_tokens = response["usage"].get("prompt_tokens", -1)
     completion_detailed_tokens = response["usage"].get("completion_detailed_tokens", None)
     prompt_detailed_tokens = response["usage"].get("prompt_detailed_tokens", None)
-    system_fingerprint = response.get("system_fingerprint", None)
+    system_fingerprint = response.get("system_fingerprint")
 
-    extras["prompt_filter_results"] = response.get("prompt_filter_results", None)
+    extras["prompt_filter_results"] = response.get("prompt_filter_results")
 
     return ChatCompletionResponse(
         choices=choices,
@@ -224,7 +249,7 @@ async def openai_chat_completion_stream(
     validate(request)
     kwargs = format_kwargs(request)
 
-    start_time = time.time()
+    start_time = time.perf_counter()
     stream = await client(**kwargs)
 
     async for chunk in stream:
@@ -264,6 +289,7 @@ async def openai_chat_completion_stream(
                                 name=tool_name,
                                 arguments=tool_args,
                             ),
+                            index=tool_call.get("index", None),
                         )
                     )
                 tool_calls = parsed_tool_calls
@@ -295,7 +321,7 @@ async def openai_chat_completion_stream(
             )
             choices.append(choice_obj)
 
-        current_time = time.time()
+        current_time = time.perf_counter()
         response_duration = round(current_time - start_time, 4)
 
         if "usage" in chunk and chunk["usage"] is not None:
@@ -318,38 +344,118 @@ async def openai_chat_completion_stream(
         yield chunk_obj
 
 
-def create_client_callable(client_class: type[OpenAI | AzureOpenAI], **client_args: Any) -> Callable[..., Any]:
-    """Creates a callable that instantiates and uses an OpenAI client.
+class OpenAIClientCallable:
+    """A callable that owns a long-lived OpenAI or Azure OpenAI client.
+
+    The client, and therefore its underlying httpx connection pool, is created once and reused across calls
+    so that TCP connections, TLS sessions and keep-alive sockets are not thrown away after every request.
+    Call `close()` or use the callable as a context manager to release the connection pool.
+    """
+
+    def __init__(self, client: OpenAI | AzureOpenAI):
+        self.client = client
+
+    def __call__(self, **kwargs: Any) -> Any:
+        completion = self.client.chat.completions.create(**kwargs)
+        return completion.to_dict()
+
+    def close(self) -> None:
+        """Close the underlying client and its connection pool."""
+        self.client.close()
+
+    def __enter__(self) -> "OpenAIClientCallable":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+class AsyncOpenAIClientCallable:
+    """The async counterpart of `OpenAIClientCallable`, owning long-lived AsyncOpenAI or AsyncAzureOpenAI clients.
+
+    The clients are created by `client_factory` and kept per event loop with `LoopLocal`, so every call on a loop
+    reuses that loop's client.
+    Call `aclose()` or use the callable as an async context manager to release the connection pool of the running loop.
+    """
+
+    def __init__(self, client_factory: Callable[[], AsyncOpenAI | AsyncAzureOpenAI]):
+        self._clients = LoopLocal(client_factory)
+
+    @property
+    def client(self) -> AsyncOpenAI | AsyncAzureOpenAI:
+        """The client of the running event loop."""
+        return self._clients.get()
+
+    async def __call__(self, **kwargs: Any) -> Any:
+        if kwargs.get("stream", False):
+            kwargs["stream_options"] = {"include_usage": True}
+            return await self.client.chat.completions.create(**kwargs)
+        completion = await self.client.chat.completions.create(**kwargs)
+        return completion.to_dict()
+
+    async def aclose(self) -> None:
+        """Close the client of the running event loop and its connection pool."""
+        client = self._clients.pop()
+        if client is not None:
+            await client.close()
+
+    async def __aenter__(self) -> "AsyncOpenAIClientCallable":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+
+def create_http_client(
+    async_client: bool = False,
+    max_connections: int = 1000,
+    max_keepalive_connections: int = 100,
+    keepalive_expiry: float = 5.0,
+    http2: bool = False,
+) -> httpx.Client | httpx.AsyncClient:
+    """Creates an httpx client with a configured connection pool for the OpenAI clients to use.
 
     Args:
-        client_class: The OpenAI client class to instantiate (OpenAI or AzureOpenAI)
-        **client_args: Arguments to pass to the client constructor
+        async_client: Whether to create an `httpx.AsyncClient` instead of an `httpx.Client`.
+        max_connections: Maximum number of concurrent connections in the pool.
+        max_keepalive_connections: Maximum number of idle connections kept alive in the pool.
+        keepalive_expiry: Seconds an idle keep-alive connection is kept before being closed.
+        http2: Whether to enable HTTP/2. Requires the `h2` package (`pip install httpx[http2]`).
 
     Returns:
-        A callable that creates a client and returns completion results
+        The httpx client to pass to the OpenAI client as `http_client`.
     """
-    filtered_args = {k: v for k, v in client_args.items() if v is not None}
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    if async_client:
+        return DefaultAsyncHttpxClient(limits=limits, http2=http2)
+    return DefaultHttpxClient(limits=limits, http2=http2)
 
-    def client_callable(**kwargs: Any) -> Any:
-        client = client_class(**filtered_args)
-        completion = client.chat.completions.create(**kwargs)
-        return completion.to_dict()
 
-    return client_callable
+def create_client_callable(client_class: type[OpenAI | AzureOpenAI], **client_args: Any) -> OpenAIClientCallable:
+    """Creates a callable that owns a single OpenAI client instance which is reused for every call.
 
+    Args:
+        client_class: The OpenAI client class to instantiate (OpenAI or AzureOpenAI)
+        **client_args: Arguments to pass to the client constructor
 
-def create_client_callable_stream(
-    client_class: type[AsyncOpenAI | AsyncAzureOpenAI], **client_args: Any
-) -> Callable[..., Any]:
+    Returns:
+        A callable that returns completion results using the shared client
+    """
     filtered_args = {k: v for k, v in client_args.items() if v is not None}
+    return OpenAIClientCallable(client_class(**filtered_args))
 
-    def client_callable(**kwargs: Any) -> Coroutine[Any, Any, Any]:
-        client = client_class(**filtered_args)
-        kwargs["stream_options"] = {"include_usage": True}
-        stream = client.chat.completions.create(**kwargs)
-        return stream
 
-    return client_callable
+def create_client_callable_stream(
+    client_class: type[AsyncOpenAI | AsyncAzureOpenAI],
+    http_client_factory: Callable[[], httpx.AsyncClient],
+    **client_args: Any,
+) -> AsyncOpenAIClientCallable:
+    filtered_args = {k: v for k, v in client_args.items() if v is not None}
+    return AsyncOpenAIClientCallable(lambda: client_class(**filtered_args, http_client=http_client_factory()))
 
 
 class InvalidOAIAPITypeError(Exception):
@@ -365,9 +471,18 @@ def openai_client(
     timeout: float | None = None,
     max_retries: int | None = None,
     async_client: bool = False,
-) -> Callable[..., Any]:
+    base_url: str | None = None,
+    max_connections: int = 1000,
+    max_keepalive_connections: int = 100,
+    keepalive_expiry: float = 5.0,
+    http2: bool = False,
+) -> OpenAIClientCallable | AsyncOpenAIClientCallable:
     """Create an OpenAI or Azure OpenAI client instance based on the specified API type and other provided parameters.
 
+    The returned callable owns a single long-lived client and connection pool that is reused across calls.
+    Release it with `close()` (or `aclose()` for async clients), or use it as a (async) context manager.
+    An async callable keeps one client per event loop, see `AsyncOpenAIClientCallable`.
+
     It is preferred to use RBAC authentication for Azure OpenAI. You must be signed in with the Azure CLI and have correct role assigned.
     See https://techcommunity.microsoft.com/t5/microsoft-developer-community/using-keyless-authentication-with-azure-openai/ba-p/4111521
 
@@ -385,10 +500,17 @@ def openai_client(
         max_retries (int, optional): Certain errors are automatically retried 2 times by default,
             with a short exponential backoff. Connection errors (for example, due to a network connectivity problem),
             408 Request Timeout, 409 Conflict, 429 Rate Limit, and >=500 Internal errors are all retried by default.
-        async_client (bool, optional): Whether to return an async client. Defaults to False.
+        async_client (bool, optional): Whether to return an async client, used by `achat_completion` and
+            `chat_completion_stream`. Defaults to False.
+        base_url (str, optional): Override the base URL of the OpenAI API, for example to target a proxy.
+            Only applicable if using OpenAI.
+        max_connections (int, optional): Maximum number of concurrent connections in the pool. Defaults to 1000.
+        max_keepalive_connections (int, optional): Maximum number of idle keep-alive connections. Defaults to 100.
+        keepalive_expiry (float, optional): Seconds an idle keep-alive connection is kept open. Defaults to 5.0.
+        http2 (bool, optional): Whether to enable HTTP/2. Requires `pip install httpx[http2]`. Defaults to False.
 
     Returns:
-        Callable[..., Any]: A callable that creates a client and returns completion results
+        OpenAIClientCallable | AsyncOpenAIClientCallable: A callable that owns a client and returns completion results
 
     Raises:
         InvalidOAIAPITypeError: If an invalid API type string is provided.
@@ -397,40 +519,38 @@ def openai_client(
     if api_type not in ["openai", "azure_openai"]:
         raise InvalidOAIAPITypeError(f"Invalid OAIAPIType: {api_type}. Must be 'openai' or 'azure_openai'.")
 
-    if api_type == "openai":
-        client_class = AsyncOpenAI if async_client else OpenAI
-        callable_creator = create_client_callable_stream if async_client else create_client_callable
-        return callable_creator(
-            client_class,  # type: ignore
-            api_key=api_key,
-            organization=organization,
-            timeout=timeout,
-            max_retries=max_retries,
+    def http_client_factory() -> Any:
+        return create_http_client(
+            async_client=async_client,
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+            http2=http2,
         )
+
+    client_class: type[OpenAI | AzureOpenAI]
+    async_client_class: type[AsyncOpenAI | AsyncAzureOpenAI]
+    if api_type == "openai":
+        client_class, async_client_class = OpenAI, AsyncOpenAI
+        client_args: dict[str, Any] = {"api_key": api_key, "organization": organization, "base_url": base_url}
     elif api_type == "azure_openai":
-        azure_client_class = AsyncAzureOpenAI if async_client else AzureOpenAI
-        callable_creator = create_client_callable_stream if async_client else create_client_callable
+        client_class, async_client_class = AzureOpenAI, AsyncAzureOpenAI
+        client_args = {"api_version": aoai_api_version, "azure_endpoint": azure_endpoint}
         if api_key:
-            return callable_creator(
-                azure_client_class,  # type: ignore
-                api_version=aoai_api_version,
-                azure_endpoint=azure_endpoint,
-                api_key=api_key,
-                timeout=timeout,
-                max_retries=max_retries,
-            )
+            client_args["api_key"] = api_key
         else:
             azure_credential = DefaultAzureCredential()
-            ad_token_provider = get_bearer_token_provider(
+            client_args["azure_ad_token_provider"] = get_bearer_token_provider(
                 azure_credential, "https://cognitiveservices.azure.com/.default"
             )
-            return callable_creator(
-                azure_client_class,  # type: ignore
-                api_version=aoai_api_version,
-                azure_endpoint=azure_endpoint,
-                azure_ad_token_provider=ad_token_provider,
-                timeout=timeout,
-                max_retries=max_retries,
-            )
     else:
         raise NotImplementedError(f"API type '{api_type}' is invalid.")
+
+    if async_client:
+        # Async clients are created on first use in each event loop, each with its own connection pool
+        return create_client_callable_stream(
+            async_client_class, http_client_factory, timeout=timeout, max_retries=max_retries, **client_args
+        )
+    return create_client_callable(
+        client_class, timeout=timeout, max_retries=max_retries, http_client=http_client_factory(), **client_args
+    )
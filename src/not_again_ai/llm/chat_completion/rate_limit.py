@@ -0,0 +1,238 @@
+import asyncio
+from collections.abc import Callable
+import threading
+import time
+from typing import Any
+
+from pydantic import BaseModel
+
+from not_again_ai.base.concurrency import wrap_client
+from not_again_ai.llm.prompting.interface import Tokenizer
+from not_again_ai.llm.prompting.types import BaseTokenizer
+
+# Keys in the provider formatted kwargs that bound the number of completion tokens a request can use.
+MAX_OUTPUT_TOKENS_KEYS = ["max_completion_tokens", "max_tokens", "num_predict", "max_output_tokens"]
+
+
+class TokenBucket:
+    """A thread-safe token bucket holding up to `capacity_per_minute` tokens, refilled continuously.
+
+    Callers reserve capacity up front with `reserve`, which may take the bucket negative, and then wait the returned
+    number of seconds before proceeding. This makes waiting first-come first-served and works identically for
+    threads (`time.sleep`) and asyncio (`asyncio.sleep`).
+    """
+
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = capacity_per_minute
+        self.refill_rate = capacity_per_minute / 60
+        self.tokens = capacity_per_minute
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
+    def reserve(self, amount: float) -> float:
+        """Reserve `amount` tokens and return the number of seconds to wait before they are available."""
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.refill_rate)
+
+    def adjust(self, amount: float) -> None:
+        """Return `amount` tokens to the bucket, or take more if `amount` is negative."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiterStats(BaseModel):
+    requests: int = 0
+    estimated_tokens: int = 0
+    actual_tokens: int = 0
+    total_wait_time: float = 0.0
+
+
+class RateLimiter:
+    """Limits requests per minute (RPM) and tokens per minute (TPM) before requests are sent to a provider.
+
+    The prompt tokens of each request are estimated with a `Tokenizer` and, together with the request's maximum
+    completion tokens, reserved from the TPM bucket. Once the provider responds, the reservation is corrected to the
+    prompt and completion token usage the provider reported.
+    A single limiter can be shared by any number of threads and asyncio tasks.
+
+    Args:
+        requests_per_minute: The RPM quota. If None, requests are not limited.
+        tokens_per_minute: The TPM quota. If None, tokens are not limited.
+        provider: The provider name used to pick a tokenizer for estimating prompt tokens. Defaults to "openai".
+        tokenizer: A tokenizer to estimate prompt tokens with. If not provided, one is created per model.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        provider: str = "openai",
+        tokenizer: BaseTokenizer | None = None,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.provider = provider
+        self.tokenizer = tokenizer
+        self.stats = RateLimiterStats()
+        self._tokenizers: dict[str, BaseTokenizer] = {}
+        self._lock = threading.Lock()
+
+    def _get_tokenizer(self, model: str) -> BaseTokenizer:
+        if self.tokenizer is not None:
+            return self.tokenizer
+        with self._lock:
+            if model not in self._tokenizers:
+                self._tokenizers[model] = Tokenizer(model=model, provider=self.provider)
+            return self._tokenizers[model]
+
+    def estimate_tokens(self, kwargs: dict[str, Any]) -> int:
+        """Estimate the tokens a request will use from the kwargs a client callable is called with.
+
+        The estimate is the number of tokens in every string of the request (excluding the model name and image data)
+        plus the maximum number of completion tokens, if one is set.
+        """
+        tokenizer = self._get_tokenizer(kwargs.get("model", ""))
+        prompt_tokens = sum(
+            tokenizer.num_tokens_in_str(text)
+            for key, value in kwargs.items()
+            if key != "model"
+            for text in _collect_strings(value)
+        )
+        return prompt_tokens + _max_output_tokens(kwargs)
+
+    def _reserve(self, kwargs: dict[str, Any]) -> tuple[int, float]:
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = self.request_bucket.reserve(1)
+        estimated_tokens = 0
+        if self.token_bucket is not None:
+            estimated_tokens = self.estimate_tokens(kwargs)
+            wait = max(wait, self.token_bucket.reserve(estimated_tokens))
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.estimated_tokens += estimated_tokens
+            self.stats.total_wait_time += wait
+        return estimated_tokens, wait
+
+    def acquire(self, kwargs: dict[str, Any]) -> int:
+        """Block the calling thread until the request described by `kwargs` fits within the limits.
+
+        Returns:
+            int: The number of tokens reserved, to pass to `correct` once the response arrives.
+        """
+        estimated_tokens, wait = self._reserve(kwargs)
+        if wait > 0:
+            time.sleep(wait)
+        return estimated_tokens
+
+    async def aacquire(self, kwargs: dict[str, Any]) -> int:
+        """Async version of `acquire` that waits without blocking the event loop."""
+        estimated_tokens, wait = self._reserve(kwargs)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return estimated_tokens
+
+    def correct(self, estimated_tokens: int, response: Any) -> None:
+        """Correct a reservation made by `acquire` using the token usage reported in the provider's response."""
+        if self.token_bucket is None:
+            return
+        actual_tokens = _usage_tokens(response)
+        if actual_tokens is None:
+            return
+        self.token_bucket.adjust(estimated_tokens - actual_tokens)
+        with self._lock:
+            self.stats.actual_tokens += actual_tokens
+
+    def release(self, estimated_tokens: int) -> None:
+        """Return the tokens reserved by `acquire` for a call that failed without a response.
+        The request itself still counts towards the requests per minute."""
+        if self.token_bucket is not None:
+            self.token_bucket.adjust(estimated_tokens)
+
+
+def rate_limited_client(
+    client: Callable[..., Any], limiter: RateLimiter, async_client: bool = False
+) -> Callable[..., Any]:
+    """Wraps a client callable (from `openai_client`, `anthropic_client`, `gemini_client` or `ollama_client`)
+    so that every call first waits for capacity from `limiter`.
+
+    Args:
+        client: The client callable to wrap.
+        limiter: The rate limiter to reserve capacity from. Share one limiter between all clients of a deployment.
+        async_client: Must be True if `client` is an async client callable. Defaults to False.
+
+    Returns:
+        Callable[..., Any]: A client callable that can be used anywhere the original client can.
+
+    Examples:
+        >>> limiter = RateLimiter(requests_per_minute=500, tokens_per_minute=200_000)
+        >>> client = rate_limited_client(openai_client(), limiter)
+        >>> response = chat_completion(request, "openai", client)
+    """
+    return wrap_client(
+        client,
+        acquire=limiter.acquire,
+        aacquire=limiter.aacquire,
+        on_success=limiter.correct,
+        on_error=lambda estimated_tokens, e: limiter.release(estimated_tokens),
+        async_client=async_client,
+    )
+
+
+def _collect_strings(value: Any) -> list[str]:
+    """Collect the strings within a provider request payload, skipping base64 image data URLs."""
+    if isinstance(value, str):
+        return [] if value.startswith("data:") else [value]
+    if isinstance(value, BaseModel):
+        return _collect_strings(value.model_dump(exclude_none=True))
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in _collect_strings(item)]
+    if isinstance(value, list | tuple):
+        return [text for item in value for text in _collect_strings(item)]
+    return []
+
+
+def _max_output_tokens(kwargs: dict[str, Any]) -> int:
+    # Ollama and Gemini nest generation parameters in "options" and "config" respectively
+    for params in [kwargs, kwargs.get("options") or {}, kwargs.get("config") or {}]:
+        if isinstance(params, BaseModel):
+            params = params.model_dump(exclude_none=True)
+        for key in MAX_OUTPUT_TOKENS_KEYS:
+            if isinstance(params, dict) and params.get(key) is not None:
+                return int(params[key])
+    return 0
+
+
+def _usage_tokens(response: Any) -> int | None:
+    """The total prompt and completion tokens reported by a provider response, or None if it is not reported
+    (for example for streamed responses)."""
+    # OpenAI and Azure OpenAI client callables return dicts
+    if isinstance(response, dict):
+        usage = response.get("usage") or {}
+        if "prompt_tokens" in usage or "completion_tokens" in usage:
+            return int(usage.get("prompt_tokens") or 0) + int(usage.get("completion_tokens") or 0)
+        return None
+    # Anthropic
+    usage = getattr(response, "usage", None)
+    if usage is not None and hasattr(usage, "input_tokens"):
+        return int(usage.input_tokens or 0) + int(usage.output_tokens or 0)
+    # Gemini
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if usage_metadata is not None:
+        return (
+            int(usage_metadata.prompt_token_count or 0)
+            + int(usage_metadata.candidates_token_count or 0)
+            + int(usage_metadata.thoughts_token_count or 0)
+        )
+    # Ollama
+    if getattr(response, "prompt_eval_count", None) is not None or getattr(response, "eval_count", None) is not None:
+        return int(response.prompt_eval_count or 0) + int(response.eval_count or 0)
+    return None
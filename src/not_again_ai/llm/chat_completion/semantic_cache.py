@@ -0,0 +1,272 @@
+import asyncio
+from collections.abc import Callable
+import hashlib
+import json
+from pathlib import Path
+import threading
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from not_again_ai.llm.cache_stats import CacheStats
+from not_again_ai.llm.chat_completion.cache import CacheMode
+from not_again_ai.llm.chat_completion.interface import achat_completion, chat_completion
+from not_again_ai.llm.chat_completion.types import ChatCompletionRequest, ChatCompletionResponse, Role, TextContent
+from not_again_ai.llm.embedding import EmbeddingRequest, create_embeddings
+
+
+class SemanticCache:
+    """An opt-in cache that returns a stored response when a new prompt is semantically close to one already answered.
+
+    The last user message of each request is embedded with `create_embeddings` and compared, using cosine similarity,
+    against the previously answered prompts that share the exact same context (provider, model, parameters and all
+    other messages). If the most similar prompt meets `similarity_threshold` its response is returned, marked with
+    `extras["cache_hit"]` and `extras["cache_similarity"]`.
+
+    Vectors are kept in a normalized float32 matrix so each lookup is a single matrix-vector product. The matrix
+    grows geometrically up to `max_size` rows as prompts are added.
+    When `max_size` prompts are stored, the least recently used one is evicted.
+
+    Args:
+        embedding_client: Client callable for `create_embeddings`.
+        embedding_provider: Provider name for `create_embeddings`.
+        embedding_model: The embedding model to use.
+        similarity_threshold: Minimum cosine similarity for a hit. Defaults to 0.95.
+        max_size: Maximum number of prompts to store. Defaults to 10,000.
+        path: Directory to persist the cache to with `save()`. If it already contains a saved cache, it is loaded.
+        embedding_dimensions: Optional dimensions to request from the embedding model.
+    """
+
+    def __init__(
+        self,
+        embedding_client: Callable[..., Any],
+        embedding_provider: str,
+        embedding_model: str,
+        similarity_threshold: float = 0.95,
+        max_size: int = 10_000,
+        path: str | Path | None = None,
+        embedding_dimensions: int | None = None,
+    ):
+        self.embedding_client = embedding_client
+        self.embedding_provider = embedding_provider
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self.path = Path(path) if path is not None else None
+        self.stats = CacheStats()
+
+        self._vectors: npt.NDArray[np.float32] | None = None
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._context_keys: list[str] = []
+        self._responses: list[ChatCompletionResponse] = []
+        self._clock = 0
+        self._lock = threading.Lock()
+
+        if self.path is not None and (self.path / "vectors.npy").exists():
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    @staticmethod
+    def split_request(request: ChatCompletionRequest, provider: str) -> tuple[str, str] | None:
+        """Split a request into the hash of its context, including `provider`, and the text of its last user message.
+
+        Returns None if the request has no user message with text, in which case it is not cached.
+        """
+        for position in range(len(request.messages) - 1, -1, -1):
+            message = request.messages[position]
+            if message.role != Role.USER:
+                continue
+            if isinstance(message.content, str):
+                prompt = message.content
+            else:
+                prompt = "\n".join(part.text for part in message.content if isinstance(part, TextContent))
+            if not prompt:
+                return None
+            context = request.model_dump(mode="json", exclude_none=True, exclude={"stream"})
+            context["messages"][position]["content"] = None
+            context["provider"] = provider
+            serialized = json.dumps(context, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+            return hashlib.sha256(serialized.encode("utf-8")).hexdigest(), prompt
+        return None
+
+    def embed(self, text: str) -> npt.NDArray[np.float32]:
+        """Embed `text` and return it as a normalized float32 vector."""
+        response = create_embeddings(
+            EmbeddingRequest(input=text, model=self.embedding_model, dimensions=self.embedding_dimensions),
+            self.embedding_provider,
+            self.embedding_client,
+        )
+        vector = np.asarray(response.embeddings[0].embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def search(self, context_key: str, vector: npt.NDArray[np.float32]) -> tuple[int, float] | None:
+        """Find the stored prompt with the same context that is most similar to `vector`.
+
+        Returns:
+            The slot and cosine similarity of the best match, or None if no prompt shares the context.
+        """
+        with self._lock:
+            return self._search(context_key, vector)
+
+    def _search(self, context_key: str, vector: npt.NDArray[np.float32]) -> tuple[int, float] | None:
+        # The caller must hold the lock, so that the slot still holds the match when it is used
+        if self._vectors is None or not self._responses:
+            return None
+        size = len(self._responses)
+        similarities = self._vectors[:size] @ vector
+        same_context = np.fromiter((key == context_key for key in self._context_keys), dtype=bool, count=size)
+        if not same_context.any():
+            return None
+        similarities = np.where(same_context, similarities, -np.inf)
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def get(self, context_key: str, vector: npt.NDArray[np.float32]) -> ChatCompletionResponse | None:
+        with self._lock:
+            match = self._search(context_key, vector)
+            if match is None or match[1] < self.similarity_threshold:
+                self.stats.misses += 1
+                return None
+            slot, similarity = match
+            self.stats.hits += 1
+            self._clock += 1
+            self._last_used[slot] = self._clock
+            cached = self._responses[slot]
+        extras = cached.extras if isinstance(cached.extras, dict) else {}
+        return cached.model_copy(update={"extras": {**extras, "cache_hit": True, "cache_similarity": similarity}})
+
+    def add(self, context_key: str, vector: npt.NDArray[np.float32], response: ChatCompletionResponse) -> None:
+        """Store `response` for the prompt `vector`. If a stored prompt with the same context meets
+        `similarity_threshold`, its response is replaced rather than adding a near-duplicate.
+        Otherwise the least recently used prompt is evicted if the cache is full."""
+        with self._lock:
+            match = self._search(context_key, vector)
+            if match is not None and match[1] >= self.similarity_threshold:
+                slot = match[0]
+                self._responses[slot] = response
+            elif len(self._responses) < self.max_size:
+                slot = len(self._responses)
+                self._reserve(slot + 1, vector.shape[0])
+                self._responses.append(response)
+                self._context_keys.append(context_key)
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._responses[slot] = response
+                self._context_keys[slot] = context_key
+            assert self._vectors is not None
+            self._vectors[slot] = vector
+            self._clock += 1
+            self._last_used[slot] = self._clock
+
+    def _reserve(self, size: int, dimensions: int) -> None:
+        # Doubling the capacity keeps the total cost of copying the vectors while growing linear in their number
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if size <= capacity:
+            return
+        capacity = min(self.max_size, max(size, 2 * capacity, 16))
+        vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        last_used = np.zeros(capacity, dtype=np.int64)
+        if self._vectors is not None:
+            vectors[: self._vectors.shape[0]] = self._vectors
+            last_used[: self._last_used.shape[0]] = self._last_used
+        self._vectors = vectors
+        self._last_used = last_used
+
+    def chat_completion(
+        self,
+        request: ChatCompletionRequest,
+        provider: str,
+        client: Callable[..., Any],
+        mode: CacheMode = "use",
+    ) -> ChatCompletionResponse:
+        """`chat_completion` that returns a stored response for semantically similar prompts.
+
+        Args:
+            request: Request parameter object
+            provider: The supported provider name
+            client: Client information, see the provider's implementation for what can be provided
+            mode: "use" (default) reads and writes the cache, "refresh" always calls the provider and stores
+                the new response, and "bypass" calls the provider without touching the cache.
+                Responses with errors are never stored.
+
+        Returns:
+            ChatCompletionResponse: The chat completion response.
+        """
+        split = self.split_request(request, provider) if mode != "bypass" else None
+        if split is None:
+            return chat_completion(request, provider, client)
+        context_key, prompt = split
+        vector = self.embed(prompt)
+        if mode == "use":
+            cached = self.get(context_key, vector)
+            if cached is not None:
+                return cached
+        response = chat_completion(request, provider, client)
+        if not response.errors:
+            self.add(context_key, vector, response)
+        return response
+
+    async def achat_completion(
+        self,
+        request: ChatCompletionRequest,
+        provider: str,
+        client: Callable[..., Any],
+        mode: CacheMode = "use",
+    ) -> ChatCompletionResponse:
+        """Async version of `SemanticCache.chat_completion`. The prompt is embedded in a worker thread."""
+        split = self.split_request(request, provider) if mode != "bypass" else None
+        if split is None:
+            return await achat_completion(request, provider, client)
+        context_key, prompt = split
+        vector = await asyncio.to_thread(self.embed, prompt)
+        if mode == "use":
+            cached = self.get(context_key, vector)
+            if cached is not None:
+                return cached
+        response = await achat_completion(request, provider, client)
+        if not response.errors:
+            self.add(context_key, vector, response)
+        return response
+
+    def save(self, path: str | Path | None = None) -> None:
+        """Persist the cache to the directory `path` (defaults to the `path` given at construction)."""
+        directory = Path(path) if path is not None else self.path
+        if directory is None:
+            raise ValueError("A path must be provided to save the semantic cache.")
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            size = len(self._responses)
+            vectors = self._vectors[:size] if self._vectors is not None else np.zeros((0, 0), dtype=np.float32)
+            np.save(directory / "vectors.npy", vectors)
+            np.save(directory / "last_used.npy", self._last_used[:size])
+            entries = [
+                {"context_key": key, "response": response.model_dump(mode="json")}
+                for key, response in zip(self._context_keys, self._responses, strict=True)
+            ]
+        with Path.open(directory / "entries.json", "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+
+    def load(self, path: str | Path | None = None) -> None:
+        """Load a cache previously persisted with `save`, replacing the current contents."""
+        directory = Path(path) if path is not None else self.path
+        if directory is None:
+            raise ValueError("A path must be provided to load the semantic cache.")
+        vectors = np.load(directory / "vectors.npy")
+        last_used = np.load(directory / "last_used.npy")
+        with Path.open(directory / "entries.json", encoding="utf-8") as f:
+            entries = json.load(f)
+
+        # Keep the most recently used entries if the saved cache is larger than max_size
+        keep = np.argsort(last_used)[::-1][: self.max_size]
+        keep.sort()
+        with self._lock:
+            self._vectors = vectors[keep].astype(np.float32) if len(keep) > 0 else None
+            self._last_used = last_used[keep].astype(np.int64)
+            self._clock = int(last_used.max()) if len(last_used) > 0 else 0
+            self._context_keys = [entries[i]["context_key"] for i in keep]
+            self._responses = [ChatCompletionResponse.model_validate(entries[i]["response"]) for i in keep]
@@ -0,0 +1,173 @@
+from collections.abc import AsyncGenerator, AsyncIterable
+import json
+from typing import Any
+
+from not_again_ai.llm.chat_completion.types import (
+    AssistantMessage,
+    ChatCompletionChoice,
+    ChatCompletionChunk,
+    ChatCompletionRequest,
+    ChatCompletionResponse,
+    Function,
+    PartialToolCall,
+    ToolCall,
+)
+
+
+class _ToolCallParts:
+    def __init__(self, id: str | None):
+        self.id = id or ""
+        self.name_parts: list[str] = []
+        self.argument_parts: list[str] = []
+        self.arguments: dict[str, Any] | None = None
+
+
+class _ChoiceParts:
+    def __init__(self) -> None:
+        self.content_parts: list[str] = []
+        self.refusal_parts: list[str] = []
+        self.tool_calls: list[_ToolCallParts] = []
+        self.tool_call_indices: dict[int, _ToolCallParts] = {}
+        self.finish_reason: str | None = None
+        self.logprobs: list[dict[str, Any] | list[dict[str, Any]]] = []
+
+    def add_tool_call(self, tool_call: PartialToolCall) -> None:
+        arguments = tool_call.function.arguments
+        if tool_call.index is not None:
+            # Providers that split tool calls into fragments identify them by index
+            parts = self.tool_call_indices.get(tool_call.index)
+            if parts is None:
+                parts = self.tool_call_indices[tool_call.index] = _ToolCallParts(tool_call.id)
+                self.tool_calls.append(parts)
+        elif tool_call.id or isinstance(arguments, dict) or not self.tool_calls:
+            # Otherwise a fragment with an id or complete arguments starts a new tool call
+            parts = _ToolCallParts(tool_call.id)
+            self.tool_calls.append(parts)
+        else:
+            parts = self.tool_calls[-1]
+
+        if tool_call.id and not parts.id:
+            parts.id = tool_call.id
+        if tool_call.function.name:
+            parts.name_parts.append(tool_call.function.name)
+        if isinstance(arguments, dict):
+            parts.arguments = arguments
+        elif arguments:
+            parts.argument_parts.append(arguments)
+
+
+class StreamAccumulator:
+    """Assembles the chunks of `chat_completion_stream` into the `ChatCompletionResponse` the non-streaming
+    `chat_completion` would have returned, while the chunks are forwarded as they arrive.
+
+    Content and tool call arguments are collected as lists of pieces and joined once at the end, so the work
+    is linear in the length of the response. Tool call fragments are merged by their `index`.
+    Token usage, the system fingerprint and the duration are taken from the last chunk that reports them.
+
+    Args:
+        request: The streamed request. If it has `json_mode` or `structured_outputs` set, the content of each
+            choice is parsed into `json_message`, as in non-streaming responses.
+
+    Examples:
+        >>> accumulator = StreamAccumulator(request)
+        >>> async for chunk in accumulator.accumulate(chat_completion_stream(request, "openai", client)):
+        ...     print(chunk.choices[0].delta.content, end="")
+        >>> response = accumulator.response()
+    """
+
+    def __init__(self, request: ChatCompletionRequest | None = None):
+        self.request = request
+        self._choices: dict[int, _ChoiceParts] = {}
+        self._errors: list[str] = []
+        self.completion_tokens: int | None = None
+        self.prompt_tokens: int | None = None
+        self.response_duration: float | None = None
+        self.system_fingerprint: str | None = None
+
+    def add(self, chunk: ChatCompletionChunk) -> ChatCompletionChunk:
+        """Add a chunk and return it unchanged."""
+        for choice in chunk.choices:
+            parts = self._choices.get(choice.index)
+            if parts is None:
+                parts = self._choices[choice.index] = _ChoiceParts()
+            if choice.delta.content:
+                parts.content_parts.append(choice.delta.content)
+            if choice.delta.refusal:
+                parts.refusal_parts.append(choice.delta.refusal)
+            for tool_call in choice.delta.tool_calls or []:
+                parts.add_tool_call(tool_call)
+            if choice.logprobs:
+                parts.logprobs.extend(choice.logprobs)
+            if choice.finish_reason is not None:
+                parts.finish_reason = choice.finish_reason
+
+        if chunk.errors:
+            self._errors.append(chunk.errors)
+        if chunk.completion_tokens is not None:
+            self.completion_tokens = chunk.completion_tokens
+        if chunk.prompt_tokens is not None:
+            self.prompt_tokens = chunk.prompt_tokens
+        if chunk.response_duration is not None:
+            self.response_duration = chunk.response_duration
+        if chunk.system_fingerprint is not None:
+            self.system_fingerprint = chunk.system_fingerprint
+        return chunk
+
+    async def accumulate(self, stream: AsyncIterable[ChatCompletionChunk]) -> AsyncGenerator[ChatCompletionChunk, None]:
+        """Add each chunk of `stream` and yield it on, so that the caller can forward the deltas live."""
+        async for chunk in stream:
+            yield self.add(chunk)
+
+    def response(self) -> ChatCompletionResponse:
+        """The response assembled from the chunks added so far."""
+        errors = list(self._errors)
+        choices: list[ChatCompletionChoice] = []
+        for index in sorted(self._choices):
+            parts = self._choices[index]
+            content = "".join(parts.content_parts)
+
+            tool_calls: list[ToolCall] = []
+            for tool_call in parts.tool_calls:
+                arguments = tool_call.arguments
+                if arguments is None:
+                    try:
+                        arguments = json.loads("".join(tool_call.argument_parts) or "{}")
+                    except json.JSONDecodeError:
+                        errors.append(f"Choice {index}: Tool call {tool_call.id} failed to parse arguments into JSON")
+                        arguments = {}
+                tool_calls.append(
+                    ToolCall(
+                        id=tool_call.id, function=Function(name="".join(tool_call.name_parts), arguments=arguments)
+                    )
+                )
+
+            json_message = None
+            if self.request is not None and (self.request.json_mode or self.request.structured_outputs is not None):
+                try:
+                    json_message = json.loads(content or "{}")
+                except json.JSONDecodeError:
+                    errors.append(f"Choice {index}: Message failed to parse into JSON")
+
+            if parts.finish_reason is None:
+                errors.append(f"Choice {index}: Stream ended without a finish reason")
+            choices.append(
+                ChatCompletionChoice(
+                    message=AssistantMessage(
+                        content=content,
+                        refusal="".join(parts.refusal_parts) or None,
+                        tool_calls=tool_calls or None,
+                    ),
+                    finish_reason=parts.finish_reason or "stop",
+                    json_message=json_message,
+                    logprobs=parts.logprobs or None,
+                )
+            )
+
+        return ChatCompletionResponse(
+            choices=choices,
+            errors="\n".join(errors),
+            completion_tokens=self.completion_tokens if self.completion_tokens is not None else -1,
+            prompt_tokens=self.prompt_tokens if self.prompt_tokens is not None else -1,
+            response_duration=self.response_duration or 0.0,
+            system_fingerprint=self.system_fingerprint,
+        )
@@ -0,0 +1,174 @@
+from collections.abc import AsyncGenerator, AsyncIterable, Iterable
+from itertools import pairwise
+
+from pydantic import BaseModel, Field
+
+from not_again_ai.llm.chat_completion.types import ChatCompletionChunk
+
+
+class StreamMetrics(BaseModel):
+    """Latency and throughput of one `chat_completion_stream`. Times are in seconds since the request was sent,
+    and are None if the stream never produced what they measure."""
+
+    time_to_first_chunk: float | None = Field(default=None)
+    time_to_first_token: float | None = Field(
+        default=None, description="Time to the first chunk with content, a refusal or a tool call."
+    )
+    time_to_first_content: float | None = Field(default=None)
+    time_to_first_tool_call: float | None = Field(default=None)
+    duration: float = Field(default=0.0, description="Time to the last chunk.")
+    num_chunks: int = Field(default=0)
+
+    inter_chunk_gaps: list[float] = Field(
+        default_factory=list, description="Time between each chunk with generated output and the previous one."
+    )
+    inter_chunk_p50: float | None = Field(default=None)
+    inter_chunk_p95: float | None = Field(default=None)
+    inter_chunk_max: float | None = Field(default=None)
+
+    completion_tokens: int | None = Field(default=None)
+    tokens_per_second: float | None = Field(
+        default=None,
+        description="Completion tokens per second after the first token. None if the provider did not report usage.",
+    )
+
+
+class LatencySummary(BaseModel):
+    count: int
+    mean: float | None
+    p50: float | None
+    p95: float | None
+    p99: float | None
+    max: float | None
+
+
+class StreamMetricsSummary(BaseModel):
+    """Distributions of `StreamMetrics` over many streams. See `summarize_stream_metrics`."""
+
+    num_streams: int
+    time_to_first_token: LatencySummary
+    time_to_first_tool_call: LatencySummary
+    duration: LatencySummary
+    inter_chunk_gap: LatencySummary
+    tokens_per_second: LatencySummary
+
+
+class StreamMetricsRecorder:
+    """Measures the time to first token, the gaps between chunks and the token throughput of a
+    `chat_completion_stream` from the `response_duration` of its chunks, which every provider measures
+    on a monotonic clock from just before the request is sent.
+
+    Recording a chunk only appends a float, so it can be left on in production streams.
+
+    Examples:
+        >>> recorder = StreamMetricsRecorder()
+        >>> async for chunk in recorder.record(chat_completion_stream(request, "openai", client)):
+        ...     print(chunk.choices[0].delta.content, end="")
+        >>> recorder.metrics().time_to_first_token
+        0.3417
+    """
+
+    def __init__(self) -> None:
+        self.num_chunks = 0
+        self.time_to_first_chunk: float | None = None
+        self.time_to_first_content: float | None = None
+        self.time_to_first_tool_call: float | None = None
+        self.completion_tokens: int | None = None
+        self._last_time = 0.0
+        # Arrival times of the chunks with generated output
+        self._output_times: list[float] = []
+
+    def add(self, chunk: ChatCompletionChunk) -> ChatCompletionChunk:
+        """Record a chunk and return it unchanged."""
+        self.num_chunks += 1
+        if chunk.completion_tokens is not None:
+            self.completion_tokens = chunk.completion_tokens
+        arrival = chunk.response_duration
+        if arrival is None:
+            return chunk
+
+        self._last_time = max(self._last_time, arrival)
+        if self.time_to_first_chunk is None:
+            self.time_to_first_chunk = arrival
+        has_output = False
+        for choice in chunk.choices:
+            if choice.delta.content:
+                has_output = True
+                if self.time_to_first_content is None:
+                    self.time_to_first_content = arrival
+            if choice.delta.tool_calls:
+                has_output = True
+                if self.time_to_first_tool_call is None:
+                    self.time_to_first_tool_call = arrival
+            if choice.delta.refusal:
+                has_output = True
+        if has_output:
+            self._output_times.append(arrival)
+        return chunk
+
+    async def record(self, stream: AsyncIterable[ChatCompletionChunk]) -> AsyncGenerator[ChatCompletionChunk, None]:
+        """Record each chunk of `stream` and yield it on."""
+        async for chunk in stream:
+            yield self.add(chunk)
+
+    def metrics(self) -> StreamMetrics:
+        """The metrics of the chunks recorded so far."""
+        times = self._output_times
+        gaps = [round(later - earlier, 4) for earlier, later in pairwise(times)]
+        sorted_gaps = sorted(gaps)
+        time_to_first_token = times[0] if times else None
+
+        tokens_per_second = None
+        if self.completion_tokens is not None and time_to_first_token is not None:
+            generation_time = self._last_time - time_to_first_token
+            if generation_time > 0:
+                tokens_per_second = round(self.completion_tokens / generation_time, 4)
+
+        return StreamMetrics(
+            time_to_first_chunk=self.time_to_first_chunk,
+            time_to_first_token=time_to_first_token,
+            time_to_first_content=self.time_to_first_content,
+            time_to_first_tool_call=self.time_to_first_tool_call,
+            duration=self._last_time,
+            num_chunks=self.num_chunks,
+            inter_chunk_gaps=gaps,
+            inter_chunk_p50=_percentile(sorted_gaps, 0.5),
+            inter_chunk_p95=_percentile(sorted_gaps, 0.95),
+            inter_chunk_max=sorted_gaps[-1] if sorted_gaps else None,
+            completion_tokens=self.completion_tokens,
+            tokens_per_second=tokens_per_second,
+        )
+
+
+def summarize_stream_metrics(metrics: Iterable[StreamMetrics]) -> StreamMetricsSummary:
+    """Summarize the metrics of many streams, e.g. a batch of requests or the last minute of traffic,
+    into the distributions that latency dashboards show. The inter-chunk gaps of all streams are pooled.
+    Streams that are missing a metric, such as streams without tool calls, are left out of its summary.
+    """
+    streams = list(metrics)
+    return StreamMetricsSummary(
+        num_streams=len(streams),
+        time_to_first_token=_summarize(m.time_to_first_token for m in streams),
+        time_to_first_tool_call=_summarize(m.time_to_first_tool_call for m in streams),
+        duration=_summarize(m.duration for m in streams),
+        inter_chunk_gap=_summarize(gap for m in streams for gap in m.inter_chunk_gaps),
+        tokens_per_second=_summarize(m.tokens_per_second for m in streams),
+    )
+
+
+def _summarize(values: Iterable[float | None]) -> LatencySummary:
+    present = sorted(value for value in values if value is not None)
+    return LatencySummary(
+        count=len(present),
+        mean=round(sum(present) / len(present), 4) if present else None,
+        p50=_percentile(present, 0.5),
+        p95=_percentile(present, 0.95),
+        p99=_percentile(present, 0.99),
+        max=present[-1] if present else None,
+    )
+
+
+def _percentile(sorted_values: list[float], q: float) -> float | None:
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 4)
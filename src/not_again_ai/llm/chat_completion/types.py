@@ -66,6 +66,8 @@ class ToolCall(BaseModel):
 class PartialToolCall(BaseModel):
     id: str | None
     function: PartialFunction
+    # The position of the tool call in the message, which identifies it in later chunks that have no id
+    index: int | None = None
     type: Literal["function"] = "function"
 
 
@@ -172,10 +174,13 @@ class ChatCompletionDelta(BaseModel):
     refusal: str | None = Field(default=None)
 
 
+StreamFinishReason = Literal["stop", "length", "tool_calls", "content_filter"]
+
+
 class ChatCompletionChoiceStream(BaseModel):
     delta: ChatCompletionDelta
     index: int
-    finish_reason: Literal["stop", "length", "tool_calls", "content_filter"] | None
+    finish_reason: StreamFinishReason | None
 
     logprobs: list[dict[str, Any] | list[dict[str, Any]]] | None = Field(default=None)
 
@@ -189,7 +194,16 @@ class ChatCompletionChunk(BaseModel):
 
     completion_tokens: int | None = Field(default=None)
     prompt_tokens: int | None = Field(default=None)
-    response_duration: float | None = Field(default=None)
+    response_duration: float | None = Field(
+        default=None,
+        description="Seconds from sending the request to receiving this chunk, measured with a monotonic clock.",
+    )
 
     system_fingerprint: str | None = Field(default=None)
     extras: Any | None = Field(default=None)
+
+
+class ChatCompletionBatchResult(BaseModel):
+    index: int = Field(description="The position of the request in the submitted batch.")
+    response: ChatCompletionResponse | None = Field(default=None)
+    errors: str = Field(default="", description="The error raised by this request, if any.")
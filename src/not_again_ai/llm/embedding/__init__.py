@@ -1,4 +1,4 @@
-from not_again_ai.llm.embedding.interface import create_embeddings
-from not_again_ai.llm.embedding.types import EmbeddingRequest
+from not_again_ai.llm.embedding.interface import create_embeddings, create_embeddings_array
+from not_again_ai.llm.embedding.types import EmbeddingArrayResponse, EmbeddingRequest
 
-__all__ = ["EmbeddingRequest", "create_embeddings"]
+__all__ = ["EmbeddingArrayResponse", "EmbeddingRequest", "create_embeddings", "create_embeddings_array"]
@@ -0,0 +1,256 @@
+from collections.abc import Callable
+import hashlib
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from not_again_ai.llm.cache_stats import CacheStats
+from not_again_ai.llm.embedding.interface import create_embeddings_array
+from not_again_ai.llm.embedding.types import (
+    EmbeddingArrayResponse,
+    EmbeddingObject,
+    EmbeddingRequest,
+    EmbeddingResponse,
+)
+
+# Maximum number of hashes per SQL query, below SQLite's limit on the number of parameters
+QUERY_CHUNK_SIZE = 900
+
+
+class EmbeddingCache:
+    """An on-disk cache in front of `create_embeddings` so that unchanged inputs are only embedded once.
+
+    Each input is keyed by the provider, model, requested dimensions and the SHA-256 hash of its text.
+    Only inputs that are not in the cache are sent to the provider.
+
+    Vectors are appended to one raw float32 file per (provider, model, dimensions) and read through a memory map,
+    so only the rows that are looked up are loaded into memory. A SQLite database maps each key to its row.
+    The cache is safe to share between threads of a single process.
+
+    Args:
+        path: Directory to store the cache in. It is created if needed.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.stats = CacheStats()
+        self._connection = sqlite3.connect(self.path / "index.sqlite", check_same_thread=False)
+        self._lock = threading.Lock()
+        self._memmaps: dict[int, np.memmap[Any, np.dtype[np.float32]]] = {}
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS spaces (id INTEGER PRIMARY KEY, provider TEXT NOT NULL, "
+                "model TEXT NOT NULL, dimensions INTEGER NOT NULL, size INTEGER NOT NULL, rows INTEGER NOT NULL, "
+                "UNIQUE (provider, model, dimensions))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (space_id INTEGER NOT NULL, text_hash BLOB NOT NULL, "
+                "row INTEGER NOT NULL, PRIMARY KEY (space_id, text_hash)) WITHOUT ROWID"
+            )
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._memmaps.clear()
+            self._connection.close()
+
+    @staticmethod
+    def text_hash(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def _vectors_path(self, space_id: int) -> Path:
+        return self.path / f"vectors_{space_id}.f32"
+
+    def _space(self, provider: str, model: str, dimensions: int | None) -> tuple[int, int, int] | None:
+        """Returns the id, vector size and number of rows of a (provider, model, dimensions) space, if it exists."""
+        row = self._connection.execute(
+            "SELECT id, size, rows FROM spaces WHERE provider = ? AND model = ? AND dimensions = ?",
+            (provider, model, dimensions or 0),
+        ).fetchone()
+        return (row[0], row[1], row[2]) if row is not None else None
+
+    def _memmap(self, space_id: int, size: int, rows: int) -> "np.memmap[Any, np.dtype[np.float32]]":
+        memmap = self._memmaps.get(space_id)
+        if memmap is None or memmap.shape[0] < rows:
+            memmap = np.memmap(self._vectors_path(space_id), dtype=np.float32, mode="r", shape=(rows, size))
+            self._memmaps[space_id] = memmap
+        return memmap
+
+    def get(
+        self, provider: str, model: str, dimensions: int | None, texts: list[str]
+    ) -> tuple[npt.NDArray[np.float32] | None, npt.NDArray[np.bool_]]:
+        """Look up the embeddings of `texts`.
+
+        Returns:
+            A len(texts) x d matrix with the cached embeddings (rows of misses are zero), or None if nothing
+            is cached for the model, and a boolean mask of which texts were found.
+        """
+        found = np.zeros(len(texts), dtype=bool)
+        with self._lock:
+            space = self._space(provider, model, dimensions)
+            if space is None or space[2] == 0:
+                return None, found
+            space_id, size, rows = space
+
+            hashes = [self.text_hash(text) for text in texts]
+            hash_rows: dict[bytes, int] = {}
+            unique_hashes = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique_hashes), QUERY_CHUNK_SIZE):
+                chunk = unique_hashes[start : start + QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                hash_rows.update(
+                    self._connection.execute(
+                        f"SELECT text_hash, row FROM embeddings WHERE space_id = ? AND text_hash IN ({placeholders})",
+                        (space_id, *chunk),
+                    ).fetchall()
+                )
+            positions = [position for position, text_hash in enumerate(hashes) if text_hash in hash_rows]
+            found[positions] = True
+
+            vectors = np.zeros((len(texts), size), dtype=np.float32)
+            if positions:
+                memmap = self._memmap(space_id, size, rows)
+                vectors[positions] = memmap[[hash_rows[hashes[position]] for position in positions]]
+        return vectors, found
+
+    def set(
+        self, provider: str, model: str, dimensions: int | None, texts: list[str], vectors: npt.NDArray[np.float32]
+    ) -> None:
+        """Store the embedding of each text, given as the rows of `vectors`."""
+        if not texts:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock, self._connection:
+            space = self._space(provider, model, dimensions)
+            if space is None:
+                cursor = self._connection.execute(
+                    "INSERT INTO spaces (provider, model, dimensions, size, rows) VALUES (?, ?, ?, ?, 0)",
+                    (provider, model, dimensions or 0, vectors.shape[1]),
+                )
+                space = (cursor.lastrowid or 0, vectors.shape[1], 0)
+            space_id, size, rows = space
+            if vectors.shape[1] != size:
+                raise ValueError(f"Expected embeddings of size {size} for model {model}, got {vectors.shape[1]}.")
+
+            # Write at the offset of the committed rows, overwriting vectors left over from an interrupted write
+            vectors_path = self._vectors_path(space_id)
+            with Path.open(vectors_path, "r+b" if vectors_path.exists() else "wb") as f:
+                f.seek(rows * size * vectors.itemsize)
+                f.write(vectors.tobytes())
+                f.truncate()
+
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (space_id, text_hash, row) VALUES (?, ?, ?)",
+                [(space_id, self.text_hash(text), rows + i) for i, text in enumerate(texts)],
+            )
+            self._connection.execute("UPDATE spaces SET rows = ? WHERE id = ?", (rows + len(texts), space_id))
+
+    def invalidate(self, model: str, provider: str | None = None) -> int:
+        """Remove all cached embeddings of `model`, optionally only those of `provider`.
+
+        Returns:
+            int: The number of embeddings removed.
+        """
+        with self._lock, self._connection:
+            query = "SELECT id, rows FROM spaces WHERE model = ?"
+            params: tuple[str, ...] = (model,)
+            if provider is not None:
+                query += " AND provider = ?"
+                params = (model, provider)
+            spaces = self._connection.execute(query, params).fetchall()
+            for space_id, _ in spaces:
+                self._connection.execute("DELETE FROM embeddings WHERE space_id = ?", (space_id,))
+                self._connection.execute("DELETE FROM spaces WHERE id = ?", (space_id,))
+                self._memmaps.pop(space_id, None)
+                self._vectors_path(space_id).unlink(missing_ok=True)
+        return sum(rows for _, rows in spaces)
+
+    def clear(self) -> None:
+        """Remove all cached embeddings."""
+        with self._lock, self._connection:
+            space_ids = [row[0] for row in self._connection.execute("SELECT id FROM spaces").fetchall()]
+            self._connection.execute("DELETE FROM embeddings")
+            self._connection.execute("DELETE FROM spaces")
+            self._memmaps.clear()
+            for space_id in space_ids:
+                self._vectors_path(space_id).unlink(missing_ok=True)
+
+    def create_embeddings_array(
+        self, request: EmbeddingRequest, provider: str, client: Callable[..., Any], **kwargs: Any
+    ) -> EmbeddingArrayResponse:
+        """`create_embeddings_array` that only sends inputs which are not in the cache to the provider.
+
+        Args:
+            request: Request parameter object
+            provider: The supported provider name
+            client: Client information, see the provider's implementation for what can be provided
+            **kwargs: Passed to `create_embeddings_array`, such as `max_batch_size` or `max_concurrency`.
+
+        Returns:
+            EmbeddingArrayResponse: The embedding response. `total_tokens` only counts the inputs that were
+                sent to the provider and `extras["cache_hits"]` is the number of inputs served from the cache.
+        """
+        start_time = time.time()
+        texts = [request.input] if isinstance(request.input, str) else request.input
+        vectors, found = self.get(provider, request.model, request.dimensions, texts)
+
+        missing_texts = list(dict.fromkeys(text for text, hit in zip(texts, found, strict=True) if not hit))
+        total_tokens: int | None = 0
+        errors = ""
+        if missing_texts:
+            response = create_embeddings_array(
+                request.model_copy(update={"input": missing_texts}), provider, client, **kwargs
+            )
+            total_tokens = response.total_tokens
+            errors = response.errors
+            self.set(provider, request.model, request.dimensions, missing_texts, response.embeddings)
+            if vectors is None:
+                vectors = np.zeros((len(texts), response.embeddings.shape[1]), dtype=np.float32)
+            missing_rows = {text: row for row, text in enumerate(missing_texts)}
+            missing_positions = np.flatnonzero(~found)
+            vectors[missing_positions] = response.embeddings[[missing_rows[texts[i]] for i in missing_positions]]
+        if vectors is None:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+
+        num_hits = int(found.sum())
+        with self._lock:
+            self.stats.hits += num_hits
+            self.stats.misses += len(texts) - num_hits
+        return EmbeddingArrayResponse(
+            embeddings=vectors,
+            indices=np.arange(len(texts), dtype=np.int64),
+            total_tokens=total_tokens,
+            response_duration=round(time.time() - start_time, 4),
+            errors=errors,
+            extras={"cache_hits": num_hits},
+        )
+
+    def create_embeddings(
+        self, request: EmbeddingRequest, provider: str, client: Callable[..., Any], **kwargs: Any
+    ) -> EmbeddingResponse:
+        """`create_embeddings` that only sends inputs which are not in the cache to the provider.
+
+        See `EmbeddingCache.create_embeddings_array` for details.
+        """
+        response = self.create_embeddings_array(request, provider, client, **kwargs)
+        return EmbeddingResponse(
+            embeddings=[
+                EmbeddingObject(embedding=vector.tolist(), index=int(index))
+                for vector, index in zip(response.embeddings, response.indices, strict=True)
+            ],
+            total_tokens=response.total_tokens,
+            response_duration=response.response_duration,
+            errors=response.errors,
+            extras=response.extras,
+        )
@@ -5,9 +5,15 @@ import time
 from typing import Any
 
 from loguru import logger
+import numpy as np
 from ollama import Client, EmbedResponse, ResponseError
 
-from not_again_ai.llm.embedding.types import EmbeddingObject, EmbeddingRequest, EmbeddingResponse
+from not_again_ai.llm.embedding.types import (
+    EmbeddingArrayResponse,
+    EmbeddingObject,
+    EmbeddingRequest,
+    EmbeddingResponse,
+)
 
 OLLAMA_PARAMETER_MAP = {
     "dimensions": None,
@@ -21,7 +27,8 @@ def validate(request: EmbeddingRequest) -> None:
             logger.warning(f"Parameter {key} is not supported by Ollama and will be ignored.")
 
 
-def ollama_create_embeddings(request: EmbeddingRequest, client: Callable[..., Any]) -> EmbeddingResponse:
+def call_client(request: EmbeddingRequest, client: Callable[..., Any]) -> tuple[EmbedResponse, float]:
+    """Send the request to Ollama and return the response along with how long it took."""
     validate(request)
     kwargs = request.model_dump(mode="json", exclude_none=True)
 
@@ -49,6 +56,11 @@ def ollama_create_embeddings(request: EmbeddingRequest, client: Callable[..., An
             raise ResponseError(f"Model '{request.model}' not found.") from e
         else:
             raise ResponseError(e.error) from e
+    return response, response_duration
+
+
+def ollama_create_embeddings(request: EmbeddingRequest, client: Callable[..., Any]) -> EmbeddingResponse:
+    response, response_duration = call_client(request, client)
 
     embeddings: list[EmbeddingObject] = []
     for index, embedding in enumerate(response.embeddings):
@@ -61,6 +73,33 @@ def ollama_create_embeddings(request: EmbeddingRequest, client: Callable[..., An
     )
 
 
+def ollama_create_embeddings_array(request: EmbeddingRequest, client: Callable[..., Any]) -> EmbeddingArrayResponse:
+    """Like `ollama_create_embeddings`, but returns the embeddings as a float32 matrix.
+
+    An empty list of inputs returns a (0, 0) matrix without calling Ollama, as does a response without embeddings,
+    since Ollama does not report the size of the model's embeddings otherwise."""
+    if isinstance(request.input, list) and not request.input:
+        return EmbeddingArrayResponse(
+            embeddings=np.empty((0, 0), dtype=np.float32),
+            indices=np.empty(0, dtype=np.int64),
+            response_duration=0.0,
+            total_tokens=0,
+        )
+
+    response, response_duration = call_client(request, client)
+    if response.embeddings:
+        embeddings = np.asarray(response.embeddings, dtype=np.float32)
+    else:
+        embeddings = np.empty((0, 0), dtype=np.float32)
+
+    return EmbeddingArrayResponse(
+        embeddings=embeddings,
+        indices=np.arange(len(response.embeddings), dtype=np.int64),
+        response_duration=response_duration,
+        total_tokens=response.prompt_eval_count,
+    )
+
+
 def ollama_client(host: str | None = None, timeout: float | None = None) -> Callable[..., Any]:
     """Create an Ollama client instance based on the specified host or will read from the OLLAMA_HOST environment variable.
 
@@ -1,6 +1,8 @@
 from typing import Any
 
-from pydantic import BaseModel, Field
+import numpy as np
+import numpy.typing as npt
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class EmbeddingRequest(BaseModel):
@@ -21,3 +23,17 @@ class EmbeddingResponse(BaseModel):
 
     errors: str = Field(default="")
     extras: Any | None = Field(default=None)
+
+
+class EmbeddingArrayResponse(BaseModel):
+    """Embeddings as a single contiguous float32 matrix, where row `i` is the embedding of input `indices[i]`."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: npt.NDArray[np.float32]
+    indices: npt.NDArray[np.int64]
+    total_tokens: int | None = Field(default=None)
+    response_duration: float
+
+    errors: str = Field(default="")
+    extras: Any | None = Field(default=None)
@@ -0,0 +1,289 @@
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from not_again_ai.llm.embedding.types import EmbeddingArrayResponse, EmbeddingResponse
+
+# Maximum number of similarity scores computed at once when searching, which bounds the memory used by a search
+MAX_SCORES_PER_CHUNK = 2**24
+
+
+class VectorIndex:
+    """An in-memory index for cosine similarity search over embeddings.
+
+    Vectors are normalized and stored in a single float32 matrix, so an exact search for a batch of queries is one
+    matrix multiplication followed by a partial sort. For large indexes, `build_ivf` clusters the vectors with
+    k-means so that searches with `nprobe` only score the vectors in the closest clusters (an inverted file index).
+
+    Args:
+        dimensions: The size of the vectors. If not provided, it is set by the first vectors added.
+
+    Examples:
+        >>> index = VectorIndex()
+        >>> index.add(create_embeddings_array(request, "openai", client))
+        >>> scores, ids = index.search(query_vectors, k=5)
+    """
+
+    def __init__(self, dimensions: int | None = None):
+        self.dimensions = dimensions
+        self._vectors = np.zeros((0, dimensions or 0), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._size = 0
+        self.centroids: npt.NDArray[np.float32] | None = None
+        self._assignments = np.zeros(0, dtype=np.int64)
+        self._list_offsets: npt.NDArray[np.int64] | None = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> npt.NDArray[np.float32]:
+        """The normalized vectors in the index, one per row."""
+        return self._vectors[: self._size]
+
+    @property
+    def ids(self) -> npt.NDArray[np.int64]:
+        """The id of each vector in the index."""
+        return self._ids[: self._size]
+
+    def add(
+        self,
+        embeddings: EmbeddingResponse | EmbeddingArrayResponse | npt.ArrayLike,
+        ids: Sequence[int] | npt.NDArray[np.int64] | None = None,
+    ) -> npt.NDArray[np.int64]:
+        """Add vectors to the index.
+
+        Args:
+            embeddings: The output of `create_embeddings` or `create_embeddings_array`, or an n x d array of vectors.
+            ids: An id for each vector, returned by `search`. Defaults to the position of each vector in the index.
+
+        Returns:
+            The ids of the added vectors.
+        """
+        if isinstance(embeddings, EmbeddingResponse):
+            ordered = sorted(embeddings.embeddings, key=lambda embedding: embedding.index)
+            vectors = np.array([embedding.embedding for embedding in ordered], dtype=np.float32)
+        elif isinstance(embeddings, EmbeddingArrayResponse):
+            vectors = embeddings.embeddings[np.argsort(embeddings.indices, kind="stable")]
+        else:
+            vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = np.atleast_2d(vectors)
+        num_vectors = vectors.shape[0]
+        if num_vectors == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        if self.dimensions is None or self._vectors.shape[1] == 0:
+            self.dimensions = vectors.shape[1]
+            self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+        if vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Expected vectors with {self.dimensions} dimensions, got {vectors.shape[1]}.")
+        new_ids = (
+            np.arange(self._size, self._size + num_vectors, dtype=np.int64)
+            if ids is None
+            else np.asarray(ids, dtype=np.int64)
+        )
+        if new_ids.shape != (num_vectors,):
+            raise ValueError(f"Expected {num_vectors} ids, got {new_ids.shape[0]}.")
+
+        # Grow the storage geometrically so adding vectors in many small batches takes amortized linear time
+        required = self._size + num_vectors
+        if required > self._vectors.shape[0]:
+            capacity = max(required, 2 * self._vectors.shape[0])
+            grown_vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+            grown_vectors[: self._size] = self.vectors
+            grown_ids = np.zeros(capacity, dtype=np.int64)
+            grown_ids[: self._size] = self.ids
+            self._vectors, self._ids = grown_vectors, grown_ids
+
+        self._vectors[self._size : required] = normalize(vectors)
+        self._ids[self._size : required] = new_ids
+        if self.centroids is not None:
+            self._assignments = np.concatenate(
+                [self._assignments, nearest_centroids(self._vectors[self._size : required], self.centroids, 1)[:, 0]]
+            )
+            self._list_offsets = None
+        self._size = required
+        return new_ids
+
+    def build_ivf(
+        self,
+        num_lists: int | None = None,
+        num_iterations: int = 10,
+        training_vectors_per_list: int = 64,
+        seed: int = 0,
+    ) -> None:
+        """Cluster the vectors with spherical k-means so `search` can score only the clusters closest to each query.
+
+        Vectors added afterwards are assigned to their closest existing cluster. Rebuild if the data changes a lot.
+
+        Args:
+            num_lists: The number of clusters. Defaults to the square root of the number of vectors.
+            num_iterations: The number of k-means iterations. Defaults to 10.
+            training_vectors_per_list: Train the clusters on a random sample of this many vectors per cluster.
+                Defaults to 64.
+            seed: Seed for sampling the training vectors and the initial centroids.
+        """
+        if self._size == 0:
+            raise ValueError("Cannot build an IVF index without vectors.")
+        num_lists = min(num_lists or max(1, int(np.sqrt(self._size))), self._size)
+        rng = np.random.default_rng(seed)
+        training = self.vectors
+        num_training_vectors = num_lists * training_vectors_per_list
+        if self._size > num_training_vectors:
+            training = training[rng.choice(self._size, num_training_vectors, replace=False)]
+
+        centroids = training[rng.choice(training.shape[0], num_lists, replace=False)].copy()
+        for _ in range(num_iterations):
+            assignments = nearest_centroids(training, centroids, 1)[:, 0]
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=num_lists)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            non_empty = counts > 0
+            sums = np.add.reduceat(training[order], starts[non_empty], axis=0)
+            centroids[non_empty] = normalize(sums)
+            # Restart empty clusters from random training vectors
+            empty = np.flatnonzero(~non_empty)
+            if len(empty) > 0:
+                centroids[empty] = training[rng.choice(training.shape[0], len(empty), replace=False)]
+
+        self.centroids = centroids
+        self._assignments = nearest_centroids(self.vectors, centroids, 1)[:, 0]
+        self._list_offsets = None
+
+    def _inverted_lists(self) -> npt.NDArray[np.int64]:
+        """Sort the stored vectors by cluster so each cluster is a contiguous block of rows.
+
+        Returns:
+            The offset of each cluster's block, followed by the number of vectors.
+        """
+        if self._list_offsets is None:
+            assert self.centroids is not None
+            assignments = self._assignments
+            if np.any(assignments[1:] < assignments[:-1]):
+                order = np.argsort(assignments, kind="stable")
+                self._vectors = np.ascontiguousarray(self.vectors[order])
+                self._ids = self.ids[order]
+                self._assignments = assignments = assignments[order]
+            counts = np.bincount(assignments, minlength=self.centroids.shape[0])
+            self._list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return self._list_offsets
+
+    def search(
+        self, queries: npt.ArrayLike, k: int = 10, nprobe: int | None = None
+    ) -> tuple[npt.NDArray[np.float32], npt.NDArray[np.int64]]:
+        """Find the `k` vectors with the highest cosine similarity to each query.
+
+        Args:
+            queries: A query vector or a q x d matrix of query vectors. They do not need to be normalized.
+            k: The number of results per query. It is clamped to the number of vectors in the index.
+            nprobe: Only search the vectors in the `nprobe` clusters closest to each query. Requires `build_ivf`.
+                Higher values are slower but more accurate. Defaults to an exact search over all vectors.
+
+        Returns:
+            The similarity scores and ids of the results, each q x min(k, len(self)) and sorted from most to least
+            similar. If a query has fewer candidates than that, which can happen when searching with `nprobe`,
+            the missing results have a score of -inf and an id of -1.
+
+        Raises:
+            ValueError: If `k` or `nprobe` is less than 1, or if `nprobe` is given before calling `build_ivf`.
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        if nprobe is not None and nprobe < 1:
+            raise ValueError(f"nprobe must be at least 1, got {nprobe}")
+        query_matrix = normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        k = min(k, self._size)
+        scores = np.full((query_matrix.shape[0], k), -np.inf, dtype=np.float32)
+        ids = np.full((query_matrix.shape[0], k), -1, dtype=np.int64)
+        if k == 0:
+            return scores, ids
+
+        if nprobe is None:
+            # Score the queries in chunks so the score matrix stays bounded for large indexes
+            chunk_size = max(1, MAX_SCORES_PER_CHUNK // self._size)
+            for start in range(0, query_matrix.shape[0], chunk_size):
+                chunk_scores = query_matrix[start : start + chunk_size] @ self.vectors.T
+                top = top_k(chunk_scores, k)
+                scores[start : start + chunk_size] = np.take_along_axis(chunk_scores, top, axis=1)
+                ids[start : start + chunk_size] = self.ids[top]
+            return scores, ids
+
+        if self.centroids is None:
+            raise ValueError("Call build_ivf before searching with nprobe.")
+        list_offsets = self._inverted_lists()
+        probes = nearest_centroids(query_matrix, self.centroids, min(nprobe, self.centroids.shape[0]))
+        for row, (query, lists) in enumerate(zip(query_matrix, probes, strict=True)):
+            blocks = [(list_offsets[i], list_offsets[i + 1]) for i in lists if list_offsets[i + 1] > list_offsets[i]]
+            if not blocks:
+                continue
+            candidates = np.concatenate([np.arange(start, end) for start, end in blocks])
+            candidate_scores = np.concatenate([self._vectors[start:end] @ query for start, end in blocks])
+            top = top_k(candidate_scores[np.newaxis, :], min(k, len(candidates)))[0]
+            scores[row, : len(top)] = candidate_scores[top]
+            ids[row, : len(top)] = self._ids[candidates[top]]
+        return scores, ids
+
+    def save(self, path: str | Path) -> None:
+        """Save the index to the directory `path` as .npy files which `load` can memory map."""
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        if self.centroids is not None:
+            # Saving the vectors sorted by cluster lets a memory mapped index search without copying them
+            self._inverted_lists()
+        np.save(directory / "vectors.npy", self.vectors)
+        np.save(directory / "ids.npy", self.ids)
+        if self.centroids is not None:
+            np.save(directory / "centroids.npy", self.centroids)
+            np.save(directory / "assignments.npy", self._assignments)
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> "VectorIndex":
+        """Load an index saved with `save`.
+
+        Args:
+            path: The directory the index was saved to.
+            mmap: Memory map the vectors instead of reading them into memory, so only the pages touched by
+                searches are loaded. Adding vectors to a memory mapped index copies it into memory.
+        """
+        directory = Path(path)
+        vectors = np.load(directory / "vectors.npy", mmap_mode="r" if mmap else None)
+        index = cls(dimensions=vectors.shape[1])
+        index._vectors = vectors
+        index._ids = np.load(directory / "ids.npy")
+        index._size = vectors.shape[0]
+        if (directory / "centroids.npy").exists():
+            index.centroids = np.load(directory / "centroids.npy")
+            index._assignments = np.load(directory / "assignments.npy")
+        return index
+
+
+def normalize(vectors: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+    """Scale each row to unit length, leaving rows of zeros unchanged."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32, copy=False)
+
+
+def top_k(scores: npt.NDArray[np.float32], k: int) -> npt.NDArray[np.intp]:
+    """The column positions of the k highest scores in each row, sorted from highest to lowest."""
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def nearest_centroids(
+    vectors: npt.NDArray[np.float32], centroids: npt.NDArray[np.float32], n: int
+) -> npt.NDArray[np.intp]:
+    """The positions of the `n` centroids most similar to each vector, computed in chunks to bound memory."""
+    if vectors.shape[0] == 0:
+        return np.zeros((0, n), dtype=np.intp)
+    chunk_size = max(1, MAX_SCORES_PER_CHUNK // centroids.shape[0])
+    chunks = []
+    for start in range(0, vectors.shape[0], chunk_size):
+        chunk_scores = vectors[start : start + chunk_size] @ centroids.T
+        chunks.append(np.argmax(chunk_scores, axis=1)[:, np.newaxis] if n == 1 else top_k(chunk_scores, n))
+    return np.concatenate(chunks)
@@ -1,3 +1,4 @@
 from not_again_ai.llm.prompting.interface import Tokenizer
+from not_again_ai.llm.prompting.providers.openai_tiktoken import preload_encodings
 
-__all__ = ["Tokenizer"]
+__all__ = ["Tokenizer", "preload_encodings"]
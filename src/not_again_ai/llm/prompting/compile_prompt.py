@@ -1,55 +1,109 @@
 import base64
-from collections.abc import Sequence
-from copy import deepcopy
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from functools import lru_cache
+import itertools
 import mimetypes
 from pathlib import Path
 from typing import Any
 
-from liquid import render
+from liquid import DEFAULT_ENVIRONMENT, BoundTemplate, Environment
 from openai.lib._pydantic import to_strict_json_schema
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from not_again_ai.base.parallel import ParallelExecutor, embarrassingly_parallel_iter, worker_state
 from not_again_ai.llm.chat_completion.types import MessageT
 
+TEMPLATE_CACHE_SIZE = 4096
 
-def _apply_templates(value: Any, variables: dict[str, str]) -> Any:
-    """Recursively applies Liquid templating to all string fields within the given value."""
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _parse_template(source: str, environment: Environment) -> BoundTemplate:
+    return environment.from_string(source)
+
+
+def compile_template(source: str, environment: Environment | None = None) -> BoundTemplate:
+    """Parses a Liquid template, reusing the parsed template if the same source was parsed before.
+
+    The parsed templates are kept in a least recently used cache of `TEMPLATE_CACHE_SIZE` entries,
+    keyed by the source and the environment. Parsed templates can be rendered concurrently from many threads.
+
+    Args:
+        source: The Liquid template source.
+        environment: The Liquid environment to parse it with. Defaults to Liquid's default environment.
+
+    Returns:
+        The parsed template. Call `render(**variables)` on it to render it.
+    """
+    return _parse_template(source, environment or DEFAULT_ENVIRONMENT)
+
+
+def _has_markup(source: str, environment: Environment) -> bool:
+    """Whether the source has any Liquid markup. Strings without it render as themselves."""
+    starts = [environment.statement_start_string, environment.tag_start_string]
+    if environment.template_comments:
+        starts.append(environment.comment_start_string)
+    # Searching for a single character is much faster on long strings without markup, like images
+    return any(start[0] in source and start in source for start in starts)
+
+
+def _render(source: str, variables: dict[str, Any]) -> str:
+    if not _has_markup(source, DEFAULT_ENVIRONMENT):
+        # Skip the cache, so that long strings without templates, like images, are not hashed and cached
+        return source
+    return _parse_template(source, DEFAULT_ENVIRONMENT).render(**variables)
+
+
+def _apply_templates(value: Any, variables: dict[str, Any]) -> Any:
+    """Recursively applies Liquid templating to all string fields within the given value.
+
+    Copy-on-write: a list, dict or BaseModel is only copied if something within it has a template,
+    otherwise the value itself is returned. Models are shallow copied with just the rendered fields updated,
+    rather than dumped and validated again.
+    """
     if isinstance(value, str):
-        return render(value, **variables)
+        return _render(value, variables)
     elif isinstance(value, list):
-        return [_apply_templates(item, variables) for item in value]
+        items = [_apply_templates(item, variables) for item in value]
+        return items if any(new is not old for new, old in zip(items, value, strict=True)) else value
     elif isinstance(value, dict):
-        return {key: _apply_templates(val, variables) for key, val in value.items()}
+        entries = {key: _apply_templates(val, variables) for key, val in value.items()}
+        return entries if any(entries[key] is not val for key, val in value.items()) else value
     elif isinstance(value, BaseModel):
-        # Process each field in the BaseModel by converting it to a dict,
-        # applying templating to its values, and then re-instantiating the model.
-        processed_data = {key: _apply_templates(val, variables) for key, val in value.model_dump().items()}
-        return value.__class__(**processed_data)
+        updates: dict[str, Any] = {}
+        for name in type(value).model_fields:
+            field = getattr(value, name)
+            rendered = _apply_templates(field, variables)
+            if rendered is not field:
+                updates[name] = rendered
+        return value.model_copy(update=updates) if updates else value
     else:
         return value
 
 
-def compile_messages(messages: Sequence[MessageT], variables: dict[str, str]) -> Sequence[MessageT]:
+def compile_messages(messages: Sequence[MessageT], variables: dict[str, Any]) -> Sequence[MessageT]:
     """Compiles messages using Liquid templating and the provided variables.
-    Calls render(content_part, **variables) on each text content part.
+    Each template is parsed once and cached, see `compile_template`. To render the same messages many times,
+    `CompiledPrompt` also avoids walking the messages on every call.
+
+    Only the messages and content parts with templates are copied. The others, such as image content,
+    are shared with `messages` rather than copied, so neither should be modified in place.
 
     Args:
         messages: List of MessageT where content can contain Liquid templates.
         variables: The variables to inject into the templates.
 
     Returns:
-        The same list of messages with the content parts injected with the variables.
+        A new list of messages with the content parts injected with the variables.
     """
-    messages_formatted = deepcopy(messages)
-    messages_formatted = [_apply_templates(message, variables) for message in messages_formatted]
-    return messages_formatted
+    return [_apply_templates(message, variables) for message in messages]
 
 
-def compile_tools(tools: Sequence[dict[str, Any]], variables: dict[str, str]) -> Sequence[dict[str, Any]]:
+def compile_tools(tools: Sequence[dict[str, Any]], variables: dict[str, Any]) -> Sequence[dict[str, Any]]:
     """Compiles a list of tool argument dictionaries using Liquid templating and provided variables.
 
-    Each dictionary in the list is deep copied and processed recursively to substitute any Liquid
-    templates present in its data structure.
+    Each dictionary in the list is processed recursively to substitute any Liquid templates present in its
+    data structure. Only the dictionaries and lists that contain templates are copied, the rest are shared
+    with `tools`.
 
     Args:
         tools: A list of dictionaries representing tool arguments, where values can include Liquid templates.
@@ -58,9 +112,205 @@ def compile_tools(tools: Sequence[dict[str, Any]], variables: dict[str, str]) ->
     Returns:
         A new list of dictionaries with the Liquid templates replaced by their corresponding variable values.
     """
-    tools_formatted = deepcopy(tools)
-    tools_formatted = [_apply_templates(tool, variables) for tool in tools_formatted]
-    return tools_formatted
+    return [_apply_templates(tool, variables) for tool in tools]
+
+
+class _CompiledList(list[Any]):
+    pass
+
+
+class _CompiledDict(dict[str, Any]):
+    pass
+
+
+class _CompiledModel:
+    def __init__(self, model: BaseModel, fields: dict[str, Any]):
+        self.model = model
+        # Only the fields that have templates within them
+        self.fields = fields
+
+
+class TemplateField(BaseModel):
+    path: tuple[str | int, ...] = Field(
+        description="The keys, attributes and indices leading to the string, e.g. ('messages', 1, 'content', 0, 'text')."
+    )
+    variables: list[str] = Field(description="The variables the template uses that it does not assign itself.")
+
+
+def _compile_value(
+    value: Any, environment: Environment, path: tuple[str | int, ...], template_fields: list[TemplateField]
+) -> Any:
+    """Parses every string with Liquid markup within the value into a template, once, and records where it is.
+    Values without any templates are returned as they are."""
+    if isinstance(value, str):
+        if not _has_markup(value, environment):
+            return value
+        template = _parse_template(value, environment)
+        template_fields.append(TemplateField(path=path, variables=template.global_variables()))
+        return template
+    elif isinstance(value, list):
+        items = _CompiledList(
+            _compile_value(item, environment, (*path, i), template_fields) for i, item in enumerate(value)
+        )
+        return items if any(new is not old for new, old in zip(items, value, strict=True)) else value
+    elif isinstance(value, dict):
+        entries = _CompiledDict(
+            (key, _compile_value(val, environment, (*path, key), template_fields)) for key, val in value.items()
+        )
+        return entries if any(entries[key] is not val for key, val in value.items()) else value
+    elif isinstance(value, BaseModel):
+        fields: dict[str, Any] = {}
+        for name in type(value).model_fields:
+            field = getattr(value, name)
+            compiled = _compile_value(field, environment, (*path, name), template_fields)
+            if compiled is not field:
+                fields[name] = compiled
+        return _CompiledModel(value, fields) if fields else value
+    else:
+        return value
+
+
+def _render_value(value: Any, variables: dict[str, Any]) -> Any:
+    if isinstance(value, BoundTemplate):
+        return value.render(**variables)
+    elif isinstance(value, _CompiledList):
+        return [_render_value(item, variables) for item in value]
+    elif isinstance(value, _CompiledDict):
+        return {key: _render_value(val, variables) for key, val in value.items()}
+    elif isinstance(value, _CompiledModel):
+        return value.model.model_copy(
+            update={name: _render_value(field, variables) for name, field in value.fields.items()}
+        )
+    else:
+        return value
+
+
+class CompiledPrompt:
+    """Messages and tools with their Liquid templates parsed once, to be rendered with many sets of variables.
+
+    `compile_messages` and `compile_tools` walk the whole prompt on every call, while a compiled prompt
+    only renders the parsed templates and copies the containers around them.
+    The rendered messages and tools are the same as those of `compile_messages` and `compile_tools`, and likewise
+    share the parts without templates with each other and with the original messages and tools.
+
+    Compiling also analyzes the templates: `template_fields` lists the strings that have templates and the variables
+    each uses, and `variables` is the set of all of them, so that the variables can be checked with
+    `validate_variables` before rendering instead of silently rendering as empty strings.
+    Strings, lists, dicts and models without templates are returned as they are on every render,
+    so mostly static tool schemas cost almost nothing to render.
+
+    Args:
+        messages: List of MessageT where content can contain Liquid templates.
+        tools: Tool argument dictionaries where values can contain Liquid templates.
+        environment: The Liquid environment to parse the templates with. Defaults to Liquid's default environment.
+
+    Examples:
+        >>> prompt = CompiledPrompt(messages, tools)
+        >>> prompt.validate_variables({"text": documents[0]})
+        >>> for document in documents:
+        ...     request = ChatCompletionRequest(
+        ...         model="gpt-4o-mini",
+        ...         messages=prompt.messages({"text": document}),
+        ...         tools=prompt.tools({"text": document}),
+        ...     )
+    """
+
+    def __init__(
+        self,
+        messages: Sequence[MessageT],
+        tools: Sequence[dict[str, Any]] | None = None,
+        environment: Environment | None = None,
+    ):
+        environment = environment or DEFAULT_ENVIRONMENT
+        self.template_fields: list[TemplateField] = []
+        self._messages = [
+            _compile_value(message, environment, ("messages", i), self.template_fields)
+            for i, message in enumerate(messages)
+        ]
+        self._tools = [
+            _compile_value(tool, environment, ("tools", i), self.template_fields) for i, tool in enumerate(tools or [])
+        ]
+        self.variables: set[str] = {variable for field in self.template_fields for variable in field.variables}
+
+    def missing_variables(self, variables: Mapping[str, Any]) -> list[str]:
+        """The variables used by the templates that are not in `variables`, sorted."""
+        return sorted(self.variables - variables.keys())
+
+    def validate_variables(self, variables: Mapping[str, Any]) -> None:
+        """Checks that `variables` has every variable used by the templates.
+
+        Variables that are only used with a `default` filter or in a branch that is not taken are also required.
+
+        Raises:
+            ValueError: If any variables are missing, naming them and the fields that use them.
+        """
+        missing = self.missing_variables(variables)
+        if missing:
+            fields = [
+                ".".join(str(key) for key in field.path)
+                for field in self.template_fields
+                if not set(field.variables).isdisjoint(missing)
+            ]
+            raise ValueError(f"Missing variables {', '.join(missing)} used by {', '.join(fields)}")
+
+    def messages(self, variables: dict[str, Any]) -> list[MessageT]:
+        """Renders the messages with the variables."""
+        return [_render_value(message, variables) for message in self._messages]
+
+    def tools(self, variables: dict[str, Any]) -> list[dict[str, Any]]:
+        """Renders the tools with the variables."""
+        return [_render_value(tool, variables) for tool in self._tools]
+
+
+def compile_messages_batch(
+    messages: Sequence[MessageT],
+    variables_iter: Iterable[dict[str, Any]],
+    num_processes: int = 1,
+    batch_size: int = 256,
+    max_in_flight: int | None = None,
+) -> Iterator[list[MessageT]]:
+    """Compiles the same messages with each set of variables, such as the rows of an evaluation dataset.
+
+    The templates are parsed once into a `CompiledPrompt`, and the variables are consumed lazily, so memory use
+    does not grow with the number of variable sets. Rendering is CPU-bound, so with `num_processes` > 1 it is
+    spread across worker processes. Each worker compiles the messages once, and the variables are sent to
+    the workers in batches of `batch_size`, with at most `max_in_flight` batches rendered but not yet yielded.
+    Starting the worker processes takes around a second, so this only pays off for many variable sets.
+
+    Args:
+        messages: List of MessageT where content can contain Liquid templates.
+        variables_iter: An iterable of the variables to inject into the templates, e.g. a generator over a file.
+        num_processes: Number of worker processes. Defaults to 1, which renders in the calling thread.
+        batch_size: Number of variable sets sent to a worker process at a time. Defaults to 256.
+        max_in_flight: Maximum number of batches sent to the workers but not yet yielded.
+            Defaults to twice `num_processes`.
+
+    Yields:
+        The compiled messages for each set of variables, in the order of `variables_iter`.
+
+    Examples:
+        >>> rows = (json.loads(line) for line in open("eval.jsonl"))
+        >>> for compiled in compile_messages_batch(messages, rows, num_processes=8):
+        ...     requests.append(ChatCompletionRequest(model="gpt-4o-mini", messages=compiled))
+    """
+    if num_processes == 1:
+        prompt = CompiledPrompt(messages)
+        for variables in variables_iter:
+            yield prompt.messages(variables)
+        return
+
+    variables_iter = iter(variables_iter)
+    batches = iter(lambda: list(itertools.islice(variables_iter, batch_size)), [])
+    with ParallelExecutor(num_processes, "process", initializer=CompiledPrompt, initargs=(list(messages),)) as executor:
+        for rendered in embarrassingly_parallel_iter(
+            _render_batch, ((batch,) for batch in batches), max_in_flight=max_in_flight, executor=executor
+        ):
+            yield from rendered
+
+
+def _render_batch(batch: list[dict[str, Any]]) -> list[list[MessageT]]:
+    prompt: CompiledPrompt = worker_state()
+    return [prompt.messages(variables) for variables in batch]
 
 
 def encode_image(image_path: Path) -> str:
@@ -1,4 +1,5 @@
-from collections.abc import Collection, Set
+from collections.abc import Collection, Iterable, Set
+import threading
 from typing import Literal
 
 from loguru import logger
@@ -7,6 +8,47 @@ import tiktoken
 from not_again_ai.llm.chat_completion.types import MessageT
 from not_again_ai.llm.prompting.types import BaseTokenizer
 
+DEFAULT_ENCODING = "o200k_base"
+
+# Process-wide registry of the encoding of each model. Lookups of known models are lock-free dict reads.
+_model_encodings: dict[str, tiktoken.Encoding] = {}
+_model_encodings_lock = threading.Lock()
+
+
+def get_model_encoding(model: str) -> tiktoken.Encoding:
+    """Returns the tiktoken encoding of the model, shared by every tokenizer in the process.
+
+    The encoding is loaded on first use, which may download and parse its BPE file. Models unknown to
+    tiktoken use `DEFAULT_ENCODING`, with a warning logged the first time only.
+    After that, getting the encoding is a dictionary lookup. Safe to call from many threads.
+    """
+    encoding = _model_encodings.get(model)
+    if encoding is None:
+        with _model_encodings_lock:
+            encoding = _model_encodings.get(model)
+            if encoding is None:
+                try:
+                    encoding_name = tiktoken.encoding_name_for_model(model)
+                except KeyError:
+                    logger.warning(f"Model {model} not found. Using {DEFAULT_ENCODING} encoding.")
+                    encoding_name = DEFAULT_ENCODING
+                encoding = _model_encodings[model] = tiktoken.get_encoding(encoding_name)
+    return encoding
+
+
+def preload_encodings(models: Iterable[str]) -> None:
+    """Loads the encodings of the models ahead of time, such as at startup, so that the first `Tokenizer`
+    created for each of them while serving requests does not have to load it.
+
+    Args:
+        models: The models whose encodings to load.
+
+    Examples:
+        >>> preload_encodings(["gpt-4o", "gpt-4o-mini", "o3-mini"])
+    """
+    for model in models:
+        get_model_encoding(model)
+
 
 class TokenizerOpenAI(BaseTokenizer):
     def __init__(
@@ -30,12 +72,7 @@ class TokenizerOpenAI(BaseTokenizer):
         allowed_special: Literal["all"] | Set[str] | None = None,
         disallowed_special: Literal["all"] | Collection[str] | None = None,
     ) -> None:
-        try:
-            self.encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            default_encoding = "o200k_base"
-            logger.warning(f"Model {model} not found. Using {default_encoding} encoding.")
-            self.encoding = tiktoken.get_encoding(default_encoding)
+        self.encoding = get_model_encoding(model)
 
         # Set defaults if not provided
         if not allowed_special:
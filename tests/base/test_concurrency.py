@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from not_again_ai.base.concurrency import AdaptiveConcurrencyLimiter, LoopLocal, adaptive_client, is_overload_error
+from not_again_ai.base.parallel import embarrassingly_parallel
+
+
+class OverloadedError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+
+class FakeProvider:
+    """Rejects calls with a 429 while more than `capacity` calls are running."""
+
+    def __init__(self, capacity: int, latency: float = 0.005):
+        self.capacity = capacity
+        self.latency = latency
+        self.running = 0
+        self.max_running = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def _enter(self) -> None:
+        with self.lock:
+            if self.running >= self.capacity:
+                self.rejected += 1
+                raise OverloadedError(429)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def _exit(self) -> None:
+        with self.lock:
+            self.running -= 1
+
+    def __call__(self, x: int) -> int:
+        self._enter()
+        try:
+            time.sleep(self.latency)
+        finally:
+            self._exit()
+        return x
+
+    async def acall(self, x: int) -> int:
+        self._enter()
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self._exit()
+        return x
+
+
+def call_with_retries(client: FakeProvider, x: int) -> int:
+    while True:
+        try:
+            return client(x)
+        except OverloadedError:
+            time.sleep(0.001)
+
+
+def test_is_overload_error() -> None:
+    assert is_overload_error(OverloadedError(429))
+    assert is_overload_error(OverloadedError(503))
+    assert not is_overload_error(OverloadedError(400))
+    assert is_overload_error(TimeoutError())
+    assert is_overload_error(type("APITimeoutError", (Exception,), {})())
+    assert not is_overload_error(ValueError("bad request"))
+
+
+def test_adaptive_limiter_increases_and_backs_off() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=10, latency_tolerance=None)
+    with pytest.raises(ValueError, match="min_limit"):
+        AdaptiveConcurrencyLimiter(initial_limit=0)
+
+    # Increases only while the limit is in use
+    for _ in range(10):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 2
+    for _ in range(10):
+        starts = [limiter.acquire(), limiter.acquire()]
+        for start in starts:
+            limiter.release(start)
+    assert limiter.limit > 2
+
+    # A burst of rejections of calls that started together only backs off once
+    limit = limiter.limit
+    starts = [limiter.acquire() for _ in range(limit)]
+    for start in starts:
+        limiter.release(start, OverloadedError(429))
+    assert limiter.limit == limit // 2
+    assert (limiter.stats.overloads, limiter.stats.decreases) == (limit, 1)
+
+    # Other errors do not change the limit
+    limiter.release(limiter.acquire(), ValueError())
+    assert limiter.limit == limit // 2
+    assert limiter.in_flight == 0
+
+
+def test_adaptive_limiter_latency_spike() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, latency_tolerance=3)
+    for _ in range(5):
+        start = limiter.acquire()
+        time.sleep(0.002)
+        limiter.release(start)
+    start = limiter.acquire()
+    time.sleep(0.05)
+    limiter.release(start)
+    assert limiter.limit == 4
+    assert limiter.stats.latency_spikes == 1
+
+
+def test_adaptive_client_converges_to_capacity() -> None:
+    provider = FakeProvider(capacity=6)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=32, latency_tolerance=None)
+    client = adaptive_client(provider, limiter)
+    args = tuple((client, i) for i in range(600))
+    results = embarrassingly_parallel(call_with_retries, args, num_processes=limiter.max_limit)
+    assert results == list(range(600))
+    assert 2 <= limiter.limit <= 12
+    assert provider.max_running <= 6
+    # Most calls are not rejected, unlike with a fixed concurrency above the capacity
+    assert provider.rejected < 100
+
+
+async def test_adaptive_client_async() -> None:
+    provider = FakeProvider(capacity=4)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=16, latency_tolerance=None)
+    client = adaptive_client(provider.acall, limiter, async_client=True)
+
+    async def call_with_retries(x: int) -> int:
+        while True:
+            try:
+                return int(await client(x))
+            except OverloadedError:
+                await asyncio.sleep(0.001)
+
+    results = await asyncio.gather(*[call_with_retries(i) for i in range(200)])
+    assert results == list(range(200))
+    assert limiter.stats.decreases >= 1
+    assert limiter.in_flight == 0
+
+
+def test_loop_local() -> None:
+    loop_local = LoopLocal(object)
+
+    async def get_twice() -> object:
+        value = loop_local.get()
+        assert loop_local.get() is value
+        return value
+
+    # Each asyncio.run gets a new loop and therefore a new value, and the values of closed loops are dropped
+    first = asyncio.run(get_twice())
+    second = asyncio.run(get_twice())
+    assert first is not second
+    assert len(loop_local._values) == 1
+
+    async def pop() -> object | None:
+        return loop_local.pop()
+
+    assert asyncio.run(pop()) is None
+    with pytest.raises(RuntimeError):
+        loop_local.get()
+
+
+def test_benchmark_adaptive_vs_fixed_concurrency() -> None:
+    num_calls, capacity = 600, 6
+
+    provider = FakeProvider(capacity)
+    start_time = time.perf_counter()
+    embarrassingly_parallel(call_with_retries, tuple((provider, i) for i in range(num_calls)), num_processes=32)
+    fixed_duration = time.perf_counter() - start_time
+    fixed_rejected = provider.rejected
+
+    provider = FakeProvider(capacity)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=32, latency_tolerance=None)
+    client = adaptive_client(provider, limiter)
+    start_time = time.perf_counter()
+    embarrassingly_parallel(call_with_retries, tuple((client, i) for i in range(num_calls)), num_processes=32)
+    adaptive_duration = time.perf_counter() - start_time
+
+    print(f"\n{num_calls} calls to a provider accepting {capacity} at once")
+    print(f"  fixed concurrency of 32: {fixed_duration:.3f}s, {fixed_rejected} rejected")
+    print(
+        f"  adaptive: {adaptive_duration:.3f}s, {provider.rejected} rejected, final limit {limiter.limit}, "
+        f"{limiter.stats.decreases} decreases"
+    )
+    assert provider.rejected < fixed_rejected
@@ -1,10 +1,27 @@
+import asyncio
+from collections.abc import Callable, Iterator
 import multiprocessing
+import os
 import random
+import threading
 import time
 
+from loguru import logger
 import pytest
 
-from not_again_ai.base.parallel import embarrassingly_parallel, embarrassingly_parallel_simple
+from not_again_ai.base.parallel import (
+    ParallelExecutor,
+    ProgressSnapshot,
+    ProgressTracker,
+    RetryPolicy,
+    embarrassingly_parallel,
+    embarrassingly_parallel_iter,
+    embarrassingly_parallel_outcomes,
+    embarrassingly_parallel_simple,
+    embarrassingly_parallel_simple_iter,
+    shared_executor,
+    worker_state,
+)
 
 
 def multby2(x: float, y: float, double: bool = False) -> float:
@@ -28,6 +45,32 @@ def echo(x: int) -> int:
     return x
 
 
+def count_primes(n: int) -> int:
+    """CPU-bound work that holds the GIL."""
+    return sum(all(i % d for d in range(2, int(i**0.5) + 1)) for i in range(2, n))
+
+
+def sleep_and_return(x: int) -> int:
+    time.sleep(0.05)
+    return x
+
+
+async def async_echo(x: int, delay: float = 0.05) -> int:
+    await asyncio.sleep(delay * random.random())
+    return x
+
+
+async def async_sleep_and_return(x: int) -> int:
+    await asyncio.sleep(0.05)
+    return x
+
+
+def fail_on_three(x: int) -> int:
+    if x == 3:
+        raise RuntimeError("three")
+    return x
+
+
 def test_embarrassingly_parallel() -> None:
     args = ((2, 2), (3, 3), (4, 4))
 
@@ -81,3 +124,444 @@ def test_embarrassingly_parallel_ordering() -> None:
 def test_embarrassingly_parallel_simple() -> None:
     result = embarrassingly_parallel_simple([do_something, do_something2], num_processes=2)
     assert result == [8, 2]
+
+
+def test_embarrassingly_parallel_process() -> None:
+    args = tuple((x, x) for x in range(20))
+    kwargs = [{"double": x % 2 == 0} for x in range(20)]
+    result = embarrassingly_parallel(multby2_fast, args, kwargs, num_processes=2, backend="process", chunksize=3)
+    assert result == [x * x * 2 if x % 2 == 0 else x * x for x in range(20)]
+
+
+def multby2_fast(x: float, y: float, double: bool = False) -> float:
+    return x * y * 2 if double else x * y
+
+
+def test_embarrassingly_parallel_process_not_picklable() -> None:
+    with pytest.raises(TypeError, match="cannot be pickled"):
+        embarrassingly_parallel(lambda x: x, ((1,),), num_processes=2, backend="process")
+
+
+def test_embarrassingly_parallel_async() -> None:
+    args = tuple((x,) for x in range(10))
+    assert embarrassingly_parallel(async_echo, args, num_processes=3, backend="async") == list(range(10))
+    kwargs = [{"x": x, "delay": 0.01} for x in range(10)]
+    assert embarrassingly_parallel(async_echo, None, kwargs, num_processes=3, backend="async") == list(range(10))
+
+
+def test_embarrassingly_parallel_simple_backends() -> None:
+    assert embarrassingly_parallel_simple([do_something, do_something2], num_processes=2, backend="process") == [8, 2]
+
+    async def async_do_something() -> int:
+        return 8
+
+    assert embarrassingly_parallel_simple([async_do_something], backend="async") == [8]
+
+
+def test_benchmark_backends() -> None:
+    num_workers = 4
+    cpu_args = tuple((30_000,) for _ in range(8))
+    io_args = tuple((x,) for x in range(40))
+
+    start_time = time.perf_counter()
+    serial = [count_primes(*args) for args in cpu_args]
+    cpu_serial = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    threaded = embarrassingly_parallel(count_primes, cpu_args, num_processes=num_workers)
+    cpu_thread = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    processes = embarrassingly_parallel(count_primes, cpu_args, num_processes=num_workers, backend="process")
+    cpu_process = time.perf_counter() - start_time
+    assert serial == threaded == processes
+
+    start_time = time.perf_counter()
+    embarrassingly_parallel(sleep_and_return, io_args, num_processes=1)
+    io_serial = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    threaded = embarrassingly_parallel(sleep_and_return, io_args, num_processes=num_workers * 5)
+    io_thread = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    coroutines = embarrassingly_parallel(async_sleep_and_return, io_args, num_processes=len(io_args), backend="async")
+    io_async = time.perf_counter() - start_time
+    assert threaded == coroutines == list(range(40))
+
+    print(f"\nCPU-bound, {len(cpu_args)} calls on {multiprocessing.cpu_count()} CPUs with {num_workers} workers")
+    print(f"  serial: {cpu_serial:.3f}s, thread: {cpu_thread:.3f}s, process: {cpu_process:.3f}s")
+    print(f"I/O-bound, {len(io_args)} calls of 50ms")
+    print(f"  serial: {io_serial:.3f}s, thread (20 workers): {io_thread:.3f}s, async (unbounded): {io_async:.3f}s")
+
+
+def test_embarrassingly_parallel_iter_lazy_and_ordered() -> None:
+    consumed = 0
+
+    def args() -> Iterator[tuple[int]]:
+        nonlocal consumed
+        for x in range(100):
+            consumed += 1
+            yield (x,)
+
+    results = embarrassingly_parallel_iter(echo_fast, args(), num_processes=4, max_in_flight=8)
+    assert consumed == 0
+    for expected, result in enumerate(results):
+        assert result == expected
+        # Arguments are only taken from the iterable when a slot frees up
+        assert consumed <= expected + 1 + 8
+
+
+def echo_fast(x: int) -> int:
+    time.sleep(random.uniform(0, 0.01))
+    return x
+
+
+def test_embarrassingly_parallel_iter_as_completed() -> None:
+    args = ((0.2, 0), (0.01, 1), (0.01, 2))
+    results = list(embarrassingly_parallel_iter(sleep_for, args, num_processes=3, max_in_flight=3, ordered=False))
+    assert results[-1] == 0
+    assert sorted(results) == [0, 1, 2]
+
+
+def sleep_for(seconds: float, x: int) -> int:
+    time.sleep(seconds)
+    return x
+
+
+async def async_sleep_for(seconds: float, x: int) -> int:
+    await asyncio.sleep(seconds)
+    return x
+
+
+def test_embarrassingly_parallel_iter_exceptions() -> None:
+    with pytest.raises(ValueError, match="either args_iter or kwargs_iter must be provided"):
+        embarrassingly_parallel_iter(echo_fast, None, None)
+
+    results = embarrassingly_parallel_iter(fail_on_three, ((x,) for x in range(10)), num_processes=2)
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(RuntimeError, match="three"):
+        next(results)
+
+    with pytest.raises(ValueError, match="args_iter and kwargs_iter must be of the same length"):
+        list(embarrassingly_parallel_iter(multby2_fast, [(1, 1), (2, 2)], [{"double": True}], num_processes=2))
+
+
+def test_embarrassingly_parallel_iter_process() -> None:
+    results = embarrassingly_parallel_iter(
+        multby2_fast, ((x, 2) for x in range(50)), num_processes=2, backend="process", chunksize=4
+    )
+    assert list(results) == [x * 2 for x in range(50)]
+
+    with pytest.raises(TypeError, match="cannot be pickled"):
+        list(embarrassingly_parallel_iter(lambda x: x, [(1,)], backend="process"))
+
+
+def test_embarrassingly_parallel_iter_async() -> None:
+    results = embarrassingly_parallel_iter(async_echo, ((x,) for x in range(20)), num_processes=5, backend="async")
+    assert list(results) == list(range(20))
+
+    results = embarrassingly_parallel_iter(
+        async_echo, ((x,) for x in range(20)), num_processes=5, backend="async", ordered=False
+    )
+    assert sorted(results) == list(range(20))
+
+
+def test_embarrassingly_parallel_simple_iter() -> None:
+    assert list(embarrassingly_parallel_simple_iter(iter([do_something, do_something2]), num_processes=2)) == [8, 2]
+
+
+def test_benchmark_iter_time_to_first_result() -> None:
+    args = tuple((x,) for x in range(200))
+
+    start_time = time.perf_counter()
+    embarrassingly_parallel(sleep_and_return, args, num_processes=20)
+    list_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    results = embarrassingly_parallel_iter(sleep_and_return, iter(args), num_processes=20)
+    next(results)
+    first_duration = time.perf_counter() - start_time
+    assert list(results) == list(range(1, 200))
+    iter_duration = time.perf_counter() - start_time
+
+    print(f"\n200 calls of 50ms with 20 threads: list {list_duration:.3f}s")
+    print(f"  iter: first result after {first_duration:.3f}s, all results after {iter_duration:.3f}s")
+
+
+def make_client(prefix: str) -> str:
+    return f"{prefix}-{threading.get_ident()}-{os.getpid()}"
+
+
+def use_client(x: int) -> tuple[str, int]:
+    return worker_state(), x
+
+
+async def ause_client(x: int) -> tuple[str, int]:
+    await asyncio.sleep(0)
+    return worker_state(), x
+
+
+def test_parallel_executor_initializer_per_worker() -> None:
+    with ParallelExecutor(num_processes=3, initializer=make_client, initargs=("client",)) as executor:
+        first = embarrassingly_parallel(use_client, tuple((x,) for x in range(30)), executor=executor)
+        second = list(embarrassingly_parallel_iter(use_client, ((x,) for x in range(30)), executor=executor))
+    assert [x for _, x in first] == list(range(30))
+    clients = {client for client, _ in first + second}
+    # Each of the three worker threads created its client once and the workers were reused by both calls
+    assert 1 <= len(clients) <= 3
+    assert all(client.startswith("client-") for client in clients)
+
+
+def test_parallel_executor_process_initializer() -> None:
+    with ParallelExecutor(num_processes=2, backend="process", initializer=make_client, initargs=("p",)) as executor:
+        results = embarrassingly_parallel(use_client, tuple((x,) for x in range(10)), executor=executor)
+        results += embarrassingly_parallel_simple([do_something], executor=executor)
+    assert results[-1] == 8
+    # The clients were created in the worker processes
+    assert all(client.startswith("p-") and not client.endswith(f"-{os.getpid()}") for client, _ in results[:-1])
+
+
+def test_parallel_executor_async_keeps_loop() -> None:
+    with ParallelExecutor(num_processes=4, backend="async", initializer=make_client, initargs=("a",)) as executor:
+        first = embarrassingly_parallel(ause_client, tuple((x,) for x in range(10)), executor=executor)
+        second = list(embarrassingly_parallel_iter(ause_client, ((x,) for x in range(10)), executor=executor))
+    # Every coroutine ran on the executor's single event loop thread
+    assert len({client for client, _ in first + second}) == 1
+    assert [x for _, x in second] == list(range(10))
+
+
+def test_shared_executor() -> None:
+    executor = shared_executor(num_processes=2)
+    assert shared_executor(num_processes=2) is executor
+    assert shared_executor(num_processes=3) is not executor
+    assert embarrassingly_parallel(echo_fast, ((1,), (2,)), executor=executor) == [1, 2]
+
+
+def test_benchmark_executor_reuse() -> None:
+    num_calls = 300
+    args = tuple((x, x) for x in range(4))
+
+    start_time = time.perf_counter()
+    for _ in range(num_calls):
+        embarrassingly_parallel(multby2_fast, args, num_processes=8)
+    new_pool_duration = time.perf_counter() - start_time
+
+    with ParallelExecutor(num_processes=8) as executor:
+        start_time = time.perf_counter()
+        for _ in range(num_calls):
+            embarrassingly_parallel(multby2_fast, args, executor=executor)
+        executor_duration = time.perf_counter() - start_time
+
+    print(f"\n{num_calls} calls of 4 small tasks with 8 threads")
+    print(f"  new pool per call: {1000 * new_pool_duration / num_calls:.3f} ms/call")
+    print(f"  reused executor:   {1000 * executor_duration / num_calls:.3f} ms/call")
+
+
+class Flaky:
+    """Fails the first `failures` calls for each argument, each call taking `delay` seconds."""
+
+    def __init__(self, failures: int, delay: float = 0.0):
+        self.failures = failures
+        self.delay = delay
+        self.calls: dict[int, int] = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, x: int) -> int:
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls[x] = self.calls.get(x, 0) + 1
+            if self.calls[x] <= self.failures:
+                raise ConnectionError(f"Call {self.calls[x]} for {x} failed")
+        return x
+
+
+def test_embarrassingly_parallel_outcomes_retries() -> None:
+    retry = RetryPolicy(max_attempts=3, initial_delay=0.01, retry_on=(ConnectionError,))
+    outcomes = embarrassingly_parallel_outcomes(Flaky(2), tuple((i,) for i in range(5)), num_processes=2, retry=retry)
+    assert [outcome.value for outcome in outcomes] == [0, 1, 2, 3, 4]
+    assert all(outcome.succeeded and outcome.attempts == 3 for outcome in outcomes)
+
+    outcomes = embarrassingly_parallel_outcomes(Flaky(3), tuple((i,) for i in range(2)), retry=retry)
+    assert [outcome.attempts for outcome in outcomes] == [3, 3]
+    assert all(isinstance(outcome.exception, ConnectionError) for outcome in outcomes)
+
+    # Exceptions outside of retry_on are not retried
+    outcomes = embarrassingly_parallel_outcomes(fail_on_three, tuple((i,) for i in range(5)), retry=retry)
+    assert [outcome.value for outcome in outcomes] == [0, 1, 2, None, 4]
+    assert isinstance(outcomes[3].exception, RuntimeError)
+    assert outcomes[3].attempts == 1
+
+
+def blocking_on_one() -> tuple[Callable[[int], int], list[int], threading.Event]:
+    """A function whose call with 1 blocks until the returned event is set, and the list of calls that finished."""
+    finished: list[int] = []
+    release = threading.Event()
+
+    def block_on_one(x: int) -> int:
+        if x == 1:
+            release.wait(timeout=10)
+        finished.append(x)
+        return x
+
+    return block_on_one, finished, release
+
+
+def test_embarrassingly_parallel_outcomes_timeouts() -> None:
+    args = ((0,), (1,), (2,))
+    func, finished, release = blocking_on_one()
+    outcomes = embarrassingly_parallel_outcomes(func, args, num_processes=3, task_timeout=0.2)
+    # The timed out call is abandoned while it is still blocked rather than waited for
+    assert 1 not in finished
+    release.set()
+    assert [outcome.value for outcome in outcomes] == [0, None, 2]
+    assert isinstance(outcomes[1].exception, TimeoutError)
+
+    func, finished, release = blocking_on_one()
+    outcomes = embarrassingly_parallel_outcomes(func, args, num_processes=1, timeout=0.3)
+    # The overall timeout returns while the second call is blocked and before the third call starts
+    assert finished == [0]
+    release.set()
+    assert outcomes[0].value == 0
+    assert all(isinstance(outcome.exception, TimeoutError) for outcome in outcomes[1:])
+    assert outcomes[1].attempts == 1
+    assert outcomes[2].attempts == 0
+
+
+def test_embarrassingly_parallel_outcomes_timeout_retry_one_worker() -> None:
+    calls: list[int] = []
+
+    def task(x: int) -> int:
+        calls.append(x)
+        # The first attempt outlives its timeout and keeps the only worker busy, and the retry takes most of its own
+        # timeout, so it only succeeds if its timeout starts when it runs rather than when the first attempt timed out
+        time.sleep(0.5 if len(calls) == 1 else 0.15)
+        return x
+
+    retry = RetryPolicy(max_attempts=2, initial_delay=0.01, retry_on=(TimeoutError,))
+    outcomes = embarrassingly_parallel_outcomes(task, ((0,),), num_processes=1, retry=retry, task_timeout=0.25)
+    assert outcomes[0].succeeded
+    assert outcomes[0].value == 0
+    assert outcomes[0].attempts == 2
+
+
+def test_embarrassingly_parallel_outcomes_async() -> None:
+    retry = RetryPolicy(max_attempts=2, initial_delay=0.01)
+    outcomes = embarrassingly_parallel_outcomes(
+        async_sleep_for, ((0.01, 0), (1.0, 1)), num_processes=2, backend="async", retry=retry, task_timeout=0.1
+    )
+    assert outcomes[0].value == 0
+    assert isinstance(outcomes[1].exception, TimeoutError)
+    assert outcomes[1].attempts == 2
+
+
+def test_benchmark_outcomes_vs_serial_retries() -> None:
+    args = tuple((i,) for i in range(32))
+    retry = RetryPolicy(max_attempts=3, initial_delay=0.02, jitter=False, retry_on=(ConnectionError,))
+
+    flaky = Flaky(1, delay=0.01)
+    start_time = time.perf_counter()
+    for (x,) in args:
+        for attempt in range(3):
+            try:
+                flaky(x)
+                break
+            except ConnectionError:
+                time.sleep(retry.delay(attempt + 1))
+    serial_duration = time.perf_counter() - start_time
+
+    flaky = Flaky(1, delay=0.01)
+    start_time = time.perf_counter()
+    outcomes = embarrassingly_parallel_outcomes(flaky, args, num_processes=16, retry=retry)
+    parallel_duration = time.perf_counter() - start_time
+    assert all(outcome.succeeded for outcome in outcomes)
+
+    print(f"\n{len(args)} calls failing once, serial retries: {serial_duration:.3f}s")
+    print(f"  embarrassingly_parallel_outcomes with 16 threads: {parallel_duration:.3f}s")
+
+
+def test_progress_tracker_callback() -> None:
+    snapshots: list[ProgressSnapshot] = []
+    progress = ProgressTracker(callback=snapshots.append, interval=0.05)
+    args = tuple((0.02, i) for i in range(20))
+    assert embarrassingly_parallel(sleep_for, args, num_processes=2, progress=progress) == list(range(20))
+
+    assert len(snapshots) >= 3
+    assert [snapshot.completed for snapshot in snapshots] == sorted(snapshot.completed for snapshot in snapshots)
+    final = snapshots[-1]
+    assert (final.completed, final.failed, final.total, final.in_flight) == (20, 0, 20, 0)
+    assert final.p50 is not None
+    assert final.p99 is not None
+    assert final.p50 <= final.p99
+    assert final.throughput > 0
+
+
+def test_progress_tracker_snapshot() -> None:
+    now = 100.0
+    snapshots: list[ProgressSnapshot] = []
+    progress = ProgressTracker(total=200, callback=snapshots.append, interval=5, clock=lambda: now)
+    progress.start()
+    progress.submit(150)
+    progress.complete([i / 100 for i in range(100, 0, -1)])
+    progress.fail(2)
+
+    now = 104.0
+    progress.maybe_report()
+    assert snapshots == []
+    assert progress.seconds_to_report() == 1.0
+
+    now = 110.0
+    progress.maybe_report()
+    assert snapshots == [
+        ProgressSnapshot(
+            completed=102, failed=2, total=200, in_flight=48, elapsed=10.0, throughput=10.2, p50=0.51, p95=0.96, p99=1.0
+        )
+    ]
+    assert progress.seconds_to_report() == 5.0
+
+
+def test_progress_tracker_backends() -> None:
+    snapshots: list[ProgressSnapshot] = []
+    progress = ProgressTracker(callback=snapshots.append)
+    args = tuple((i, i) for i in range(8))
+    result = embarrassingly_parallel(multby2_fast, args, num_processes=2, backend="process", progress=progress)
+    assert result == [i * i for i in range(8)]
+    assert snapshots[-1].completed == 8
+
+    progress = ProgressTracker(callback=snapshots.append)
+    results = list(
+        embarrassingly_parallel_iter(async_echo, ((i,) for i in range(5)), backend="async", progress=progress)
+    )
+    assert results == list(range(5))
+    assert (snapshots[-1].completed, snapshots[-1].total) == (5, None)
+
+    progress = ProgressTracker(callback=snapshots.append)
+    outcomes = embarrassingly_parallel_outcomes(fail_on_three, tuple((i,) for i in range(5)), progress=progress)
+    assert not outcomes[3].succeeded
+    assert (snapshots[-1].completed, snapshots[-1].failed, snapshots[-1].in_flight) == (5, 1, 0)
+
+
+def test_progress_tracker_logs() -> None:
+    messages: list[str] = []
+    sink_id = logger.add(messages.append, format="{message}")
+    try:
+        embarrassingly_parallel(echo_fast, tuple((i,) for i in range(10)), progress=ProgressTracker())
+    finally:
+        logger.remove(sink_id)
+    assert len(messages) == 1
+    assert messages[0].startswith("Completed 10/10 tasks (0 failed)")
+    assert "p95" in messages[0]
+
+
+def test_benchmark_progress_overhead() -> None:
+    args = tuple((i, 2) for i in range(5000))
+    with ParallelExecutor(num_processes=4) as executor:
+        start_time = time.perf_counter()
+        embarrassingly_parallel(multby2_fast, args, executor=executor)
+        disabled_duration = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        embarrassingly_parallel(
+            multby2_fast, args, executor=executor, progress=ProgressTracker(callback=lambda _: None)
+        )
+        enabled_duration = time.perf_counter() - start_time
+
+    print(f"\n{len(args)} trivial calls on 4 threads")
+    print(f"  without progress: {1e6 * disabled_duration / len(args):.1f} us/call")
+    print(f"  with progress: {1e6 * enabled_duration / len(args):.1f} us/call")
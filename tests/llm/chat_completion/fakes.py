@@ -0,0 +1,57 @@
+"""Fake OpenAI chat completion clients and request helpers for the offline chat completion tests."""
+
+from typing import Any
+
+from not_again_ai.llm.chat_completion.types import (
+    ChatCompletionRequest,
+    ChatCompletionResponse,
+    SystemMessage,
+    UserMessage,
+)
+
+PROMPT_TOKENS = 10
+COMPLETION_TOKENS = 2
+
+
+def fake_completion(content: str = "Paris") -> dict[str, Any]:
+    """The parsed body of an OpenAI chat completion that answers with `content`."""
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": PROMPT_TOKENS, "completion_tokens": COMPLETION_TOKENS},
+    }
+
+
+def fake_openai_client(**kwargs: Any) -> dict[str, Any]:
+    return fake_completion()
+
+
+async def afake_openai_client(**kwargs: Any) -> dict[str, Any]:
+    return fake_completion()
+
+
+class FakeOpenAIClient:
+    """Counts its calls and numbers its answers ("Answer 1", "Answer 2", ...) so tests can tell which call
+    a response came from. The answers are not JSON, so requests with `json_mode` get responses with errors."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, **kwargs: Any) -> dict[str, Any]:
+        self.calls += 1
+        return fake_completion(f"Answer {self.calls}")
+
+
+def is_cache_hit(response: ChatCompletionResponse) -> bool:
+    return isinstance(response.extras, dict) and response.extras.get("cache_hit", False)
+
+
+def make_request(
+    content: str = "What is the capital of France?",
+    system: str = "You are a helpful assistant.",
+    temperature: float = 0,
+) -> ChatCompletionRequest:
+    return ChatCompletionRequest(
+        model="gpt-4o-mini",
+        messages=[SystemMessage(content=system), UserMessage(content=content)],
+        temperature=temperature,
+    )
@@ -0,0 +1,108 @@
+import asyncio
+from collections.abc import Callable
+import time
+from typing import Any
+
+import pytest
+
+from not_again_ai.llm.chat_completion import achat_completion
+from not_again_ai.llm.chat_completion.providers.anthropic_api import anthropic_client
+from not_again_ai.llm.chat_completion.providers.gemini_api import gemini_client
+from not_again_ai.llm.chat_completion.providers.ollama_api import ollama_client
+from not_again_ai.llm.chat_completion.providers.openai_api import openai_client
+from not_again_ai.llm.chat_completion.types import ChatCompletionRequest, SystemMessage, UserMessage
+
+
+def simple_request(model: str) -> ChatCompletionRequest:
+    return ChatCompletionRequest(
+        model=model,
+        messages=[
+            SystemMessage(content="Hello, world!"),
+            UserMessage(content="What is the capital of France?"),
+        ],
+        max_completion_tokens=100,
+    )
+
+
+# region OpenAI and Azure OpenAI
+@pytest.fixture(
+    params=[
+        {"async_client": True},
+        {"api_type": "azure_openai", "aoai_api_version": "2025-01-01-preview", "async_client": True},
+    ]
+)
+def openai_aoai_client_fixture(request: pytest.FixtureRequest) -> Callable[..., Any]:
+    return openai_client(**request.param)
+
+
+async def test_achat_completion_openai(openai_aoai_client_fixture: Callable[..., Any]) -> None:
+    response = await achat_completion(simple_request("gpt-4.1-mini-2025-04-14"), "openai", openai_aoai_client_fixture)
+    print(response.model_dump(mode="json", exclude_none=True))
+
+
+async def test_achat_completion_openai_gather(openai_aoai_client_fixture: Callable[..., Any]) -> None:
+    requests = [simple_request("gpt-4.1-mini-2025-04-14") for _ in range(5)]
+    responses = await asyncio.gather(*[achat_completion(r, "openai", openai_aoai_client_fixture) for r in requests])
+    for response in responses:
+        print(response.model_dump(mode="json", exclude_none=True))
+
+
+# endregion
+
+
+# region Ollama
+async def test_achat_completion_ollama() -> None:
+    client = ollama_client(async_client=True)
+    response = await achat_completion(simple_request("llama3.2-vision:11b-instruct-q4_K_M"), "ollama", client)
+    print(response.model_dump(mode="json", exclude_none=True))
+
+
+# endregion
+
+
+# region Anthropic
+async def test_achat_completion_anthropic() -> None:
+    client = anthropic_client(async_client=True)
+    response = await achat_completion(simple_request("claude-3-7-sonnet-20250219"), "anthropic", client)
+    print(response.model_dump(mode="json", exclude_none=True))
+
+
+# endregion
+
+
+# region Gemini
+async def test_achat_completion_gemini() -> None:
+    client = gemini_client(async_client=True)
+    response = await achat_completion(simple_request("gemini-2.5-flash-preview-04-17"), "gemini", client)
+    print(response.model_dump(mode="json", exclude_none=True))
+
+
+# endregion
+
+
+async def test_achat_completion_many_in_flight() -> None:
+    """Hundreds of requests are held in flight on a single event loop without any threads."""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_openai_client(**kwargs: Any) -> dict[str, Any]:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.1)
+        in_flight -= 1
+        return {
+            "choices": [{"message": {"role": "assistant", "content": "Paris"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 1},
+        }
+
+    num_requests = 300
+    start_time = time.perf_counter()
+    responses = await asyncio.gather(
+        *[achat_completion(simple_request("gpt-4o-mini"), "openai", fake_openai_client) for _ in range(num_requests)]
+    )
+    duration = time.perf_counter() - start_time
+
+    print(f"{num_requests} requests in {duration:.3f}s with {max_in_flight} in flight")
+    assert all(response.choices[0].message.content == "Paris" for response in responses)
+    assert max_in_flight == num_requests
@@ -0,0 +1,116 @@
+from pathlib import Path
+import time
+
+from not_again_ai.llm.chat_completion.cache import ChatCompletionCache, InMemoryCacheBackend, SQLiteCacheBackend
+from tests.llm.chat_completion.fakes import FakeOpenAIClient, afake_openai_client, is_cache_hit, make_request
+
+
+def test_cache_hit_and_miss() -> None:
+    client = FakeOpenAIClient()
+    cache = ChatCompletionCache()
+
+    first = cache.chat_completion(make_request(), "openai", client)
+    second = cache.chat_completion(make_request(), "openai", client)
+
+    assert client.calls == 1
+    assert first.choices[0].message.content == second.choices[0].message.content
+    assert not is_cache_hit(first)
+    assert is_cache_hit(second)
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.hit_ratio == 0.5
+
+
+def test_cache_skips_responses_with_errors() -> None:
+    client = FakeOpenAIClient()
+    cache = ChatCompletionCache()
+    request = make_request().model_copy(update={"json_mode": True})
+
+    # The fake client's answers are not JSON, so every response has errors
+    first = cache.chat_completion(request, "openai", client)
+    second = cache.chat_completion(request, "openai", client)
+
+    assert first.errors
+    assert not is_cache_hit(second)
+    assert client.calls == 2
+    assert cache.backend.get(cache.key(request, "openai")) is None
+
+
+def test_cache_key_canonicalization() -> None:
+    request = make_request()
+    streamed = make_request()
+    streamed.stream = True
+    assert ChatCompletionCache.key(request, "openai") == ChatCompletionCache.key(streamed, "openai")
+    assert ChatCompletionCache.key(request, "openai") != ChatCompletionCache.key(request, "azure_openai")
+    assert ChatCompletionCache.key(request, "openai") != ChatCompletionCache.key(make_request("Germany?"), "openai")
+
+
+def test_cache_modes() -> None:
+    client = FakeOpenAIClient()
+    cache = ChatCompletionCache()
+    cache.chat_completion(make_request(), "openai", client)
+
+    bypassed = cache.chat_completion(make_request(), "openai", client, mode="bypass")
+    assert bypassed.choices[0].message.content == "Answer 2"
+
+    refreshed = cache.chat_completion(make_request(), "openai", client, mode="refresh")
+    assert refreshed.choices[0].message.content == "Answer 3"
+
+    cached = cache.chat_completion(make_request(), "openai", client)
+    assert cached.choices[0].message.content == "Answer 3"
+    assert client.calls == 3
+
+
+def test_cache_deterministic_only() -> None:
+    client = FakeOpenAIClient()
+    cache = ChatCompletionCache()
+    cache.chat_completion(make_request(temperature=0.7), "openai", client)
+    cache.chat_completion(make_request(temperature=0.7), "openai", client)
+    assert client.calls == 2
+
+    cache = ChatCompletionCache(deterministic_only=False)
+    cache.chat_completion(make_request(temperature=0.7), "openai", client)
+    cache.chat_completion(make_request(temperature=0.7), "openai", client)
+    assert client.calls == 3
+
+
+def test_in_memory_backend_lru_and_ttl() -> None:
+    client = FakeOpenAIClient()
+    cache = ChatCompletionCache(backend=InMemoryCacheBackend(max_size=2, ttl=0.2))
+    for content in ["a", "b", "c"]:
+        cache.chat_completion(make_request(content), "openai", client)
+    # "a" was evicted as the least recently used entry
+    cache.chat_completion(make_request("a"), "openai", client)
+    assert client.calls == 4
+
+    time.sleep(0.3)
+    cache.chat_completion(make_request("a"), "openai", client)
+    assert client.calls == 5
+
+
+def test_sqlite_backend_persists(tmp_path: Path) -> None:
+    client = FakeOpenAIClient()
+    path = tmp_path / "cache" / "responses.sqlite"
+    backend = SQLiteCacheBackend(path)
+    ChatCompletionCache(backend=backend).chat_completion(make_request(), "openai", client)
+    backend.close()
+
+    backend = SQLiteCacheBackend(path)
+    cache = ChatCompletionCache(backend=backend)
+    response = cache.chat_completion(make_request(), "openai", client)
+    assert client.calls == 1
+    assert response.choices[0].message.content == "Answer 1"
+    assert is_cache_hit(response)
+
+    backend.clear()
+    cache.chat_completion(make_request(), "openai", client)
+    assert client.calls == 2
+    backend.close()
+
+
+async def test_cache_async() -> None:
+    cache = ChatCompletionCache()
+    await cache.achat_completion(make_request(), "openai", afake_openai_client)
+    response = await cache.achat_completion(make_request(), "openai", afake_openai_client)
+    assert is_cache_hit(response)
+    assert cache.stats.hits == 1
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Any
+
+import pytest
+
+from not_again_ai.llm.chat_completion import (
+    achat_completion_batch,
+    achat_completion_batch_as_completed,
+    chat_completion_batch,
+)
+from not_again_ai.llm.chat_completion.types import ChatCompletionRequest, UserMessage
+from tests.llm.chat_completion.fakes import fake_completion
+
+LATENCY = 0.05
+
+
+def fake_openai_client(**kwargs: Any) -> dict[str, Any]:
+    content = kwargs["messages"][0]["content"]
+    if content == "fail":
+        raise RuntimeError("Injected failure")
+    time.sleep(LATENCY)
+    return fake_completion(content)
+
+
+async def afake_openai_client(**kwargs: Any) -> dict[str, Any]:
+    content = kwargs["messages"][0]["content"]
+    if content == "fail":
+        raise RuntimeError("Injected failure")
+    # Later requests finish first so completion order differs from input order
+    await asyncio.sleep(LATENCY / (1 + int(content)))
+    return fake_completion(content)
+
+
+def make_requests(contents: list[str]) -> list[ChatCompletionRequest]:
+    return [ChatCompletionRequest(model="gpt-4o-mini", messages=[UserMessage(content=c)]) for c in contents]
+
+
+def test_chat_completion_batch_order_and_errors() -> None:
+    results = chat_completion_batch(make_requests(["0", "1", "fail", "3"]), "openai", fake_openai_client)
+
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert results[0].response is not None
+    assert results[0].response.choices[0].message.content == "0"
+    assert results[2].response is None
+    assert results[2].errors == "RuntimeError: Injected failure"
+    assert results[3].response is not None
+    assert results[3].response.choices[0].message.content == "3"
+
+
+async def test_achat_completion_batch_order_and_errors() -> None:
+    results = await achat_completion_batch(make_requests(["0", "1", "fail", "3"]), "openai", afake_openai_client)
+
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert [result.response.choices[0].message.content if result.response else None for result in results] == [
+        "0",
+        "1",
+        None,
+        "3",
+    ]
+    assert results[2].errors == "RuntimeError: Injected failure"
+
+
+async def test_achat_completion_batch_as_completed() -> None:
+    requests = make_requests([str(i) for i in range(5)])
+    indices = [
+        result.index
+        async for result in achat_completion_batch_as_completed(
+            requests, "openai", afake_openai_client, max_concurrency=5
+        )
+    ]
+    assert sorted(indices) == [0, 1, 2, 3, 4]
+    assert indices[0] == 4
+
+
+async def test_chat_completion_batch_invalid_max_concurrency() -> None:
+    requests = make_requests(["0"])
+    with pytest.raises(ValueError, match="max_concurrency must be at least 1"):
+        chat_completion_batch(requests, "openai", fake_openai_client, max_concurrency=0)
+    with pytest.raises(ValueError, match="max_concurrency must be at least 1"):
+        await achat_completion_batch(requests, "openai", afake_openai_client, max_concurrency=0)
+    with pytest.raises(ValueError, match="max_concurrency must be at least 1"):
+        await anext(achat_completion_batch_as_completed(requests, "openai", afake_openai_client, max_concurrency=0))
+
+
+async def test_achat_completion_batch_throughput() -> None:
+    num_requests = 50
+    requests = make_requests(["0"] * num_requests)
+
+    for max_concurrency in [1, 10, 50]:
+        start_time = time.perf_counter()
+        results = await achat_completion_batch(requests, "openai", afake_openai_client, max_concurrency=max_concurrency)
+        duration = time.perf_counter() - start_time
+        assert all(result.response is not None for result in results)
+        print(f"max_concurrency={max_concurrency}: {num_requests / duration:.1f} requests/sec")
+
+
+def test_chat_completion_batch_throughput() -> None:
+    num_requests = 20
+    requests = make_requests(["0"] * num_requests)
+
+    for max_concurrency in [1, 20]:
+        start_time = time.perf_counter()
+        chat_completion_batch(requests, "openai", fake_openai_client, max_concurrency=max_concurrency)
+        duration = time.perf_counter() - start_time
+        print(f"max_concurrency={max_concurrency}: {num_requests / duration:.1f} requests/sec")
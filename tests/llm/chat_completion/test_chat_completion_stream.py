@@ -5,6 +5,8 @@ from typing import Any
 import pytest
 
 from not_again_ai.llm.chat_completion import chat_completion_stream
+from not_again_ai.llm.chat_completion.providers.anthropic_api import anthropic_client
+from not_again_ai.llm.chat_completion.providers.gemini_api import gemini_client
 from not_again_ai.llm.chat_completion.providers.ollama_api import ollama_client
 from not_again_ai.llm.chat_completion.providers.openai_api import openai_client
 from not_again_ai.llm.chat_completion.types import (
@@ -551,3 +553,117 @@ async def test_chat_completion_stream_ollama_vision_multiple_images(ollama_clien
 
 
 # endregion
+
+
+# region Anthropic
+@pytest.fixture(
+    params=[
+        {"async_client": True},
+    ]
+)
+def anthropic_client_fixture(request: pytest.FixtureRequest) -> Callable[..., Any]:
+    return anthropic_client(**request.param)
+
+
+async def test_chat_completion_stream_anthropic(anthropic_client_fixture: Callable[..., Any]) -> None:
+    request = ChatCompletionRequest(
+        model="claude-3-7-sonnet-20250219",
+        messages=[
+            SystemMessage(content="You are a helpful assistant."),
+            UserMessage(content="What is the capital of France?"),
+        ],
+        max_completion_tokens=200,
+    )
+    async for chunk in chat_completion_stream(request, "anthropic", anthropic_client_fixture):
+        print(chunk.model_dump(mode="json", exclude_none=True))
+
+
+async def test_chat_completion_stream_anthropic_multiple_tools(anthropic_client_fixture: Callable[..., Any]) -> None:
+    tools = [
+        {
+            "name": "get_current_weather",
+            "description": "Get the current weather",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "location": {
+                        "type": "string",
+                        "description": "The city and state, e.g. San Francisco, CA",
+                    },
+                },
+                "required": ["location"],
+            },
+        }
+    ]
+    request = ChatCompletionRequest(
+        model="claude-3-7-sonnet-20250219",
+        messages=[
+            SystemMessage(content="Call the get_current_weather function once for each city that the user mentions."),
+            UserMessage(content="What's the current weather like in Boston, MA and New York, NY today?"),
+        ],
+        tools=tools,
+        max_completion_tokens=400,
+        temperature=0,
+    )
+    async for chunk in chat_completion_stream(request, "anthropic", anthropic_client_fixture):
+        print(chunk.model_dump(mode="json", exclude_none=True))
+
+
+# endregion
+
+
+# region Gemini
+@pytest.fixture(
+    params=[
+        {"async_client": True},
+    ]
+)
+def gemini_client_fixture(request: pytest.FixtureRequest) -> Callable[..., Any]:
+    return gemini_client(**request.param)
+
+
+async def test_chat_completion_stream_gemini(gemini_client_fixture: Callable[..., Any]) -> None:
+    request = ChatCompletionRequest(
+        model="gemini-2.5-flash-preview-04-17",
+        messages=[
+            SystemMessage(content="You are a helpful assistant."),
+            UserMessage(content="What is the capital of France?"),
+        ],
+        max_completion_tokens=200,
+    )
+    async for chunk in chat_completion_stream(request, "gemini", gemini_client_fixture):
+        print(chunk.model_dump(mode="json", exclude_none=True))
+
+
+async def test_chat_completion_stream_gemini_multiple_tools(gemini_client_fixture: Callable[..., Any]) -> None:
+    tools = [
+        {
+            "name": "get_current_weather",
+            "description": "Get the current weather",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "location": {
+                        "type": "string",
+                        "description": "The city and state, e.g. San Francisco, CA",
+                    },
+                },
+                "required": ["location"],
+            },
+        }
+    ]
+    request = ChatCompletionRequest(
+        model="gemini-2.5-flash-preview-04-17",
+        messages=[
+            SystemMessage(content="Call the get_current_weather function once for each city that the user mentions."),
+            UserMessage(content="What's the current weather like in Boston, MA and New York, NY today?"),
+        ],
+        tools=tools,
+        max_completion_tokens=400,
+        temperature=0,
+    )
+    async for chunk in chat_completion_stream(request, "gemini", gemini_client_fixture):
+        print(chunk.model_dump(mode="json", exclude_none=True))
+
+
+# endregion
@@ -0,0 +1,139 @@
+"""Replays recorded provider stream events through `chat_completion_stream`, so no API keys are needed."""
+
+from collections.abc import AsyncIterator, Callable
+import json
+from pathlib import Path
+from typing import Any
+
+from anthropic.types.beta import BetaRawMessageStreamEvent
+from google.genai.types import GenerateContentResponse
+from pydantic import TypeAdapter
+
+from not_again_ai.llm.chat_completion import StreamAccumulator, StreamMetricsRecorder, chat_completion_stream
+from not_again_ai.llm.chat_completion.types import ChatCompletionChunk, ChatCompletionRequest, UserMessage
+
+stream_dir = Path(__file__).parent.parent / "sample_streams"
+
+
+def replay_client(fixture: str, parse: Callable[[dict[str, Any]], Any]) -> Callable[..., Any]:
+    """An async client callable whose stream yields the events recorded in `fixture`, parsed into SDK objects."""
+    events = [parse(json.loads(line)) for line in (stream_dir / fixture).read_text().splitlines()]
+
+    async def client_callable(**kwargs: Any) -> AsyncIterator[Any]:
+        assert kwargs["stream"] is True
+
+        async def stream() -> AsyncIterator[Any]:
+            for event in events:
+                yield event
+
+        return stream()
+
+    return client_callable
+
+
+def anthropic_event(data: dict[str, Any]) -> Any:
+    return TypeAdapter(BetaRawMessageStreamEvent).validate_python(data)
+
+
+async def collect(provider: str, client: Callable[..., Any]) -> list[ChatCompletionChunk]:
+    request = ChatCompletionRequest(
+        model="test-model",
+        messages=[UserMessage(content="What is the weather in San Francisco and Paris?")],
+        max_completion_tokens=200,
+    )
+    return [chunk async for chunk in chat_completion_stream(request, provider, client)]
+
+
+def joined_tool_calls(chunks: list[ChatCompletionChunk]) -> dict[int, dict[str, Any]]:
+    """Joins tool call deltas by their index like a consumer of the stream would."""
+    tool_calls: dict[int, dict[str, Any]] = {}
+    for chunk in chunks:
+        for tool_call in chunk.choices[0].delta.tool_calls or []:
+            assert tool_call.index is not None
+            joined = tool_calls.setdefault(tool_call.index, {"id": "", "name": "", "arguments": ""})
+            joined["id"] += tool_call.id or ""
+            joined["name"] += tool_call.function.name
+            arguments = tool_call.function.arguments
+            joined["arguments"] += arguments if isinstance(arguments, str) else json.dumps(arguments)
+    return tool_calls
+
+
+async def test_anthropic_stream_text() -> None:
+    chunks = await collect("anthropic", replay_client("anthropic_text.jsonl", anthropic_event))
+    assert "".join(chunk.choices[0].delta.content for chunk in chunks) == "The capital of France is Paris."
+    assert [chunk.choices[0].finish_reason for chunk in chunks] == [None, None, None, "stop"]
+    assert (chunks[-1].prompt_tokens, chunks[-1].completion_tokens) == (25, 9)
+    assert all(chunk.prompt_tokens is None for chunk in chunks[:-1])
+
+
+async def test_anthropic_stream_tool_use() -> None:
+    chunks = await collect("anthropic", replay_client("anthropic_tool_use.jsonl", anthropic_event))
+    assert chunks[0].choices[0].delta.content == "I'll check the weather in both cities."
+    tool_calls = joined_tool_calls(chunks)
+    assert tool_calls[0]["id"] == "toolu_01T1x1fJ34qAmk2tNTrN7Up6"
+    assert tool_calls[1]["name"] == "get_weather"
+    assert [json.loads(tool_call["arguments"]) for tool_call in tool_calls.values()] == [
+        {"location": "San Francisco, CA"},
+        {"location": "Paris, France"},
+    ]
+    assert chunks[-1].choices[0].finish_reason == "tool_calls"
+    assert (chunks[-1].prompt_tokens, chunks[-1].completion_tokens) == (472, 89)
+
+
+async def test_anthropic_stream_dict_events() -> None:
+    chunks = await collect("anthropic", replay_client("anthropic_text.jsonl", lambda data: data))
+    assert "".join(chunk.choices[0].delta.content for chunk in chunks) == "The capital of France is Paris."
+
+
+async def test_gemini_stream_text() -> None:
+    chunks = await collect("gemini", replay_client("gemini_text.jsonl", GenerateContentResponse.model_validate))
+    assert "".join(chunk.choices[0].delta.content for chunk in chunks) == "The capital of France is Paris.\n"
+    assert [chunk.choices[0].finish_reason for chunk in chunks] == [None, None, "stop"]
+    assert (chunks[-1].prompt_tokens, chunks[-1].completion_tokens) == (12, 8)
+    assert chunks[0].completion_tokens is None
+
+
+async def test_gemini_stream_tool_call() -> None:
+    chunks = await collect("gemini", replay_client("gemini_tool_call.jsonl", GenerateContentResponse.model_validate))
+    # The thought summary is skipped
+    assert len(chunks) == 1
+    tool_calls = joined_tool_calls(chunks)
+    assert [json.loads(tool_call["arguments"]) for tool_call in tool_calls.values()] == [
+        {"location": "San Francisco, CA"},
+        {"location": "Paris, France"},
+    ]
+    assert chunks[0].choices[0].finish_reason == "tool_calls"
+    assert (chunks[0].prompt_tokens, chunks[0].completion_tokens) == (61, 75)
+
+
+async def test_anthropic_stream_accumulated_response() -> None:
+    accumulator = StreamAccumulator()
+    for chunk in await collect("anthropic", replay_client("anthropic_tool_use.jsonl", anthropic_event)):
+        accumulator.add(chunk)
+    response = accumulator.response()
+
+    message = response.choices[0].message
+    assert message.content == "I'll check the weather in both cities."
+    assert message.tool_calls is not None
+    assert [tool_call.function.arguments for tool_call in message.tool_calls] == [
+        {"location": "San Francisco, CA"},
+        {"location": "Paris, France"},
+    ]
+    assert response.choices[0].finish_reason == "tool_calls"
+    assert (response.prompt_tokens, response.completion_tokens, response.errors) == (472, 89, "")
+
+
+async def test_gemini_stream_metrics() -> None:
+    recorder = StreamMetricsRecorder()
+    for chunk in await collect("gemini", replay_client("gemini_text.jsonl", GenerateContentResponse.model_validate)):
+        recorder.add(chunk)
+    metrics = recorder.metrics()
+
+    assert metrics.num_chunks == 3
+    assert metrics.time_to_first_token is not None
+    assert metrics.time_to_first_token == metrics.time_to_first_content
+    assert metrics.time_to_first_token <= metrics.duration
+    assert metrics.time_to_first_tool_call is None
+    assert len(metrics.inter_chunk_gaps) == 2
+    assert all(gap >= 0 for gap in metrics.inter_chunk_gaps)
+    assert metrics.completion_tokens == 8
@@ -0,0 +1,141 @@
+from collections.abc import AsyncIterator
+import contextlib
+import json
+import random
+import re
+import time
+from typing import Any
+
+import pytest
+
+from not_again_ai.llm.chat_completion import JSONStreamParser, stream_json_values
+from not_again_ai.llm.chat_completion.types import ChatCompletionChoiceStream, ChatCompletionChunk, ChatCompletionDelta
+
+DOCUMENTS = [
+    '{"a": [1, 2.5e3, -3, {"b": "x\\"y\\\\z\\u00e9"}], "c": true, "d": null, "e": {}, "f": []}',
+    ' [ [], [[ ]], {"k": [false, ""]} ] ',
+    '"top level string"',
+    "-12.5e-3",
+    '{"items": [{"id": 1, "name": "one"}, {"id": 2, "name": "two, \\"quoted\\""}], "total": 2}',
+]
+
+
+def feed_in_pieces(parser: JSONStreamParser, text: str, rng: random.Random) -> list[tuple[Any, Any]]:
+    completed = []
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 5)
+        completed.extend(parser.feed(text[i : i + size]))
+        i += size
+    return completed
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_json_stream_parser_matches_json_loads(document: str) -> None:
+    rng = random.Random(0)
+    for _ in range(50):
+        parser = JSONStreamParser()
+        feed_in_pieces(parser, document, rng)
+        assert parser.close() == json.loads(document)
+
+
+def test_json_stream_parser_completed_values() -> None:
+    parser = JSONStreamParser()
+    document = DOCUMENTS[4]
+    assert parser.feed(document[:30]) == [(("items", 0, "id"), 1)]
+    assert parser.feed(document[30:40]) == [(("items", 0, "name"), "one"), (("items", 0), {"id": 1, "name": "one"})]
+    # The partial value holds the completed values
+    assert parser.value == {"items": [{"id": 1, "name": "one"}, {}]}
+    assert not parser.done
+
+    completed = parser.feed(document[40:])
+    assert [path for path, _ in completed] == [
+        ("items", 1, "id"),
+        ("items", 1, "name"),
+        ("items", 1),
+        ("items",),
+        ("total",),
+        (),
+    ]
+    assert completed[2][1] == {"id": 2, "name": 'two, "quoted"'}
+    assert parser.done
+
+
+@pytest.mark.parametrize(
+    ("document", "message"),
+    [
+        ('{"a" 1}', "Expected ':', got '1' at position 5"),
+        ("[1,]", "Expected a value, got ']' at position 3"),
+        ('{"a": 1}}', "Unexpected '}' after the end of the JSON value at position 8"),
+        ("[tru]", "Invalid value 'tru' at position 4"),
+        ("[1 2]", "Expected ',' or the end of the container, got '2' at position 3"),
+        ('{"a": [1', "The JSON text ended before the value was complete"),
+        ('"\\x"', "Invalid string"),
+    ],
+)
+def test_json_stream_parser_errors(document: str, message: str) -> None:
+    def parse() -> Any:
+        parser = JSONStreamParser()
+        parser.feed(document)
+        return parser.close()
+
+    with pytest.raises(ValueError, match=re.escape(message)):
+        parse()
+
+
+async def test_stream_json_values() -> None:
+    document = DOCUMENTS[4]
+
+    async def stream() -> AsyncIterator[ChatCompletionChunk]:
+        for i in range(0, len(document), 7):
+            yield ChatCompletionChunk(
+                choices=[
+                    ChatCompletionChoiceStream(
+                        delta=ChatCompletionDelta(content=document[i : i + 7]), index=0, finish_reason=None
+                    ),
+                    ChatCompletionChoiceStream(
+                        delta=ChatCompletionDelta(content="not json"), index=1, finish_reason=None
+                    ),
+                ]
+            )
+
+    items = [value async for path, value in stream_json_values(stream()) if len(path) == 2 and path[0] == "items"]
+    assert items == [{"id": 1, "name": "one"}, {"id": 2, "name": 'two, "quoted"'}]
+
+
+def test_benchmark_json_stream_parser() -> None:
+    num_items, delta_size = 2000, 4
+    document = json.dumps(
+        {
+            "items": [
+                {"id": i, "title": f"Item number {i}", "tags": ["a", "b"], "score": i / 7} for i in range(num_items)
+            ]
+        }
+    )
+    deltas = [document[i : i + delta_size] for i in range(0, len(document), delta_size)]
+
+    start_time = time.perf_counter()
+    parser = JSONStreamParser()
+    first_item_delta = None
+    for number, delta in enumerate(deltas):
+        for path, _ in parser.feed(delta):
+            if first_item_delta is None and path == ("items", 0):
+                first_item_delta = number
+    incremental_duration = time.perf_counter() - start_time
+    assert parser.close() == json.loads(document)
+    assert first_item_delta is not None
+
+    # Trying to parse the whole buffer after each delta is quadratic, so only time the first part of the stream
+    num_reparsed = len(deltas) // 20
+    start_time = time.perf_counter()
+    buffer = ""
+    for delta in deltas[:num_reparsed]:
+        buffer += delta
+        with contextlib.suppress(json.JSONDecodeError):
+            json.loads(buffer)
+    reparse_duration = time.perf_counter() - start_time
+
+    print(f"\n{len(document) / 1e6:.2f} MB of JSON in {len(deltas)} deltas of {delta_size} characters")
+    print(f"  first item available after delta {first_item_delta} ({100 * first_item_delta / len(deltas):.2f}%)")
+    print(f"  JSONStreamParser: {incremental_duration:.3f}s for the whole stream")
+    print(f"  json.loads on the buffer after each delta: {reparse_duration:.3f}s for the first 5% of the stream")
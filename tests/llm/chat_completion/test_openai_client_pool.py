@@ -0,0 +1,128 @@
+import asyncio
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from typing import Any, ClassVar
+
+from openai import OpenAI
+import pytest
+
+from not_again_ai.llm.chat_completion import achat_completion, chat_completion
+from not_again_ai.llm.chat_completion.providers.openai_api import (
+    AsyncOpenAIClientCallable,
+    OpenAIClientCallable,
+    openai_client,
+)
+from not_again_ai.llm.chat_completion.types import ChatCompletionRequest, UserMessage
+
+STUB_COMPLETION = {
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "Paris"},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections: ClassVar[set[tuple[str, int]]] = set()
+
+    def do_POST(self) -> None:
+        StubOpenAIHandler.connections.add(self.client_address)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps(STUB_COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def stub_server_url() -> Iterator[str]:
+    StubOpenAIHandler.connections = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def stub_request() -> ChatCompletionRequest:
+    return ChatCompletionRequest(model="gpt-4o-mini", messages=[UserMessage(content="What is the capital of France?")])
+
+
+def test_openai_client_reuses_connection(stub_server_url: str) -> None:
+    client = openai_client(api_key="stub", base_url=stub_server_url, max_connections=4, keepalive_expiry=30)
+    assert isinstance(client, OpenAIClientCallable)
+    with client:
+        for _ in range(5):
+            response = chat_completion(stub_request(), "openai", client)
+            assert response.choices[0].message.content == "Paris"
+
+    assert len(StubOpenAIHandler.connections) == 1
+
+
+async def test_openai_async_client_lifecycle(stub_server_url: str) -> None:
+    client = openai_client(api_key="stub", base_url=stub_server_url, async_client=True)
+    assert isinstance(client, AsyncOpenAIClientCallable)
+    async with client:
+        inner_client = client.client
+        assert client.client is inner_client
+        assert not inner_client.is_closed()
+    assert inner_client.is_closed()
+
+
+def test_openai_async_client_across_event_loops(stub_server_url: str) -> None:
+    # Without retries, a connection left over from a closed loop fails the request instead of being retried
+    client = openai_client(api_key="stub", base_url=stub_server_url, async_client=True, max_retries=0)
+
+    async def run() -> str | None:
+        response = await achat_completion(stub_request(), "openai", client)
+        return response.choices[0].message.content
+
+    # Each asyncio.run has its own event loop, which gets its own client and connection pool
+    assert asyncio.run(run()) == "Paris"
+    assert asyncio.run(run()) == "Paris"
+
+
+def test_openai_client_pool_benchmark(stub_server_url: str) -> None:
+    num_requests = 50
+
+    # Before: a new client (and connection pool) was constructed for every request.
+    start_time = time.perf_counter()
+    for _ in range(num_requests):
+        OpenAI(api_key="stub", base_url=stub_server_url).chat.completions.create(
+            model="gpt-4o-mini", messages=[{"role": "user", "content": "What is the capital of France?"}]
+        )
+    per_request_latency = (time.perf_counter() - start_time) / num_requests
+    unpooled_connections = len(StubOpenAIHandler.connections)
+
+    StubOpenAIHandler.connections = set()
+    client = openai_client(api_key="stub", base_url=stub_server_url)
+    assert isinstance(client, OpenAIClientCallable)
+    with client:
+        start_time = time.perf_counter()
+        for _ in range(num_requests):
+            chat_completion(stub_request(), "openai", client)
+        pooled_latency = (time.perf_counter() - start_time) / num_requests
+
+    print(f"Per-request client: {per_request_latency * 1000:.3f} ms/request, {unpooled_connections} connections")
+    print(f"Pooled client: {pooled_latency * 1000:.3f} ms/request, {len(StubOpenAIHandler.connections)} connections")
+    assert unpooled_connections == num_requests
+    assert len(StubOpenAIHandler.connections) == 1
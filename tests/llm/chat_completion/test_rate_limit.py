@@ -0,0 +1,105 @@
+import asyncio
+import time
+from typing import Any
+
+import pytest
+
+from not_again_ai.llm.chat_completion import achat_completion, chat_completion
+from not_again_ai.llm.chat_completion.rate_limit import RateLimiter, TokenBucket, rate_limited_client
+from tests.llm.chat_completion.fakes import (
+    COMPLETION_TOKENS,
+    PROMPT_TOKENS,
+    afake_openai_client,
+    fake_openai_client,
+    make_request,
+)
+from tests.llm.fakes import WhitespaceTokenizer
+
+
+def test_token_bucket_reserve() -> None:
+    bucket = TokenBucket(capacity_per_minute=60)
+    assert bucket.reserve(60) == 0
+    # The bucket refills at one token per second, so six more tokens require waiting about six seconds.
+    assert bucket.reserve(6) == pytest.approx(6, abs=0.1)
+    bucket.adjust(6)
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.1)
+
+
+def test_rate_limiter_estimate_tokens() -> None:
+    limiter = RateLimiter(tokens_per_minute=1000, tokenizer=WhitespaceTokenizer("gpt-4o-mini", "openai"))
+    kwargs = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "user", "content": "What is the capital of France?"},
+            {"role": "user", "content": [{"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}}]},
+        ],
+        "max_completion_tokens": 10,
+    }
+    # "user" * 2 + 6 words of content + "image_url" + 10 max completion tokens
+    assert limiter.estimate_tokens(kwargs) == 2 + 6 + 1 + 10
+
+
+def test_rate_limited_client_corrects_reservation() -> None:
+    limiter = RateLimiter(
+        requests_per_minute=100, tokens_per_minute=1000, tokenizer=WhitespaceTokenizer("gpt-4o-mini", "openai")
+    )
+    client = rate_limited_client(fake_openai_client, limiter)
+    response = chat_completion(make_request(), "openai", client)
+
+    assert response.choices[0].message.content == "Paris"
+    assert limiter.stats.requests == 1
+    assert limiter.stats.actual_tokens == PROMPT_TOKENS + COMPLETION_TOKENS
+    assert limiter.token_bucket is not None
+    # Only the actual usage remains reserved once the response is corrected
+    assert limiter.token_bucket.tokens == pytest.approx(1000 - PROMPT_TOKENS - COMPLETION_TOKENS, abs=1)
+
+
+async def test_rate_limited_client_releases_reservation_on_failure() -> None:
+    def failing_client(**kwargs: Any) -> dict[str, Any]:
+        raise TimeoutError("Request timed out")
+
+    async def afailing_client(**kwargs: Any) -> dict[str, Any]:
+        raise TimeoutError("Request timed out")
+
+    limiter = RateLimiter(tokens_per_minute=1000, tokenizer=WhitespaceTokenizer("gpt-4o-mini", "openai"))
+    assert limiter.token_bucket is not None
+    kwargs = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "Hi"}], "max_completion_tokens": 10}
+
+    with pytest.raises(TimeoutError):
+        rate_limited_client(failing_client, limiter)(**kwargs)
+    with pytest.raises(TimeoutError):
+        await rate_limited_client(afailing_client, limiter, async_client=True)(**kwargs)
+    # The reservations are returned, so failures do not use up capacity
+    assert limiter.token_bucket.tokens == pytest.approx(1000, abs=1)
+    assert limiter.stats.actual_tokens == 0
+
+
+def test_rate_limited_client_waits_for_capacity() -> None:
+    # 1200 requests per minute allows a burst of 1200 and then one request every 50ms
+    limiter = RateLimiter(requests_per_minute=1200)
+    assert limiter.request_bucket is not None
+    limiter.request_bucket.reserve(1200)
+    client = rate_limited_client(fake_openai_client, limiter)
+
+    start_time = time.perf_counter()
+    for _ in range(3):
+        chat_completion(make_request(), "openai", client)
+    assert time.perf_counter() - start_time >= 0.14
+
+
+async def test_rate_limited_client_async() -> None:
+    limiter = RateLimiter(
+        requests_per_minute=1200, tokens_per_minute=100_000, tokenizer=WhitespaceTokenizer("gpt-4o-mini", "openai")
+    )
+    assert limiter.request_bucket is not None
+    limiter.request_bucket.reserve(1200)
+    client = rate_limited_client(afake_openai_client, limiter, async_client=True)
+
+    start_time = time.perf_counter()
+    responses = await asyncio.gather(*[achat_completion(make_request(), "openai", client) for _ in range(4)])
+    duration = time.perf_counter() - start_time
+
+    assert len(responses) == 4
+    assert limiter.stats.actual_tokens == 4 * (PROMPT_TOKENS + COMPLETION_TOKENS)
+    # Requests are spaced out 50ms apart rather than all retried after a 429
+    assert duration >= 0.19
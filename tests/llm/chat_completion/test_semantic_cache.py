@@ -0,0 +1,136 @@
+from pathlib import Path
+from typing import Any
+
+from not_again_ai.llm.chat_completion.semantic_cache import SemanticCache
+from tests.llm.chat_completion.fakes import FakeOpenAIClient, afake_openai_client, is_cache_hit, make_request
+
+# Near duplicate prompts map to nearby vectors so tests do not need a live embedding model.
+EMBEDDINGS = {
+    "What is the capital of France?": [1.0, 0.0, 0.0],
+    "what's the capital of france": [0.99, 0.1, 0.0],
+    "How tall is Mount Everest?": [0.0, 0.0, 1.0],
+    "What is the capital of Germany?": [0.7, 0.7, 0.0],
+}
+
+
+def fake_embedding_client(**kwargs: Any) -> dict[str, Any]:
+    return {
+        "data": [{"embedding": EMBEDDINGS[kwargs["input"]], "index": 0}],
+        "usage": {"total_tokens": 5},
+    }
+
+
+def make_cache(**kwargs: Any) -> SemanticCache:
+    return SemanticCache(fake_embedding_client, "openai", "text-embedding-3-small", similarity_threshold=0.95, **kwargs)
+
+
+def test_semantic_cache_hit_for_near_duplicate() -> None:
+    client = FakeOpenAIClient()
+    cache = make_cache()
+
+    first = cache.chat_completion(make_request(), "openai", client)
+    second = cache.chat_completion(make_request("what's the capital of france"), "openai", client)
+    third = cache.chat_completion(make_request("What is the capital of Germany?"), "openai", client)
+
+    assert client.calls == 2
+    assert not is_cache_hit(first)
+    assert is_cache_hit(second)
+    assert second.choices[0].message.content == "Answer 1"
+    assert isinstance(second.extras, dict)
+    assert second.extras["cache_similarity"] > 0.95
+    assert third.choices[0].message.content == "Answer 2"
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 2
+
+
+def test_semantic_cache_refresh_replaces_similar_entry() -> None:
+    client = FakeOpenAIClient()
+    cache = make_cache()
+
+    cache.chat_completion(make_request(), "openai", client)
+    refreshed = cache.chat_completion(make_request("what's the capital of france"), "openai", client, mode="refresh")
+    assert refreshed.choices[0].message.content == "Answer 2"
+    # The near-duplicate prompt overwrites the stored one instead of adding a second entry
+    assert len(cache) == 1
+    assert cache.chat_completion(make_request(), "openai", client).choices[0].message.content == "Answer 2"
+    assert client.calls == 2
+
+
+def test_semantic_cache_skips_responses_with_errors() -> None:
+    client = FakeOpenAIClient()
+    cache = make_cache()
+    request = make_request().model_copy(update={"json_mode": True})
+
+    # The fake client's answers are not JSON, so every response has errors
+    assert cache.chat_completion(request, "openai", client).errors
+    assert len(cache) == 0
+    assert not is_cache_hit(cache.chat_completion(request, "openai", client))
+    assert client.calls == 2
+
+
+def test_semantic_cache_requires_same_context() -> None:
+    client = FakeOpenAIClient()
+    cache = make_cache()
+    cache.chat_completion(make_request(), "openai", client)
+    response = cache.chat_completion(make_request(system="Answer in French."), "openai", client)
+    assert client.calls == 2
+    assert not is_cache_hit(response)
+
+
+def test_semantic_cache_requires_same_provider() -> None:
+    client = FakeOpenAIClient()
+    cache = make_cache()
+    cache.chat_completion(make_request(), "openai", client)
+    response = cache.chat_completion(make_request(), "azure_openai", client)
+    assert client.calls == 2
+    assert not is_cache_hit(response)
+    assert len(cache) == 2
+
+
+def test_semantic_cache_grows_vectors_geometrically() -> None:
+    cache = make_cache(max_size=40)
+    response = cache.chat_completion(make_request(), "openai", FakeOpenAIClient())
+    vector = cache.embed("What is the capital of France?")
+    capacities = []
+    for i in range(1, 45):
+        cache.add(f"context {i}", vector, response)
+        assert cache._vectors is not None
+        capacities.append(cache._vectors.shape[0])
+    assert sorted(set(capacities)) == [16, 32, 40]
+    assert len(cache) == 40
+
+
+def test_semantic_cache_evicts_least_recently_used() -> None:
+    client = FakeOpenAIClient()
+    cache = make_cache(max_size=2)
+    cache.chat_completion(make_request(), "openai", client)
+    cache.chat_completion(make_request("How tall is Mount Everest?"), "openai", client)
+    # Using the France prompt makes the Everest prompt the least recently used one
+    cache.chat_completion(make_request(), "openai", client)
+    cache.chat_completion(make_request("What is the capital of Germany?"), "openai", client)
+    assert len(cache) == 2
+    assert client.calls == 3
+
+    assert is_cache_hit(cache.chat_completion(make_request(), "openai", client))
+    assert not is_cache_hit(cache.chat_completion(make_request("How tall is Mount Everest?"), "openai", client))
+
+
+def test_semantic_cache_persists(tmp_path: Path) -> None:
+    client = FakeOpenAIClient()
+    path = tmp_path / "semantic_cache"
+    cache = make_cache(path=path)
+    cache.chat_completion(make_request(), "openai", client)
+    cache.save()
+
+    warm_cache = make_cache(path=path)
+    response = warm_cache.chat_completion(make_request("what's the capital of france"), "openai", client)
+    assert client.calls == 1
+    assert is_cache_hit(response)
+    assert response.choices[0].message.content == "Answer 1"
+
+
+async def test_semantic_cache_async() -> None:
+    cache = make_cache()
+    await cache.achat_completion(make_request(), "openai", afake_openai_client)
+    response = await cache.achat_completion(make_request("what's the capital of france"), "openai", afake_openai_client)
+    assert is_cache_hit(response)
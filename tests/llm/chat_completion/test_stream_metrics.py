@@ -0,0 +1,116 @@
+from collections.abc import AsyncIterator
+import time
+
+from not_again_ai.llm.chat_completion import StreamMetrics, StreamMetricsRecorder, summarize_stream_metrics
+from not_again_ai.llm.chat_completion.types import (
+    ChatCompletionChoiceStream,
+    ChatCompletionChunk,
+    ChatCompletionDelta,
+    PartialFunction,
+    PartialToolCall,
+)
+
+
+def chunk(
+    response_duration: float,
+    content: str = "",
+    tool_call: bool = False,
+    completion_tokens: int | None = None,
+) -> ChatCompletionChunk:
+    tool_calls = [PartialToolCall(id="call_a", index=0, function=PartialFunction(name="f", arguments=""))]
+    return ChatCompletionChunk(
+        choices=[
+            ChatCompletionChoiceStream(
+                delta=ChatCompletionDelta(content=content, tool_calls=tool_calls if tool_call else None),
+                index=0,
+                finish_reason=None,
+            )
+        ],
+        completion_tokens=completion_tokens,
+        response_duration=response_duration,
+    )
+
+
+async def test_stream_metrics_recorder() -> None:
+    chunks = [
+        # An empty role chunk arrives before the first token
+        chunk(0.2),
+        chunk(0.5, content="I'll"),
+        chunk(0.55, content=" check"),
+        chunk(0.65, tool_call=True),
+        chunk(0.7, tool_call=True),
+        ChatCompletionChunk(choices=[], completion_tokens=11, response_duration=1.0),
+    ]
+
+    async def stream() -> AsyncIterator[ChatCompletionChunk]:
+        for item in chunks:
+            yield item
+
+    recorder = StreamMetricsRecorder()
+    assert [item async for item in recorder.record(stream())] == chunks
+    metrics = recorder.metrics()
+
+    assert metrics.time_to_first_chunk == 0.2
+    assert metrics.time_to_first_token == 0.5
+    assert metrics.time_to_first_content == 0.5
+    assert metrics.time_to_first_tool_call == 0.65
+    assert metrics.duration == 1.0
+    assert metrics.num_chunks == 6
+    # Only chunks with generated output count towards the gaps
+    assert metrics.inter_chunk_gaps == [0.05, 0.1, 0.05]
+    assert (metrics.inter_chunk_p50, metrics.inter_chunk_p95, metrics.inter_chunk_max) == (0.05, 0.1, 0.1)
+    assert metrics.completion_tokens == 11
+    assert metrics.tokens_per_second == 22.0
+
+
+def test_stream_metrics_recorder_without_output() -> None:
+    recorder = StreamMetricsRecorder()
+    recorder.add(ChatCompletionChunk(choices=[], errors="Rate limited", response_duration=0.1))
+    metrics = recorder.metrics()
+    assert metrics.time_to_first_chunk == 0.1
+    assert metrics.time_to_first_token is None
+    assert metrics.inter_chunk_gaps == []
+    assert metrics.tokens_per_second is None
+
+
+def test_summarize_stream_metrics() -> None:
+    summary = summarize_stream_metrics(
+        [
+            StreamMetrics(time_to_first_token=0.4, duration=2.0, inter_chunk_gaps=[0.1, 0.3], tokens_per_second=50),
+            StreamMetrics(time_to_first_token=0.2, duration=1.0, inter_chunk_gaps=[0.2]),
+            StreamMetrics(duration=0.1),
+        ]
+    )
+    assert summary.num_streams == 3
+    assert summary.time_to_first_token.model_dump() == {
+        "count": 2,
+        "mean": 0.3,
+        "p50": 0.4,
+        "p95": 0.4,
+        "p99": 0.4,
+        "max": 0.4,
+    }
+    assert summary.time_to_first_tool_call.count == 0
+    assert summary.time_to_first_tool_call.p50 is None
+    assert (summary.inter_chunk_gap.count, summary.inter_chunk_gap.p50) == (3, 0.2)
+    assert summary.duration.mean == 1.0333
+    assert summary.tokens_per_second.count == 1
+
+
+def test_benchmark_stream_metrics_recorder() -> None:
+    num_chunks = 100_000
+    chunks = [chunk(i * 0.01, content="token") for i in range(num_chunks)]
+
+    start_time = time.perf_counter()
+    recorder = StreamMetricsRecorder()
+    for item in chunks:
+        recorder.add(item)
+    record_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    metrics = recorder.metrics()
+    metrics_duration = time.perf_counter() - start_time
+
+    assert len(metrics.inter_chunk_gaps) == num_chunks - 1
+    print(f"\nRecording {num_chunks} chunks: {1e6 * record_duration / num_chunks:.2f} us/chunk")
+    print(f"  computing the metrics: {metrics_duration:.3f}s")
@@ -0,0 +1,64 @@
+"""A fake OpenAI embeddings client for the offline embedding tests."""
+
+import base64
+from collections.abc import Callable
+import json
+import threading
+import time
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+
+def describe_text(text: str, dimensions: int) -> npt.ArrayLike:
+    """Embeds a text as [length of the text, number of words, requested dimensions]."""
+    return [len(text), len(text.split()), dimensions]
+
+
+class FakeOpenAIEmbeddingClient:
+    """Returns the parsed JSON body the OpenAI API would send, as floats or base64 depending on `encoding_format`.
+    Each input costs one token per word.
+
+    Parsing the JSON on every call includes the cost of decoding floats from text, as the OpenAI client does.
+
+    Args:
+        embed: Returns the vector of an input text given the requested dimensions (0 if not set).
+            Defaults to `describe_text`.
+        delay: Seconds each call takes.
+    """
+
+    def __init__(self, embed: Callable[[str, int], npt.ArrayLike] = describe_text, delay: float = 0) -> None:
+        self.embed = embed
+        self.delay = delay
+        self.inputs: list[str] = []
+        self.batch_sizes: list[int] = []
+        self.encoding_formats: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, **kwargs: Any) -> dict[str, Any]:
+        inputs = kwargs["input"] if isinstance(kwargs["input"], list) else [kwargs["input"]]
+        encoding_format = kwargs.get("encoding_format", "float")
+        with self._lock:
+            self.inputs.extend(inputs)
+            self.batch_sizes.append(len(inputs))
+            self.encoding_formats.append(encoding_format)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+
+        data = []
+        for index, text in enumerate(inputs):
+            vector = np.asarray(self.embed(text, kwargs.get("dimensions", 0)), dtype=np.float32)
+            if encoding_format == "base64":
+                embedding: Any = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "embedding": embedding, "index": index})
+        num_tokens = sum(len(text.split()) for text in inputs)
+        body = json.dumps({"data": data, "usage": {"prompt_tokens": num_tokens, "total_tokens": num_tokens}})
+        return json.loads(body)  # type: ignore[no-any-return]
@@ -0,0 +1,97 @@
+from collections.abc import Callable
+import time
+import tracemalloc
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+from ollama import EmbedResponse
+
+from not_again_ai.llm.embedding import EmbeddingRequest, create_embeddings, create_embeddings_array
+from not_again_ai.llm.embedding.vector_index import VectorIndex
+from tests.llm.embedding.fakes import FakeOpenAIEmbeddingClient
+
+
+def embed_from(vectors: npt.NDArray[np.float32]) -> Callable[[str, int], npt.ArrayLike]:
+    """Embeds the input text "i" as row i of `vectors`."""
+    return lambda text, dimensions: vectors[int(text)]
+
+
+def make_vectors(num_vectors: int, dimensions: int) -> npt.NDArray[np.float32]:
+    return np.random.default_rng(0).standard_normal((num_vectors, dimensions)).astype(np.float32)
+
+
+def test_create_embeddings_array() -> None:
+    vectors = make_vectors(10, 8)
+    client = FakeOpenAIEmbeddingClient(embed_from(vectors))
+    request = EmbeddingRequest(input=[str(i) for i in range(10)], model="text-embedding-3-small")
+    response = create_embeddings_array(request, "openai", client, max_batch_size=3)
+
+    assert client.encoding_formats == ["base64"] * 4
+    assert response.embeddings.dtype == np.float32
+    assert response.embeddings.shape == (10, 8)
+    assert response.embeddings.flags["C_CONTIGUOUS"]
+    np.testing.assert_array_equal(response.embeddings, vectors)
+    np.testing.assert_array_equal(response.indices, np.arange(10))
+    assert response.total_tokens == 10
+
+
+def test_create_embeddings_array_empty_input() -> None:
+    client = FakeOpenAIEmbeddingClient()
+    request = EmbeddingRequest(input=[], model="text-embedding-3-small", dimensions=8)
+    response = create_embeddings_array(request, "openai", client)
+
+    assert client.encoding_formats == []
+    assert response.embeddings.dtype == np.float32
+    assert response.embeddings.shape == (0, 8)
+    assert response.indices.shape == (0,)
+
+
+def test_create_embeddings_array_empty_input_ollama() -> None:
+    calls = []
+
+    def ollama_client(**kwargs: Any) -> EmbedResponse:
+        calls.append(kwargs)
+        return EmbedResponse(model="nomic-embed-text", embeddings=[])
+
+    request = EmbeddingRequest(input=[], model="nomic-embed-text")
+    response = create_embeddings_array(request, "ollama", ollama_client)
+
+    assert calls == []
+    assert response.embeddings.dtype == np.float32
+    assert response.embeddings.ndim == 2
+    assert response.embeddings.shape[0] == 0
+    assert len(VectorIndex().add(response)) == 0
+
+    # A response without embeddings is also a 2-D matrix
+    response = create_embeddings_array(request.model_copy(update={"input": ["hello"]}), "ollama", ollama_client)
+    assert response.embeddings.shape == (0, 0)
+
+
+def measure(func: Callable[[], Any]) -> tuple[float, float]:
+    """Returns the duration in seconds and the peak traced memory in MB of calling `func`."""
+    start_time = time.perf_counter()
+    func()
+    duration = time.perf_counter() - start_time
+
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return duration, peak / 1024**2
+
+
+def test_benchmark_list_vs_array() -> None:
+    num_vectors, dimensions = 100, 1536
+    client = FakeOpenAIEmbeddingClient(embed_from(make_vectors(num_vectors, dimensions)))
+    request = EmbeddingRequest(input=[str(i) for i in range(num_vectors)], model="text-embedding-3-small")
+
+    list_duration, list_memory = measure(lambda: create_embeddings(request, "openai", client, max_batch_size=50))
+    array_duration, array_memory = measure(
+        lambda: create_embeddings_array(request, "openai", client, max_batch_size=50)
+    )
+
+    print(f"\n{num_vectors} x {dimensions} embeddings")
+    print(f"  list:  {list_duration:.3f}s, peak memory {list_memory:.1f} MB")
+    print(f"  array: {array_duration:.3f}s, peak memory {array_memory:.1f} MB")
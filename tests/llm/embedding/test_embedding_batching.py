@@ -0,0 +1,52 @@
+from not_again_ai.llm.embedding import EmbeddingRequest, create_embeddings
+from not_again_ai.llm.embedding.interface import batch_inputs
+from not_again_ai.llm.prompting.types import BaseTokenizer
+from tests.llm.embedding.fakes import FakeOpenAIEmbeddingClient
+from tests.llm.fakes import WhitespaceTokenizer
+
+
+def test_batch_inputs_by_size_and_tokens() -> None:
+    tokenizer = WhitespaceTokenizer("text-embedding-3-small", "openai")
+    inputs = ["one two three", "four five", "six", "seven eight nine ten eleven twelve", "thirteen"]
+    assert batch_inputs(inputs, 2, None, lambda: tokenizer) == [[0, 1], [2, 3], [4]]
+    # The input with six tokens alone exceeds the limit of five tokens so it gets its own batch
+    assert batch_inputs(inputs, 10, 5, lambda: tokenizer) == [[0, 1], [2], [3], [4]]
+    assert batch_inputs("a single input", 1, 1, lambda: tokenizer) == [[0]]
+
+
+def test_batch_inputs_skips_tokenizer_for_small_inputs() -> None:
+    def get_tokenizer() -> BaseTokenizer:
+        raise AssertionError("The tokenizer should not be needed")
+
+    assert batch_inputs(["hello", "world"], 2048, 300_000, get_tokenizer) == [[0, 1]]
+
+
+def test_create_embeddings_batches_concurrently() -> None:
+    client = FakeOpenAIEmbeddingClient(delay=0.05)
+    inputs = [" ".join(["word"] * (i % 7 + 1)) for i in range(1000)]
+    request = EmbeddingRequest(input=inputs, model="text-embedding-3-small")
+
+    response = create_embeddings(request, "openai", client, max_batch_size=100, max_concurrency=4)
+
+    assert client.batch_sizes == [100] * 10
+    # Ten batches of 50ms with four at a time take three rounds rather than ten
+    assert client.max_in_flight == 4
+    assert [embedding.index for embedding in response.embeddings] == list(range(1000))
+    # The second dimension of the fake embeddings is the number of words
+    assert all(embedding.embedding[1] == i % 7 + 1 for i, embedding in enumerate(response.embeddings))
+    assert response.total_tokens == sum(i % 7 + 1 for i in range(1000))
+
+
+def test_create_embeddings_batches_by_tokens() -> None:
+    client = FakeOpenAIEmbeddingClient()
+    request = EmbeddingRequest(input=["a b c"] * 10, model="text-embedding-3-small")
+    response = create_embeddings(
+        request,
+        "openai",
+        client,
+        max_batch_tokens=9,
+        tokenizer=WhitespaceTokenizer("text-embedding-3-small", "openai"),
+    )
+    assert client.batch_sizes == [3, 3, 3, 1]
+    assert len(response.embeddings) == 10
+    assert response.total_tokens == 30
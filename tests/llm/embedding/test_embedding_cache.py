@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import numpy as np
+
+from not_again_ai.llm.embedding import EmbeddingRequest
+from not_again_ai.llm.embedding.cache import EmbeddingCache
+from tests.llm.embedding.fakes import FakeOpenAIEmbeddingClient
+
+
+def test_embedding_cache_only_sends_misses(tmp_path: Path) -> None:
+    client = FakeOpenAIEmbeddingClient()
+    cache = EmbeddingCache(tmp_path / "embeddings")
+
+    first = cache.create_embeddings(
+        EmbeddingRequest(input=["a b", "c"], model="text-embedding-3-small"), "openai", client
+    )
+    second = cache.create_embeddings(
+        EmbeddingRequest(input=["c", "d e f", "a b", "d e f"], model="text-embedding-3-small"), "openai", client
+    )
+
+    assert client.inputs == ["a b", "c", "d e f"]
+    assert [embedding.embedding for embedding in first.embeddings] == [[3.0, 2.0, 0.0], [1.0, 1.0, 0.0]]
+    assert [embedding.embedding for embedding in second.embeddings] == [
+        [1.0, 1.0, 0.0],
+        [5.0, 3.0, 0.0],
+        [3.0, 2.0, 0.0],
+        [5.0, 3.0, 0.0],
+    ]
+    # Only "d e f" was sent
+    assert second.total_tokens == 3
+    assert second.extras == {"cache_hits": 2}
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 4
+    cache.close()
+
+
+def test_embedding_cache_keyed_by_model_and_dimensions(tmp_path: Path) -> None:
+    client = FakeOpenAIEmbeddingClient()
+    with EmbeddingCache(tmp_path) as cache:
+        for request in [
+            EmbeddingRequest(input="hello", model="text-embedding-3-small"),
+            EmbeddingRequest(input="hello", model="text-embedding-3-small", dimensions=2),
+            EmbeddingRequest(input="hello", model="text-embedding-3-large"),
+            EmbeddingRequest(input="hello", model="text-embedding-3-small", dimensions=2),
+        ]:
+            response = cache.create_embeddings_array(request, "openai", client)
+            assert response.embeddings[0, 2] == (request.dimensions or 0)
+        assert len(client.inputs) == 3
+
+
+def test_embedding_cache_persists_and_invalidates(tmp_path: Path) -> None:
+    client = FakeOpenAIEmbeddingClient()
+    texts = [f"document {i}" for i in range(1000)]
+    with EmbeddingCache(tmp_path) as cache:
+        cache.create_embeddings_array(EmbeddingRequest(input=texts, model="text-embedding-3-small"), "openai", client)
+        cache.create_embeddings_array(EmbeddingRequest(input="other", model="text-embedding-3-large"), "openai", client)
+    assert (tmp_path / "vectors_1.f32").stat().st_size == 1000 * 3 * 4
+
+    with EmbeddingCache(tmp_path) as cache:
+        response = cache.create_embeddings_array(
+            EmbeddingRequest(input=texts[::-1], model="text-embedding-3-small"), "openai", client
+        )
+        assert len(client.inputs) == 1001
+        np.testing.assert_array_equal(response.embeddings[:, 0], [len(text) for text in texts[::-1]])
+        assert cache.stats.hit_ratio == 1.0
+
+        assert cache.invalidate("text-embedding-3-small") == 1000
+        assert not (tmp_path / "vectors_1.f32").exists()
+        cache.create_embeddings_array(
+            EmbeddingRequest(input=texts[:10], model="text-embedding-3-small"), "openai", client
+        )
+        cache.create_embeddings_array(EmbeddingRequest(input="other", model="text-embedding-3-large"), "openai", client)
+        assert len(client.inputs) == 1011
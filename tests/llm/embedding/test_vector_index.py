@@ -0,0 +1,128 @@
+from pathlib import Path
+import time
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from not_again_ai.llm.embedding.types import EmbeddingObject, EmbeddingResponse
+from not_again_ai.llm.embedding.vector_index import VectorIndex
+
+
+def clustered_vectors(
+    num_vectors: int, dimensions: int, num_clusters: int, noise_scale: float = 0.5, seed: int = 0
+) -> npt.NDArray[np.float32]:
+    """Vectors grouped around random centers, which resemble real embeddings more than uniformly random vectors."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dimensions)).astype(np.float32)
+    noise = rng.standard_normal((num_vectors, dimensions)).astype(np.float32)
+    return centers[rng.integers(0, num_clusters, num_vectors)] + noise_scale * noise
+
+
+def test_vector_index_exact_search() -> None:
+    index = VectorIndex()
+    response = EmbeddingResponse(
+        embeddings=[
+            EmbeddingObject(embedding=[0.0, 2.0], index=1),
+            EmbeddingObject(embedding=[3.0, 0.0], index=0),
+            EmbeddingObject(embedding=[1.0, 1.0], index=2),
+        ],
+        response_duration=0,
+    )
+    assert index.add(response).tolist() == [0, 1, 2]
+    assert index.add([[-1.0, 0.0]], ids=[42]).tolist() == [42]
+    np.testing.assert_allclose(np.linalg.norm(index.vectors, axis=1), 1.0, rtol=1e-6)
+
+    scores, ids = index.search([[1.0, 0.1], [-1.0, 0.0]], k=2)
+    assert ids.tolist() == [[0, 2], [42, 1]]
+    assert scores[1, 0] == pytest.approx(1.0)
+
+    # k is clamped to the size of the index
+    scores, ids = index.search([0.0, 1.0], k=10)
+    assert scores.shape == ids.shape == (1, 4)
+    assert ids.tolist() == [[1, 2, 0, 42]]
+
+
+def test_vector_index_search_invalid_arguments() -> None:
+    index = VectorIndex()
+    index.add([[1.0, 0.0], [0.0, 1.0]])
+    with pytest.raises(ValueError, match="k must be at least 1"):
+        index.search([1.0, 0.0], k=0)
+    with pytest.raises(ValueError, match="nprobe must be at least 1"):
+        index.search([1.0, 0.0], k=1, nprobe=0)
+
+
+def test_vector_index_ivf_and_save_load(tmp_path: Path) -> None:
+    vectors = clustered_vectors(2000, 16, num_clusters=20)
+    index = VectorIndex()
+    index.add(vectors[:1500])
+    index.build_ivf(num_lists=20)
+    # Vectors added after building are assigned to the existing clusters
+    index.add(vectors[1500:])
+
+    exact_scores, exact_ids = index.search(vectors[:50], k=5)
+    assert exact_ids[:, 0].tolist() == list(range(50))
+    _, ivf_ids = index.search(vectors[:50], k=5, nprobe=20)
+    np.testing.assert_array_equal(ivf_ids, exact_ids)
+
+    # Searching without queries returns empty results
+    for nprobe in [None, 3]:
+        empty_scores, empty_ids = index.search(np.zeros((0, 16), dtype=np.float32), k=5, nprobe=nprobe)
+        assert empty_scores.shape == empty_ids.shape == (0, 5)
+
+    index.save(tmp_path / "index")
+    loaded = VectorIndex.load(tmp_path / "index")
+    assert isinstance(loaded.vectors, np.memmap)
+    loaded_scores, loaded_ids = loaded.search(vectors[:50], k=5)
+    np.testing.assert_array_equal(loaded_ids, exact_ids)
+    np.testing.assert_allclose(loaded_scores, exact_scores)
+    _, loaded_ivf_ids = loaded.search(vectors[:50], k=5, nprobe=3)
+    assert loaded_ivf_ids[:, 0].tolist() == list(range(50))
+
+    loaded.add(vectors[:1], ids=[-5])
+    assert len(loaded) == 2001
+
+
+def test_benchmark_vector_index() -> None:
+    num_vectors, dimensions, num_queries, k = 100_000, 256, 200, 10
+    # Queries are held out vectors from the same distribution as the indexed vectors
+    vectors = clustered_vectors(num_vectors + num_queries, dimensions, num_clusters=1000, noise_scale=1.0)
+    vectors, queries = vectors[:num_vectors], vectors[num_vectors:]
+
+    start_time = time.perf_counter()
+    index = VectorIndex()
+    for start in range(0, num_vectors, 10_000):
+        index.add(vectors[start : start + 10_000])
+    add_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    index.build_ivf()
+    ivf_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    _, exact_ids = index.search(queries, k=k)
+    exact_duration = time.perf_counter() - start_time
+
+    print(f"\n{num_vectors} x {dimensions} vectors, {num_queries} queries, k={k}")
+    assert index.centroids is not None
+    print(f"  add: {add_duration:.3f}s, build IVF with {index.centroids.shape[0]} lists: {ivf_duration:.3f}s")
+    print(f"  exact: {1000 * exact_duration / num_queries:.3f} ms/query")
+
+    # Python loop baseline scoring one query at a time
+    start_time = time.perf_counter()
+    for query in queries[:20]:
+        np.argsort(-(index.vectors @ (query / np.linalg.norm(query))))[:k]
+    loop_duration = (time.perf_counter() - start_time) / 20
+    print(f"  one query at a time with a full sort: {1000 * loop_duration:.3f} ms/query")
+
+    # The first IVF search sorts the vectors by cluster
+    index.search(queries[:1], k=k, nprobe=1)
+    for nprobe in [1, 4, 16, 64]:
+        start_time = time.perf_counter()
+        _, ivf_ids = index.search(queries, k=k, nprobe=nprobe)
+        ivf_search_duration = time.perf_counter() - start_time
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(ivf_ids, exact_ids, strict=True)])
+        print(
+            f"  ivf nprobe={nprobe}: {1000 * ivf_search_duration / num_queries:.3f} ms/query, recall@{k} {recall:.3f}"
+        )
+    assert recall >= 0.9
@@ -0,0 +1,29 @@
+"""Fakes shared by the offline tests of the llm package."""
+
+from collections.abc import Collection, Set
+from typing import Literal
+
+from not_again_ai.llm.chat_completion.types import MessageT
+from not_again_ai.llm.prompting.types import BaseTokenizer
+
+
+class WhitespaceTokenizer(BaseTokenizer):
+    """Counts whitespace separated words so tests do not need to download tiktoken encodings."""
+
+    def init_tokenizer(
+        self,
+        model: str,
+        provider: str,
+        allowed_special: Literal["all"] | Set[str] | None = None,
+        disallowed_special: Literal["all"] | Collection[str] | None = None,
+    ) -> None:
+        pass
+
+    def truncate_str(self, text: str, max_len: int) -> str:
+        return " ".join(text.split()[:max_len])
+
+    def num_tokens_in_str(self, text: str) -> int:
+        return len(text.split())
+
+    def num_tokens_in_messages(self, messages: list[MessageT]) -> int:
+        return sum(self.num_tokens_in_str(str(message.content)) for message in messages)
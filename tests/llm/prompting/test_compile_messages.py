@@ -1,7 +1,13 @@
 from copy import deepcopy
+import itertools
 from pathlib import Path
+import time
+import tracemalloc
+from typing import Any
 
+from liquid import Environment, render
 from pydantic import BaseModel
+import pytest
 
 from not_again_ai.llm.chat_completion.types import (
     AssistantMessage,
@@ -17,7 +23,11 @@ from not_again_ai.llm.chat_completion.types import (
     UserMessage,
 )
 from not_again_ai.llm.prompting.compile_prompt import (
+    CompiledPrompt,
+    TemplateField,
     compile_messages,
+    compile_messages_batch,
+    compile_template,
     compile_tools,
     create_image_url,
     pydantic_to_json_schema,
@@ -363,3 +373,279 @@ def test_pydantic_to_json_schema() -> None:
     assert json_schema["name"] == "math_response"
     assert json_schema["description"] == "A math response"
     assert json_schema["schema"] == expected_schema
+
+
+def test_compile_template_cache() -> None:
+    template = compile_template("Hello {{name}}")
+    assert compile_template("Hello {{name}}") is template
+    assert template.render(name="World") == "Hello World"
+
+    # Templates are cached per environment
+    environment = Environment(statement_start_string="[[", statement_end_string="]]")
+    custom_template = compile_template("Hello [[name]] {{name}}", environment)
+    assert custom_template is not compile_template("Hello [[name]] {{name}}")
+    assert custom_template.render(name="World") == "Hello World {{name}}"
+
+
+def test_compiled_prompt() -> None:
+    messages: list[MessageT] = [
+        SystemMessage(content="System content", name="System-{{user}}"),
+        UserMessage(
+            content=[
+                TextContent(text="Describe this animal for {{user}}"),
+                ImageContent(image_url=ImageUrl(url=create_image_url(cat_image), detail=ImageDetail.LOW)),
+            ]
+        ),
+        AssistantMessage(
+            content="Assistant processing {{user}}",
+            tool_calls=[
+                ToolCall(id="{{call_id}}", function=Function(name="f", arguments={"nested": {"key": "{{user}}"}}))
+            ],
+        ),
+    ]
+    tools = [{"name": "Template: {{user}}", "parameters": {"required": ["location"], "strict": True}}]
+    prompt = CompiledPrompt(messages, tools)
+
+    for user in ["Alice", "Bob"]:
+        variables = {"user": user, "call_id": f"call_{user}"}
+        assert prompt.messages(variables) == compile_messages(messages, variables)
+        assert prompt.tools(variables) == compile_tools(tools, variables)
+
+    # Parts without templates are shared with the original messages and tools
+    rendered = prompt.messages({"user": "Alice"})[1]
+    assert isinstance(rendered.content, list)
+    assert rendered.content[1] is messages[1].content[1]
+    assert prompt.tools({"user": "Alice"})[0]["parameters"] is tools[0]["parameters"]
+
+
+def test_compile_messages_copy_on_write() -> None:
+    image = ImageContent(image_url=ImageUrl(url=create_image_url(cat_image), detail=ImageDetail.LOW))
+    system_message = SystemMessage(content="You describe animals.")
+    user_message = UserMessage(content=[TextContent(text="Describe this {{animal}}"), image])
+    tools = [{"name": "describe", "parameters": {"required": ["{{animal}}"], "strict": True}}]
+
+    compiled = compile_messages([system_message, user_message], {"animal": "cat"})
+    # Messages and parts without templates are not copied
+    assert compiled[0] is system_message
+    assert isinstance(compiled[1].content, list)
+    assert compiled[1].content[0] == TextContent(text="Describe this cat")
+    assert compiled[1].content[1] is image
+    assert user_message.content[0] == TextContent(text="Describe this {{animal}}")
+
+    compiled_tools = compile_tools(tools, {"animal": "cat"})
+    assert compiled_tools[0]["parameters"]["required"] == ["cat"]
+    assert compiled_tools[0]["name"] is tools[0]["name"]
+    assert tools[0]["parameters"] == {"required": ["{{animal}}"], "strict": True}
+
+
+def test_compiled_prompt_analysis() -> None:
+    messages: list[MessageT] = [
+        SystemMessage(content="You are a helpful assistant."),
+        UserMessage(
+            content=[
+                TextContent(text="{% for rule in rules %}- {{ rule }}\n{% endfor %}Summarize for {{ user.name }}"),
+                TextContent(text="Plain text"),
+            ]
+        ),
+    ]
+    tools = [{"name": "summarize", "description": "Summarize in {{ language | default: 'English' }}"}]
+    prompt = CompiledPrompt(messages, tools)
+
+    assert prompt.template_fields == [
+        TemplateField(path=("messages", 1, "content", 0, "text"), variables=["rules", "user"]),
+        TemplateField(path=("tools", 0, "description"), variables=["language"]),
+    ]
+    assert prompt.variables == {"rules", "user", "language"}
+
+    variables = {"rules": ["Be brief"], "user": {"name": "Alice"}, "language": "French"}
+    assert prompt.missing_variables(variables) == []
+    prompt.validate_variables(variables)
+    assert prompt.missing_variables({"rules": []}) == ["language", "user"]
+    with pytest.raises(ValueError, match=r"Missing variables user used by messages\.1\.content\.0\.text"):
+        prompt.validate_variables({"rules": [], "language": "French"})
+
+    # Messages and tools without templates are not even copied
+    assert prompt.messages(variables)[0] is messages[0]
+    assert CompiledPrompt(messages[:1], tools[:0]).variables == set()
+
+
+BATCH_MESSAGES: list[MessageT] = [
+    SystemMessage(content="You grade answers to questions about {{subject}}."),
+    UserMessage(content=[TextContent(text="Question: {{question}}\nAnswer: {{answer}}")]),
+]
+
+
+def test_compile_messages_batch() -> None:
+    rows = [{"subject": "math", "question": f"What is {i} + {i}?", "answer": str(2 * i)} for i in range(20)]
+    expected = [compile_messages(BATCH_MESSAGES, row) for row in rows]
+    assert list(compile_messages_batch(BATCH_MESSAGES, rows)) == expected
+    assert list(compile_messages_batch(BATCH_MESSAGES, iter(rows), num_processes=2, batch_size=3)) == expected
+
+    # Variables are consumed lazily, so an endless stream works
+    endless = ({"subject": "math", "question": str(i), "answer": ""} for i in itertools.count())
+    first = list(itertools.islice(compile_messages_batch(BATCH_MESSAGES, endless), 3))
+    assert [message[1].content[0].text for message in first] == [  # type: ignore[union-attr]
+        "Question: 0\nAnswer: ",
+        "Question: 1\nAnswer: ",
+        "Question: 2\nAnswer: ",
+    ]
+
+
+def test_benchmark_compile_messages_batch() -> None:
+    num_rows = 10_000
+
+    def rows() -> Any:
+        return ({"subject": "math", "question": f"What is {i} + {i}?", "answer": str(2 * i)} for i in range(num_rows))
+
+    start_time = time.perf_counter()
+    for row in rows():
+        compile_messages(BATCH_MESSAGES, row)
+    per_row_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for _ in compile_messages_batch(BATCH_MESSAGES, rows()):
+        pass
+    batch_duration = time.perf_counter() - start_time
+
+    # Memory stays flat however many rows are streamed through
+    tracemalloc.start()
+    for _ in compile_messages_batch(BATCH_MESSAGES, rows()):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"\nCompiling messages for {num_rows} rows")
+    print(f"  compile_messages per row: {num_rows / per_row_duration:.0f} rows/s")
+    print(f"  compile_messages_batch: {num_rows / batch_duration:.0f} rows/s, peak {peak / 1e3:.0f} KB allocated")
+
+
+def test_benchmark_static_tools() -> None:
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": f"tool_{i}",
+                "description": f"Tool number {i} of the toolkit",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        f"argument_{j}": {"type": "string", "description": f"Argument {j}", "enum": ["a", "b", "c"]}
+                        for j in range(10)
+                    },
+                    "required": [f"argument_{j}" for j in range(10)],
+                },
+            },
+        }
+        for i in range(50)
+    ]
+    # One tool's description depends on the variables
+    tools[0]["function"]["description"] = "Look up {{topic}} in the knowledge base"  # type: ignore[index]
+    num_renders = 200
+    variables = {"topic": "billing"}
+
+    start_time = time.perf_counter()
+    for _ in range(num_renders):
+        compiled_tools = compile_tools(tools, variables)
+    compile_tools_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    prompt = CompiledPrompt([], tools)
+    for _ in range(num_renders):
+        rendered_tools = prompt.tools(variables)
+    compiled_duration = time.perf_counter() - start_time
+
+    assert rendered_tools == compiled_tools
+    assert [field.path for field in prompt.template_fields] == [("tools", 0, "function", "description")]
+    print(f"\nRendering 50 tool schemas with one template {num_renders} times")
+    print(f"  compile_tools: {1e6 * compile_tools_duration / num_renders:.0f} us/render")
+    print(f"  CompiledPrompt: {1e6 * compiled_duration / num_renders:.1f} us/render")
+
+
+def test_benchmark_compile_messages_memory() -> None:
+    def round_trip_compile(messages: list[MessageT], variables: dict[str, Any]) -> list[MessageT]:
+        """The previous implementation, which deep copied the messages and validated every model again."""
+
+        def apply(value: Any) -> Any:
+            if isinstance(value, str):
+                return compile_template(value).render(**variables) if "{" in value and "{{" in value else value
+            elif isinstance(value, list):
+                return [apply(item) for item in value]
+            elif isinstance(value, dict):
+                return {key: apply(val) for key, val in value.items()}
+            elif isinstance(value, BaseModel):
+                return value.__class__(**{key: apply(val) for key, val in value.model_dump().items()})
+            return value
+
+        return [apply(message) for message in deepcopy(messages)]
+
+    # A conversation of 100 turns about 100 KB images
+    messages: list[MessageT] = [SystemMessage(content="You compare images for {{user}}.")]
+    for i in range(100):
+        image_url = ImageUrl(url="data:image/png;base64," + str(i % 10) * 100_000, detail=ImageDetail.HIGH)
+        messages.append(
+            UserMessage(content=[TextContent(text="What about this one, {{user}}?"), ImageContent(image_url=image_url)])
+        )
+        messages.append(AssistantMessage(content="It is a cat."))
+    variables = {"user": "Alice"}
+
+    def measure(compile_function: Any) -> tuple[float, int]:
+        tracemalloc.start()
+        compile_function(messages, variables)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Timed separately, as tracing slows down allocations
+        start_time = time.perf_counter()
+        compile_function(messages, variables)
+        return time.perf_counter() - start_time, peak
+
+    assert compile_messages(messages, variables) == round_trip_compile(messages, variables)
+    round_trip_duration, round_trip_peak = measure(round_trip_compile)
+    copy_on_write_duration, copy_on_write_peak = measure(compile_messages)
+
+    assert copy_on_write_peak < round_trip_peak
+    print(f"\nCompiling {len(messages)} messages with 100 KB images")
+    print(f"  deepcopy and model round trip: {round_trip_duration:.4f}s, peak {round_trip_peak / 1e3:.0f} KB allocated")
+    print(f"  copy-on-write: {copy_on_write_duration:.4f}s, peak {copy_on_write_peak / 1e3:.0f} KB allocated")
+
+
+def test_benchmark_compile_messages() -> None:
+    messages: list[MessageT] = [
+        SystemMessage(
+            content="""You are a helpful assistant for {{company}}.
+{%- if rules %}
+Follow these rules:
+{%- for rule in rules %}
+- {{ rule }}
+{%- endfor %}
+{%- endif %}""",
+        ),
+        UserMessage(content="Summarize the following text in {{language}}:\n{{text}}"),
+    ]
+    num_renders = 2000
+    variables: list[dict[str, Any]] = [
+        {"company": "Acme", "rules": ["Be concise", "Cite sources"], "language": "English", "text": f"Document {i}"}
+        for i in range(num_renders)
+    ]
+
+    def render_each_time(variables: dict[str, Any]) -> list[str]:
+        return [render(str(message.content), **variables) for message in messages]
+
+    start_time = time.perf_counter()
+    uncached = [render_each_time(item) for item in variables]
+    uncached_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    cached = [compile_messages(messages, item) for item in variables]
+    cached_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    prompt = CompiledPrompt(messages)
+    compiled = [prompt.messages(item) for item in variables]
+    compiled_duration = time.perf_counter() - start_time
+
+    assert [[message.content for message in item] for item in cached] == uncached
+    assert compiled == cached
+    print(f"\nRendering a prompt with {num_renders} sets of variables")
+    print(f"  parsing the templates every time: {num_renders / uncached_duration:.0f} renders/s")
+    print(f"  compile_messages with the template cache: {num_renders / cached_duration:.0f} renders/s")
+    print(f"  CompiledPrompt: {num_renders / compiled_duration:.0f} renders/s")
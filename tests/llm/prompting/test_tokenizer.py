@@ -1,7 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
 import pytest
+import tiktoken
 
 from not_again_ai.llm.chat_completion.types import MessageT, SystemMessage, UserMessage
-from not_again_ai.llm.prompting import Tokenizer
+from not_again_ai.llm.prompting import Tokenizer, preload_encodings
+from not_again_ai.llm.prompting.providers import openai_tiktoken
 
 
 @pytest.fixture(
@@ -61,3 +66,54 @@ def test_num_tokens_multiple_messages(tokenizer_with_unsupported: Tokenizer) ->
     messages: list[MessageT] = [SystemMessage(content="System message."), UserMessage(content="User message.")]
     result = tokenizer_with_unsupported.num_tokens_in_messages(messages)
     print(result)
+
+
+def test_model_encoding_registry(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Each encoding is loaded once however many threads ask for it, without downloading the real BPE files."""
+    loads: list[str] = []
+
+    def load_encoding(encoding_name: str) -> tiktoken.Encoding:
+        loads.append(encoding_name)
+        time.sleep(0.05)
+        return tiktoken.Encoding(
+            name=encoding_name,
+            pat_str=r"\S+|\s+",
+            mergeable_ranks={bytes([i]): i for i in range(256)},
+            special_tokens={},
+        )
+
+    monkeypatch.setattr(openai_tiktoken, "_model_encodings", {})
+    monkeypatch.setattr(tiktoken, "get_encoding", load_encoding)
+
+    with ThreadPoolExecutor(8) as pool:
+        encodings = list(pool.map(openai_tiktoken.get_model_encoding, ["gpt-4o"] * 16 + ["unknown-model"] * 16))
+    assert loads == ["o200k_base", "o200k_base"]
+    assert all(encoding is encodings[0] for encoding in encodings[:16])
+
+    preload_encodings(["gpt-4o", "gpt-4"])
+    assert loads == ["o200k_base", "o200k_base", "cl100k_base"]
+    assert Tokenizer("gpt-4", "openai").num_tokens_in_str("abc") == 3
+
+
+def test_benchmark_tokenizer_startup() -> None:
+    models = ["gpt-4o-mini-2024-07-18", "gpt-4-0613", "unknown-model"]
+    num_tokenizers = 10_000
+
+    start_time = time.perf_counter()
+    preload_encodings(models)
+    preload_duration = time.perf_counter() - start_time
+
+    # What creating a tokenizer did before the registry, after tiktoken has loaded the encodings
+    start_time = time.perf_counter()
+    for i in range(num_tokenizers):
+        tiktoken.encoding_for_model(models[i % 2])
+    lookup_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for i in range(num_tokenizers):
+        Tokenizer(models[i % 2], "openai")
+    tokenizer_duration = time.perf_counter() - start_time
+
+    print(f"\nPreloading the encodings of {len(models)} models: {preload_duration:.3f}s")
+    print(f"  tiktoken.encoding_for_model: {1e6 * lookup_duration / num_tokenizers:.2f} us/call")
+    print(f"  Tokenizer after preloading: {1e6 * tokenizer_duration / num_tokenizers:.2f} us/tokenizer")